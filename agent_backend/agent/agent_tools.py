@@ -1,21 +1,26 @@
 # agent/agent_tools.py (Simple @tool decorator version)
 
 import json
+import re
 import uuid
-import google.generativeai as genai
 from typing import Optional
 from langchain.tools import tool
-from .tools import google_search, youtube_search, get_youtube_transcript
-from .analysis import analyze_results
-from .memory import get_embedding, save_notes_to_db
-from .database import SessionLocal
-from .models import Plan, Module
+from . import events, metrics
+from .analysis import AnalysisFailed
+from .research import plan_outline, research_module
+from .rate_limit import RateLimitExceeded
+from .memory import save_plan_with_modules
+from .notes import generate_video_notes
 from .logger import logger
+from .vector_index import normalize_topic
 
 # Global variables to store the models (will be set from main)
 _chat_model = None
 _genai_client = None
 
+# The latest outline drafted for each topic, so modules can be numbered by their place in it
+_outlines = {}
+
 def set_models(chat_model, genai_client):
 	"""Set the global model instances for use in tools"""
 	global _chat_model, _genai_client
@@ -23,6 +28,7 @@ def set_models(chat_model, genai_client):
 	_genai_client = genai_client
 
 @tool
+@metrics.timed("tool.curriculum_planning_tool")
 def curriculum_planning_tool(topic: str) -> str:
 	"""Generate the initial step-by-step learning plan outline.
 	
@@ -34,18 +40,24 @@ def curriculum_planning_tool(topic: str) -> str:
 	"""
 	logger.info(f"Using Curriculum Planning Tool for topic: {topic}")
 
-	planner_prompt = f"""
-	You are an expert curriculum designer. Your task is to generate a list of main module titles for a learning plan on the topic: '{topic}'.
-	IMPORTANT: The output MUST BE a simple, numbered list and NOTHING ELSE. Just provide the main titles for 3 modules.
-	Example for 'Learning Guitar': 1. Parts of the Guitar\n2. Basic Chords\n3. First Song
-	Now, generate the output for the topic: '{topic}'.
-	"""
-
-	plan_response = _chat_model.invoke(planner_prompt)
-	steps = [step.strip() for step in plan_response.content.split('\n') if step.strip()]
+	steps = plan_outline(_chat_model, topic)
+	_outlines[normalize_topic(topic)] = steps
+	events.emit("plan_outline", topic=topic, modules=steps)
 	return json.dumps(steps)
 
+def _outline_step_number(topic: str, step_description: str):
+	"""The module's position in the outline: its "N." prefix, or where it appears in the drafted outline."""
+	match = re.match(r"\s*(\d+)\s*[.):-]", step_description)
+	if match:
+		return int(match.group(1))
+	steps = _outlines.get(normalize_topic(topic), [])
+	for i, step in enumerate(steps):
+		if step_description.strip().lower() in step.lower():
+			return i + 1
+	return None
+
 @tool
+@metrics.timed("tool.research_and_save_module_tool")
 def research_and_save_module_tool(tool_input: str) -> str:
 	"""Find resources for a module AND save them to the database.
 	
@@ -72,76 +84,33 @@ def research_and_save_module_tool(tool_input: str) -> str:
 
 	logger.info(f"Researching and Saving Module for step: '{step_description}'")
 	
-	search_query_prompt = f"""
-	You are an expert at generating search queries. Your task is to take the following learning topic and create a single, simple, and effective search query for a beginner.
-
-	IMPORTANT: Your output MUST be the search query string and NOTHING ELSE. Do not add numbers, bullets, explanations, quotes, or any extra text.
-
-	Here is a perfect example:
-	Input: "1. Understanding the Parts of the Guitar"
-	Output: guitar parts for beginners
-
-	Now, generate the output for the following input:
-	Input: "{step_description}"
-	"""
-	
-	search_query_response = _chat_model.invoke(search_query_prompt)
-	search_query = search_query_response.content.strip().replace('"', '')
-	
-	# Search operations (no API calls)
-	web_results = google_search(search_query)
-	video_categories = {
-		"General": youtube_search(query=search_query, order='relevance'),
-		"Most Viewed": youtube_search(query=search_query, order="viewCount"),
-		"Highest Rated": youtube_search(query=search_query, order="rating") 
-	}
-	
-	# Analyze results
-	curated_article = analyze_results(_chat_model, topic, web_results, search_query, 'web')
-	
-	curated_videos = {}
-	for category, results in video_categories.items():
-		curated_videos[category] = analyze_results(_chat_model, topic, results, f"{category} video for {search_query}", "video")
-	
 	try:
-		logger.info(f"Connecting to database to save module: '{step_description}'")
-		db = SessionLocal()
-
-		plan = db.query(Plan).filter(Plan.topic == topic).first()
-		if not plan:
-				print(f"  > Creating new plan for '{topic}' in the database...")
-				topic_embedding = get_embedding(_genai_client, topic)
-				
-				plan = Plan(id=str(uuid.uuid4()), topic=topic, embedding=topic_embedding)
-				db.add(plan)
-				db.commit()
-				db.refresh(plan)
-
-		current_step_count = db.query(Module).filter(Module.plan_id == plan.id).count()
-		
-		new_module = Module(
-				id=str(uuid.uuid4()),
-				plan_id=plan.id,
-				stepNumber=current_step_count + 1,
-				title=step_description,
-				articleTitle=curated_article['title'],
-				articleReason=curated_article['reason'],
-				articleLink=curated_article['link'],
-				videosJson=json.dumps(curated_videos)
-		)
-		db.add(new_module)
-		db.commit()
-
-		return f"Successfully researched and saved module: '{step_description}'"
-		
-	except Exception as e:
-		logger.error(f"Failed to save module to database. Reason: {e}")
-		db.rollback()
-		return f"Error: Failed to save module. Reason: {e}"
-	finally:
-		db.close()
+		module_data = research_module(_chat_model, topic, step_description)
+	except RateLimitExceeded as e:
+		logger.error(f"Rate limited while researching '{step_description}': {e}")
+		return f"Error: The AI model is rate limited, so module '{step_description}' was not saved. Reason: {e}"
+	except AnalysisFailed as e:
+		logger.error(f"Could not pick an article for '{step_description}': {e}")
+		return f"Error: No article could be picked, so module '{step_description}' was not saved. Reason: {e}"
+	module_data['id'] = str(uuid.uuid4())
+	module_data['stepNumber'] = _outline_step_number(topic, step_description)
+
+	logger.info(f"Connecting to database to save module: '{step_description}'")
+	try:
+		plan_id = save_plan_with_modules(_genai_client, topic, [module_data])
+	except RateLimitExceeded as e:
+		logger.error(f"Rate limited while saving '{step_description}': {e}")
+		return f"Error: The AI model is rate limited, so module '{step_description}' was not saved. Reason: {e}"
+	if plan_id is None:
+		logger.error(f"Failed to save module '{step_description}' to database.")
+		return f"Error: Failed to save module '{step_description}'."
+
+	events.emit("module_ready", module=events.module_payload(
+		module_data['id'], module_data['stepNumber'], step_description, module_data['article'], module_data['videos']))
+	return f"Successfully researched and saved module: '{step_description}'"
 
 @tool
+@metrics.timed("tool.youtube_note_taker_tool")
 def youtube_note_taker_tool(video_url: str, module_id: Optional[str] = None) -> str:
 	"""
 	Generates timestamped notes for a YouTube video. 
@@ -150,39 +119,4 @@ def youtube_note_taker_tool(video_url: str, module_id: Optional[str] = None) ->
 	Input for module_id is an optional unique ID of a learning module.
 	"""
 	logger.info(f"Using YouTube Note Taker Tool for URL: {video_url}")
-
-	#Step 1: Get transcript using our specialist function
-	transcript = get_youtube_transcript(video_url)
-	if transcript.startswith("Error:"):
-		return transcript
-	
-	#Step 2: Engineer the powerful summarizer prompt
-	note_taker_prompt = f"""
-	You are an expert academic note-taker. Your task is to analyze the following video transcript and distill it into a set of key concepts.
-
-	The transcript is provided with timestamps in the format [MM:SS].
-
-	Your instructions are:
-	1.  Identify the main, high-level concepts discussed in the video.
-	2.  For each concept, provide a concise, 2-3 sentence summary.
-	3.  Crucially, for each summary, you MUST provide the starting timestamp (e.g., [02:35]) where that concept is first introduced in the transcript.
-	4.  Format your output as a clean, structured list. Do not add any conversational fluff or introductory sentences.
-
-	Here is the transcript:
-	---
-	{transcript[:12000]} 
-	---
-	""" 
-	# We truncate the transcript to avoid exceeding model token limits
-
-	notes_response = _chat_model.invoke(note_taker_prompt)
-	notes_content = notes_response.content
-
-	# --- NEW STEP: Save the generated notes to the database ---
-	if module_id and notes_content:
-		logger.info(f"Saving notes for module {module_id} to the database.")
-		save_notes_to_db(module_id, video_url, notes_content)
-	elif not module_id:
-		logger.info("No module_id provided. Skipping database save for this one-off request.")
-	
-	return notes_content
\ No newline at end of file
+	return generate_video_notes(_chat_model, video_url, module_id)
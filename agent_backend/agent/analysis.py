@@ -1,77 +1,209 @@
 # agent/analysis.py (The Final, Caching-Enabled, Professional Version)
 
 import json
-import hashlib
 
-from agent.memory import get_feedback_summary 
+from agent import metrics
+from agent.memory import get_source_reputation, summarize_feedback
+from agent.rate_limit import RateLimitExceeded
+from agent.ranking import clear_winner, local_pick, rank_candidates, top_candidates
 
-# This is our simple, in-memory cache. It will be reset every time the program runs.
-analysis_cache = {}
+# Responses are cached by the shared LLM cache (agent/llm.py) that wraps `model`,
+# keyed by the full prompt, so repeat analyses across processes and users are free.
+#
+# Candidates are pre-ranked locally (agent/ranking.py). A clear winner is picked without
+# the model; otherwise the model sees only the top few candidates in compact form, each
+# under a short id, and answers with the id of its choice plus a reason.
 
-# agent/analysis.py
+class AnalysisFailed(RuntimeError):
+  """Raised when the model's answer doesn't pick one of the candidates. No placeholder pick is made."""
 
-def analyze_results(model, topic: str, results, query, search_type='web'):
+def _parse_json(content: str) -> dict:
+  clean_json_string = content.strip().replace('```json', '').replace('```', '')
+  result = json.loads(clean_json_string)
+  if not isinstance(result, dict):
+    raise ValueError("response is not a JSON object")
+  return result
+
+def _assign_ids(ranked: list, search_type: str, prefix: str, k=None):
+  """Returns ({id: compact candidate}, {id: raw result}) for the top candidates of one category."""
+  compact = top_candidates(ranked, search_type, k)
+  raw = [result for _, result in ranked[:len(compact)]]
+  ids = [f"{prefix}{i + 1}" for i in range(len(compact))]
+  return dict(zip(ids, compact)), dict(zip(ids, raw))
+
+def _pick_from_answer(answer, raw_by_id: dict, search_type: str):
+  """Builds the pick for the model's answer ({"id", "reason"}), or None if the answer is unusable."""
+  if not isinstance(answer, dict):
+    return None
+  result = raw_by_id.get(answer.get('id'))
+  reason = answer.get('reason')
+  if result is None or not isinstance(reason, str) or not reason:
+    return None
+  pick = {'title': result.get('title'), 'link': result.get('link'), 'reason': reason}
+  if search_type == 'video' and result.get('thumbnail'):
+    pick['thumbnail'] = result['thumbnail']
+  return pick
+
+def analyze_results(model, topic: str, results, query, search_type='web', feedback_summary=None, reputation=None, exclude_links=()):
   """
-  Asks the AI model to pick the single best result from a list.
-  Now includes a cache to avoid re-analyzing the same data and hitting rate limits.
+  Picks the single best result from a list, asking the AI model only if no candidate clearly wins.
+  Raises AnalysisFailed (or RateLimitExceeded) if the model can't be used to pick one.
   """
   if not results:
     return {'title': 'N/A', "link": 'N/A', "reason": f"No {search_type} results found."}
-  
-  cache_key_string = query + json.dumps(results[:5])
-  cache_key = hashlib.md5(cache_key_string.encode()).hexdigest()
 
-  if cache_key in analysis_cache:
-      print(f"      CACHE HIT! Reusing previous analysis for '{query}'.")
-      return analysis_cache[cache_key]
+  if reputation is None:
+    reputation = get_source_reputation(topic)
+  if feedback_summary is None:
+    feedback_summary = summarize_feedback(reputation[0])
 
-  print(f"      CACHE MISS! Performing new analysis for {search_type}...")
+  ranked = rank_candidates(results, search_type, reputation, exclude_links)
+  winner = clear_winner(ranked)
+  if winner is not None:
+    return local_pick(winner, search_type, reputation)
+
+  print(f"      Analyzing {search_type} results for '{query}'...")
+  candidates, raw_by_id = _assign_ids(ranked, search_type, 'v' if search_type == 'video' else 'a')
 
-  feedback_summary = get_feedback_summary(topic)
-  
   analysis_prompt = f"""
-  You are a helpful learning assistant. From the following list of {search_type} search results for the query "{query}", pick the ONE best result for a complete beginner.
+  You are a helpful learning assistant. From the following {search_type} search results for the query "{query}", pick the ONE best result for a complete beginner.
 
-  Search Results (JSON format):
-  {json.dumps(results[:5])}
+  Search Results (JSON format, keyed by id, best-ranked first):
+  {json.dumps(candidates)}
 
   IMPORTANT CONTEXT:
   - User Feedback Summary: {feedback_summary}
-  - For videos, a high 'likeCount' relative to 'viewCount' is a strong signal of quality.
+  - For videos, 'likeRatio' is likes per view; a high value is a strong signal of quality.
   - A descriptive 'channelTitle' can also indicate a reliable source.
   
   Use all available information, including the user's past feedback and the video statistics, to make your decision. Strongly prefer sources the user has liked and avoid sources the user has disliked.
 
-  Your goal is to return a JSON object with the keys "title", "link", "reason"{', and "thumbnail" if this is a video result' if search_type == 'video' else ''}.
+  Your goal is to return a JSON object with the keys "id" (the id of your choice) and "reason".
   Your reason should be a one-sentence explanation for your choice, and if you used the feedback or statistics, briefly mention it.
-  {"If this is a video, include the 'thumbnail' URL from the original data." if search_type == 'video' else ""}
   Provide ONLY the JSON object and nothing else.
   """
 
   try:
-    response = model.invoke(analysis_prompt)
-    clean_json_string = response.content.strip().replace('```json', '').replace('```', '')
-    analysis_result = json.loads(clean_json_string)
-    
-    # ============================================================
-    # NEW: Preserve thumbnail from original results if it exists
-    # ============================================================
-    if search_type == 'video' and 'thumbnail' not in analysis_result:
-        # Find the selected video in the original results and add its thumbnail
-        selected_link = analysis_result.get('link', '')
-        for result in results[:5]:
-            if result.get('link') == selected_link and 'thumbnail' in result:
-                analysis_result['thumbnail'] = result['thumbnail']
-                break
-    # ============================================================
-    
-    analysis_cache[cache_key] = analysis_result
-    
-    return analysis_result
-  except (json.JSONDecodeError, Exception) as e:
-    if "429" in str(e) or "ResourceExhausted" in str(e):
-        print("      [Error] Rate limit hit during analysis. Try again in a minute.")
-        return {"title": "Rate Limit Hit", "link": "#", "reason": "The AI is thinking too fast! Please try again in a minute."}
-    
+    # Only an answer that names one of the candidates is worth caching
+    usable = lambda content: _pick_from_answer(_parse_json(content), raw_by_id, search_type) is not None
+    pick = _pick_from_answer(_parse_json(model.invoke(analysis_prompt, validate=usable).content), raw_by_id, search_type)
+    if pick is None:
+      raise ValueError("response does not name one of the candidates")
+    return pick
+  except RateLimitExceeded:
+    # Never turn a 429 into a placeholder pick; the module fails and nothing is saved
+    raise
+  except Exception as e:
+    # Nor a bad answer: a placeholder would be saved as if it were a real recommendation
     print(f"      [Error] Could not parse AI response for analysis: {e}")
-    return {"title": "Error", "link": "Error", "reason": "Failed to analyze results."}
\ No newline at end of file
+    raise AnalysisFailed(f"Could not pick a {search_type} result for '{query}': {e}") from e
+
+@metrics.timed("analysis.module")
+def analyze_module_results(model, topic: str, query: str, web_results, video_categories: dict):
+  """
+  Picks the best article and the best video in each category, with at most one model call.
+  Returns (curated_article, curated_videos). Categories with a clear local winner skip the
+  model; any field the model gets wrong falls back to a per-category analyze_results call,
+  so one bad field doesn't cost the whole batch. A video category whose fallback fails too is left
+  out; a failed article pick raises AnalysisFailed, since a module can't be saved without one.
+  """
+  candidates = {'article': web_results, **video_categories}
+  reputation = get_source_reputation(topic)
+  feedback_summary = summarize_feedback(reputation[0])
+
+  picks = {}
+  ranked_by_name = {}
+  picked_links = set()
+  for name, results in candidates.items():
+    search_type = 'web' if name == 'article' else 'video'
+    if not results:
+      picks[name] = {'title': 'N/A', "link": 'N/A', "reason": f"No {search_type} results found."}
+      continue
+    # The same video often appears under several sort orders; prefer a different one per category
+    ranked = rank_candidates(results, search_type, reputation, picked_links if search_type == 'video' else ())
+    winner = clear_winner(ranked)
+    if winner is None:
+      ranked_by_name[name] = ranked
+      continue
+    picks[name] = local_pick(winner, search_type, reputation)
+    if search_type == 'video':
+      picked_links.add(winner.get('link'))
+
+  if ranked_by_name:
+    print(f"      Analyzing {len(ranked_by_name)} result set(s) for '{query}' in one batch...")
+    # Each video is sent once, however many categories it appears in
+    videos, categories, raw_by_name = {}, {}, {}
+    id_by_link = {}
+    for name, ranked in ranked_by_name.items():
+      search_type = 'web' if name == 'article' else 'video'
+      if search_type == 'web':
+        compact, raw_by_id = _assign_ids(ranked, search_type, 'a')
+        categories[name] = compact
+        raw_by_name[name] = raw_by_id
+        continue
+      compact, raw = _assign_ids(ranked, search_type, 'v')
+      raw_by_name[name] = {}
+      for candidate_id, candidate in compact.items():
+        result = raw[candidate_id]
+        shared_id = id_by_link.setdefault(result.get('link'), f"v{len(id_by_link) + 1}")
+        videos[shared_id] = candidate
+        raw_by_name[name][shared_id] = result
+      categories[name] = list(raw_by_name[name])
+
+    batch_prompt = f"""
+  You are a helpful learning assistant. Below are search results for the query "{query}", grouped by category.
+  For EACH category, pick the ONE best result for a complete beginner. The "article" category contains web results;
+  every other category lists the ids of YouTube videos described under "videos". Candidates are listed best-ranked first.
+
+  Search Results (JSON format):
+  {json.dumps({'categories': categories, 'videos': videos})}
+
+  IMPORTANT CONTEXT:
+  - User Feedback Summary: {feedback_summary}
+  - For videos, 'likeRatio' is likes per view; a high value is a strong signal of quality.
+  - A descriptive 'channelTitle' can also indicate a reliable source.
+  - Avoid picking the same video for two categories when another good candidate exists.
+
+  Use all available information, including the user's past feedback and the video statistics, to make your decision. Strongly prefer sources the user has liked and avoid sources the user has disliked.
+
+  Return a single JSON object with exactly these keys: {json.dumps(list(categories))}.
+  Each value must be a JSON object with the keys "id" (the id of the chosen result) and "reason".
+  Each reason should be a one-sentence explanation for your choice, and if you used the feedback or statistics, briefly mention it.
+  Provide ONLY the JSON object and nothing else.
+  """
+
+    def usable(content):
+      # As in analyze_results: only an answer whose every pick names a candidate is worth caching
+      answer = _parse_json(content)
+      return all(
+        _pick_from_answer(answer.get(name), raw_by_name[name], 'web' if name == 'article' else 'video') is not None
+        for name in ranked_by_name
+      )
+
+    try:
+      batch_result = _parse_json(model.invoke(batch_prompt, validate=usable).content)
+    except RateLimitExceeded:
+      raise
+    except Exception as e:
+      print(f"      [Error] Batched analysis failed, falling back to one call per category: {e}")
+      batch_result = {}
+
+    for name in ranked_by_name:
+      search_type = 'web' if name == 'article' else 'video'
+      pick = _pick_from_answer(batch_result.get(name), raw_by_name[name], search_type)
+      if pick is not None:
+        picks[name] = pick
+        continue
+
+      results = candidates[name]
+      if name == 'article':
+        picks[name] = analyze_results(model, topic, results, query, 'web', feedback_summary, reputation)
+        continue
+      try:
+        picks[name] = analyze_results(model, topic, results, f"{name} video for {query}", "video", feedback_summary, reputation, picked_links)
+      except AnalysisFailed as e:
+        print(f"      [Error] Leaving out the '{name}' videos: {e}")
+
+  curated_article = picks['article']
+  curated_videos = {category: picks[category] for category in video_categories if category in picks}
+  return curated_article, curated_videos
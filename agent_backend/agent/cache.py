@@ -0,0 +1,148 @@
+# File: agent_backend/agent/cache.py
+#
+# A small persistent key-value cache on top of SQLite. Every worker process on
+# the machine shares the same file, entries can expire after a TTL, and the
+# least recently used entries are evicted once the cache grows past its bound.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from . import config
+
+# How many writes happen between checks of the size bound
+_TRIM_EVERY = 50
+
+class SqliteCache:
+  """A size-bounded LRU cache with optional TTL, persisted in CACHE_DIR/<name>.sqlite3."""
+
+  def __init__(self, name: str, max_entries: int, ttl_seconds=None, encode=json.dumps, decode=json.loads, path=None):
+    self.name = name
+    self.max_entries = max_entries
+    self.ttl_seconds = ttl_seconds
+    self._encode = encode
+    self._decode = decode
+    self._path = path or os.path.join(config.CACHE_DIR, f"{name}.sqlite3")
+    self._lock = threading.Lock()
+    self._conn = None
+    self._writes = 0
+    self.hits = 0
+    self.misses = 0
+
+  @staticmethod
+  def make_key(*parts) -> str:
+    """Builds a stable key from any JSON-serialisable parts."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+  def _connection(self):
+    if self._conn is None:
+      os.makedirs(os.path.dirname(self._path), exist_ok=True)
+      conn = sqlite3.connect(self._path, timeout=10, check_same_thread=False, isolation_level=None)
+      conn.execute("PRAGMA journal_mode=WAL")
+      conn.execute("PRAGMA synchronous=NORMAL")
+      conn.execute(
+        "CREATE TABLE IF NOT EXISTS entries ("
+        " key TEXT PRIMARY KEY, value BLOB NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+      )
+      conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_accessed_at ON entries (accessed_at)")
+      self._conn = conn
+    return self._conn
+
+  def get_entry(self, key: str):
+    """Returns (value, age_in_seconds) ignoring the TTL, or None if the key is absent."""
+    with self._lock:
+      conn = self._connection()
+      row = conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+      if row is None:
+        return None
+      now = time.time()
+      conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+    return self._decode(row[0]), now - row[1]
+
+  def get(self, key: str, default=None):
+    entry = self.get_entry(key)
+    if entry is None or (self.ttl_seconds is not None and entry[1] > self.ttl_seconds):
+      self.misses += 1
+      return default
+    self.hits += 1
+    return entry[0]
+
+  def set(self, key: str, value):
+    encoded = self._encode(value)
+    with self._lock:
+      conn = self._connection()
+      now = time.time()
+      conn.execute(
+        "INSERT OR REPLACE INTO entries (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+        (key, encoded, now, now),
+      )
+      self._writes += 1
+      if self._writes % _TRIM_EVERY == 0:
+        self._trim(conn)
+
+  def _trim(self, conn):
+    if self.ttl_seconds is not None:
+      conn.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+    excess = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+    if excess > 0:
+      conn.execute(
+        "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed_at ASC LIMIT ?)",
+        (excess,),
+      )
+
+  def stats(self) -> dict:
+    return {"name": self.name, "hits": self.hits, "misses": self.misses}
+
+class MemoryCache:
+  """Process-local LRU cache with optional TTL and the same interface as SqliteCache."""
+
+  def __init__(self, name: str, max_entries: int, ttl_seconds=None):
+    self.name = name
+    self.max_entries = max_entries
+    self.ttl_seconds = ttl_seconds
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+
+  make_key = staticmethod(SqliteCache.make_key)
+
+  def get_entry(self, key: str):
+    with self._lock:
+      if key not in self._entries:
+        return None
+      self._entries.move_to_end(key)
+      value, created_at = self._entries[key]
+    return value, time.time() - created_at
+
+  def get(self, key: str, default=None):
+    entry = self.get_entry(key)
+    if entry is None or (self.ttl_seconds is not None and entry[1] > self.ttl_seconds):
+      self.misses += 1
+      return default
+    self.hits += 1
+    return entry[0]
+
+  def set(self, key: str, value):
+    with self._lock:
+      self._entries[key] = (value, time.time())
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def stats(self) -> dict:
+    return {"name": self.name, "hits": self.hits, "misses": self.misses}
+
+def make_cache(name: str, backend: str, max_entries: int, ttl_seconds=None):
+  """Builds a cache for the configured backend: 'sqlite', 'memory' or 'none' (returns None)."""
+  if backend == "sqlite":
+    return SqliteCache(name, max_entries=max_entries, ttl_seconds=ttl_seconds)
+  if backend == "memory":
+    return MemoryCache(name, max_entries=max_entries, ttl_seconds=ttl_seconds)
+  if backend == "none":
+    return None
+  raise ValueError(f"Unknown cache backend '{backend}' for the {name} cache")
@@ -0,0 +1,23 @@
+# File: agent_backend/agent/concurrency.py
+#
+# Shared concurrency primitives for the I/O-bound parts of the pipeline: one
+# bounded thread pool for fan-out, and a semaphore per upstream service so a
+# burst of work can't open more concurrent calls than that service tolerates.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import config
+
+# Searches and analyses for a module are submitted here and run side by side
+io_pool = ThreadPoolExecutor(max_workers=config.IO_POOL_MAX_WORKERS, thread_name_prefix="agent-io")
+
+_upstream_limits = {
+  "serper": threading.BoundedSemaphore(config.SERPER_MAX_CONCURRENCY),
+  "youtube": threading.BoundedSemaphore(config.YOUTUBE_MAX_CONCURRENCY),
+  "gemini": threading.BoundedSemaphore(config.GEMINI_MAX_CONCURRENCY),
+}
+
+def upstream_limit(upstream: str):
+  """Returns the semaphore bounding concurrent calls to an upstream. Use as `with upstream_limit("serper"):`."""
+  return _upstream_limits[upstream]
@@ -23,20 +23,121 @@ SERPER_API_KEY = os.getenv("SERPER_API_KEY")
 #Database URL
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Storage backend: 'postgres' (DATABASE_URL, e.g. Neon) or 'sqlite' (an embedded database file,
+# for single-node deployments and running everything locally without a database server)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "postgres")
+SQLITE_PATH = os.getenv("SQLITE_PATH", os.path.join(parent_dir, ".data", "learning_buddy.db"))
+SQLITE_BUSY_TIMEOUT_SECONDS = float(os.getenv("SQLITE_BUSY_TIMEOUT_SECONDS", "10"))
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
+# The switch wins over a Postgres DATABASE_URL left in .env; a sqlite:// DATABASE_URL is still honoured
+if STORAGE_BACKEND == "sqlite" and not (DATABASE_URL or "").startswith("sqlite:"):
+  DATABASE_URL = f"sqlite:///{SQLITE_PATH}"
+
+# Connection pool, tuned for a serverless Postgres (Neon) that suspends idle computes:
+# connections are checked before use and recycled before the server drops them, and
+# the connect timeout leaves room for a cold start
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "240"))
+DB_CONNECT_TIMEOUT_SECONDS = int(os.getenv("DB_CONNECT_TIMEOUT_SECONDS", "15"))
+
 #YouTube API key
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
 
 # It's good practice to define model names and settings here
 CHAT_MODEL_NAME = "gemini-2.5-flash" # Note: Updated to a more standard model name, 2.5 is not a public name yet.
-EMBEDDING_MODEL_NAME = "models/embedding-001"
+EMBEDDING_MODEL_NAME = "models/gemini-embedding-001"
+
+# Plan generation: 'pipeline' (outline -> parallel research -> persist) or 'agent' (LangChain ReAct loop)
+PLAN_GENERATION_MODE = os.getenv("PLAN_GENERATION_MODE", "pipeline")
+PIPELINE_MAX_PARALLEL_MODULES = int(os.getenv("PIPELINE_MAX_PARALLEL_MODULES", "5"))
+
+# Video notes: transcripts are summarized in chunks of about this many tokens
+NOTES_CHUNK_MAX_TOKENS = int(os.getenv("NOTES_CHUNK_MAX_TOKENS", "4000"))
+
+# Local pre-ranking of search results: how far ahead the top candidate must score to be
+# picked without the model, and how many compact candidates the model sees otherwise
+RANKING_CLEAR_WIN_MARGIN = float(os.getenv("RANKING_CLEAR_WIN_MARGIN", "0.3"))
+RANKING_LLM_TOP_K = int(os.getenv("RANKING_LLM_TOP_K", "3"))
+
+# Concurrency: size of the shared I/O thread pool and per-upstream limits on concurrent calls
+IO_POOL_MAX_WORKERS = int(os.getenv("IO_POOL_MAX_WORKERS", "16"))
+SERPER_MAX_CONCURRENCY = int(os.getenv("SERPER_MAX_CONCURRENCY", "4"))
+YOUTUBE_MAX_CONCURRENCY = int(os.getenv("YOUTUBE_MAX_CONCURRENCY", "6"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+
+# Gemini quotas (requests and tokens per minute) and retries for 429 responses
+GEMINI_CHAT_RPM = float(os.getenv("GEMINI_CHAT_RPM", "60"))
+GEMINI_CHAT_TPM = float(os.getenv("GEMINI_CHAT_TPM", "1000000"))
+GEMINI_EMBEDDING_RPM = float(os.getenv("GEMINI_EMBEDDING_RPM", "100"))
+GEMINI_EMBEDDING_TPM = float(os.getenv("GEMINI_EMBEDDING_TPM", "30000"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+GEMINI_BACKOFF_BASE_SECONDS = float(os.getenv("GEMINI_BACKOFF_BASE_SECONDS", "2"))
+
+# Shared HTTP client: connection pool, timeouts and retries
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+HTTP_READ_TIMEOUT_SECONDS = float(os.getenv("HTTP_READ_TIMEOUT_SECONDS", "20"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE_SECONDS = float(os.getenv("HTTP_BACKOFF_BASE_SECONDS", "0.5"))
+
+# Timeout for each YouTube Data API call
+YOUTUBE_TIMEOUT_SECONDS = int(os.getenv("YOUTUBE_TIMEOUT_SECONDS", "15"))
+
+# Persistent caches (SQLite files shared by every worker on this machine)
+CACHE_DIR = os.getenv("AGENT_CACHE_DIR", os.path.join(parent_dir, ".cache"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "20000"))
+
+# LLM response cache: 'sqlite' (shared on disk), 'memory' (per process) or 'none'
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "sqlite")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Search result cache. Video statistics change faster than web results, so YouTube entries expire sooner.
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "20000"))
+SERPER_CACHE_TTL_SECONDS = int(os.getenv("SERPER_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+YOUTUBE_CACHE_TTL_SECONDS = int(os.getenv("YOUTUBE_CACHE_TTL_SECONDS", str(24 * 3600)))
+SEARCH_CACHE_STALE_WHILE_REVALIDATE = os.getenv("SEARCH_CACHE_STALE_WHILE_REVALIDATE", "true").lower() == "true"
+# Background refreshes of stale entries run on their own threads, which may wait on the shared I/O pool
+SEARCH_CACHE_REFRESH_WORKERS = int(os.getenv("SEARCH_CACHE_REFRESH_WORKERS", "2"))
+
+# Plan similarity search. Above this many plans the HNSW index is used (if hnswlib is installed).
+SIMILARITY_THRESHOLD = 0.6
+PLAN_INDEX_ANN_MIN_PLANS = int(os.getenv("PLAN_INDEX_ANN_MIN_PLANS", "50000"))
+# How often the index is compared with the plan ids in the database, to pick up plans whose createdAt
+# is behind its watermark (late commits, skewed clocks) and drop deleted ones
+PLAN_INDEX_RECONCILE_SECONDS = int(os.getenv("PLAN_INDEX_RECONCILE_SECONDS", "60"))
+
+# Single-flight plan generation: concurrent requests for the same topic (or, with PLAN_COALESCE_SIMILAR,
+# one above SIMILARITY_THRESHOLD) wait for a single generation. A claim expires this long after the
+# generating worker's last heartbeat, so a crashed worker only holds a topic up briefly.
+PLAN_COALESCE_SIMILAR = os.getenv("PLAN_COALESCE_SIMILAR", "true").lower() == "true"
+PLAN_CLAIM_TTL_SECONDS = int(os.getenv("PLAN_CLAIM_TTL_SECONDS", "60"))
+PLAN_CLAIM_POLL_SECONDS = float(os.getenv("PLAN_CLAIM_POLL_SECONDS", "1.0"))
+
+# Parsed plan snapshots kept in memory per process (validated against the stored ETag on every read)
+PLAN_SNAPSHOT_CACHE_SIZE = int(os.getenv("PLAN_SNAPSHOT_CACHE_SIZE", "256"))
+
+# Metrics: a JSON summary per request is appended to METRICS_DIR/runs.jsonl, and workers
+# keep a Prometheus text file there up to date
+METRICS_EXPORT = os.getenv("METRICS_EXPORT", "true").lower() == "true"
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(parent_dir, ".metrics"))
 
 # --- Validation ---
-# This is a crucial step to ensure the application doesn't start with missing keys.
-if not GEMINI_API_KEY:
-  raise ValueError("Missing GEMINI_API_KEY in .env file or failed to load .env")
-if not SERPER_API_KEY:
-  raise ValueError("Missing SERPER_API_KEY in .env file or failed to load .env")
-if not DATABASE_URL:
-  raise ValueError("Missing DATABASE_URL in .env file or failed to load .env")
-if not YOUTUBE_API_KEY:
-  raise ValueError("Missing YOUTUBE_API_KEY in .env file or failed to load .env")
\ No newline at end of file
+# Keys are validated lazily, per capability, so an entry point only needs the
+# keys for the services it actually uses (e.g. YouTube notes need no DATABASE_URL).
+_CAPABILITY_KEYS = {
+  "gemini": ("GEMINI_API_KEY",),
+  "web_search": ("SERPER_API_KEY",),
+  "youtube": ("YOUTUBE_API_KEY",),
+  "database": ("DATABASE_URL",),
+}
+
+def require(capability: str):
+  """Raises a ValueError if any key needed for the given capability is missing."""
+  for key in _CAPABILITY_KEYS[capability]:
+    if not globals().get(key):
+      raise ValueError(f"Missing {key} in .env file or failed to load .env")
@@ -1,17 +1,84 @@
 # agent/database.py
+#
+# Two storage backends behind the same SQLAlchemy engine/session interface:
+#   - Postgres (Neon) from DATABASE_URL, with a pool tuned for serverless cold starts
+#   - SQLite, an embedded file in WAL mode, for single-node deployments and local runs
+# The models and queries are dialect-agnostic, so everything above this module works on both.
 
 import os
-from sqlalchemy import create_engine
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from dotenv import load_dotenv
-from . import config
+from sqlalchemy.pool import StaticPool
+from . import config, metrics
+
+config.require("database")
+
+def _create_postgres_engine(url):
+  # The Engine is the heart of the connection. It manages the connection pool.
+  # pool_pre_ping replaces connections the server closed while the compute was suspended,
+  # and pool_recycle retires them before its idle timeout.
+  return create_engine(
+    url,
+    pool_pre_ping=True,
+    pool_size=config.DB_POOL_SIZE,
+    max_overflow=config.DB_MAX_OVERFLOW,
+    pool_timeout=config.DB_POOL_TIMEOUT_SECONDS,
+    pool_recycle=config.DB_POOL_RECYCLE_SECONDS,
+    # A suspended Neon compute can take a few seconds to wake up
+    connect_args={"connect_timeout": config.DB_CONNECT_TIMEOUT_SECONDS},
+  )
+
+def _create_sqlite_engine(url):
+  connect_args = {"check_same_thread": False, "timeout": config.SQLITE_BUSY_TIMEOUT_SECONDS}
+  if url.database and url.database != ":memory:":
+    os.makedirs(os.path.dirname(os.path.abspath(url.database)), exist_ok=True)
+    sqlite_engine = create_engine(url, connect_args=connect_args, pool_size=config.DB_POOL_SIZE, max_overflow=config.DB_MAX_OVERFLOW)
+  else:
+    # An in-memory database only exists on its one connection, so every session shares it
+    sqlite_engine = create_engine(url, connect_args=connect_args, poolclass=StaticPool)
+
+  @event.listens_for(sqlite_engine, "connect")
+  def _set_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers run alongside the single writer; NORMAL sync is durable in WAL mode
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_MB * 1024}")
+    cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_MB * 1024 * 1024}")
+    cursor.execute(f"PRAGMA busy_timeout={int(config.SQLITE_BUSY_TIMEOUT_SECONDS * 1000)}")
+    cursor.close()
+
+  return sqlite_engine
+
+_url = make_url(config.DATABASE_URL)
+if _url.get_backend_name() == "sqlite":
+  engine = _create_sqlite_engine(_url)
+else:
+  engine = _create_postgres_engine(_url)
+
+# Every SQL statement is timed, whichever code path issued it
+@event.listens_for(engine, "before_cursor_execute")
+def _start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+  conn.info.setdefault("statement_start", []).append(time.perf_counter())
+
+@event.listens_for(engine, "after_cursor_execute")
+def _stop_statement_timer(conn, cursor, statement, parameters, context, executemany):
+  metrics.observe("db.statement", (time.perf_counter() - conn.info["statement_start"].pop()) * 1000)
 
-# The Engine is the heart of the connection. It manages the connection pool.
-engine = create_engine(config.DATABASE_URL)
+@event.listens_for(engine, "handle_error")
+def _fail_statement_timer(exception_context):
+  starts = exception_context.connection.info.get("statement_start") if exception_context.connection is not None else None
+  if starts:
+    metrics.observe("db.statement", (time.perf_counter() - starts.pop()) * 1000, ok=False)
 
 # A Session is our "workspace" for talking to the database.
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Base is the master blueprint that all our table models will inherit from.
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
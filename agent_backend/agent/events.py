@@ -0,0 +1,43 @@
+# File: agent_backend/agent/events.py
+#
+# Structured progress events, kept separate from human log output. The backend
+# calls emit() at each milestone; whoever runs it (the CLI with --events, or a
+# pool worker) installs a sink that delivers the events to the frontend.
+#
+# Events:
+#   plan_outline    {"topic": str, "modules": [str]}
+#   module_ready    {"module": <module payload, as in snapshots.plan_payload>}
+#   plan_discarded  {"topic": str}  (the modules sent so far were not saved; an error follows)
+#   notes_chunk     {"part": int, "total": int, "notes": str}
+#   error           {"message": str}
+#   done            {"result": <final JSON payload>}
+
+import threading
+
+_sink = None
+_lock = threading.Lock()
+
+def set_sink(sink):
+  """Installs a callable that receives every event as {"event": name, "data": {...}}; None disables events."""
+  global _sink
+  _sink = sink
+
+def emit(event: str, **data):
+  sink = _sink
+  if sink is None:
+    return
+  with _lock:
+    sink({"event": event, "data": data})
+
+def module_payload(module_id, step_number, title, article, videos, is_complete=False) -> dict:
+  """Builds the same module shape the frontend gets from snapshots.plan_payload."""
+  return {
+    "id": module_id,
+    "stepNumber": step_number,
+    "title": title,
+    "is_complete": is_complete,
+    "articleTitle": article['title'],
+    "articleReason": article['reason'],
+    "articleLink": article['link'],
+    "videos": videos,
+  }
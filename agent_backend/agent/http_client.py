@@ -0,0 +1,84 @@
+# File: agent_backend/agent/http_client.py
+#
+# The shared HTTP client for every tool that calls an HTTP API directly. One
+# pooled requests.Session keeps connections alive between calls, every call
+# has connect and read timeouts, and transient failures are retried with
+# exponential backoff plus jitter. Per-call latency is recorded per upstream.
+
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import config
+from .logger import logger
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+_latency_lock = threading.Lock()
+_latency_stats = {}
+
+def get_session() -> requests.Session:
+  """Returns the process-wide session, creating it on first use."""
+  global _session
+  with _session_lock:
+    if _session is None:
+      session = requests.Session()
+      adapter = HTTPAdapter(pool_connections=config.HTTP_POOL_CONNECTIONS, pool_maxsize=config.HTTP_POOL_MAXSIZE)
+      session.mount("https://", adapter)
+      session.mount("http://", adapter)
+      _session = session
+  return _session
+
+def _record_latency(upstream: str, elapsed_ms: float, ok: bool):
+  with _latency_lock:
+    stats = _latency_stats.setdefault(upstream, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+    stats["calls"] += 1
+    stats["total_ms"] += elapsed_ms
+    stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+    if not ok:
+      stats["errors"] += 1
+
+def latency_stats() -> dict:
+  """Returns {upstream: {calls, errors, total_ms, max_ms}} for every call made by this process."""
+  with _latency_lock:
+    return {upstream: dict(stats) for upstream, stats in _latency_stats.items()}
+
+def _backoff_seconds(attempt: int) -> float:
+  # Exponential backoff with "full jitter": a random wait up to the exponential cap
+  return random.uniform(0, config.HTTP_BACKOFF_BASE_SECONDS * (2 ** attempt))
+
+def request(method: str, url: str, upstream: str, max_retries=None, **kwargs) -> requests.Response:
+  """
+  Sends a request through the shared session. Retries connection errors, timeouts and
+  RETRY_STATUS_CODES up to `max_retries` times, then returns the last response (or raises
+  the last exception). Callers still call `raise_for_status()` themselves.
+  """
+  if max_retries is None:
+    max_retries = config.HTTP_MAX_RETRIES
+  kwargs.setdefault("timeout", (config.HTTP_CONNECT_TIMEOUT_SECONDS, config.HTTP_READ_TIMEOUT_SECONDS))
+
+  attempt = 0
+  while True:
+    start = time.perf_counter()
+    try:
+      response = get_session().request(method, url, **kwargs)
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+      _record_latency(upstream, (time.perf_counter() - start) * 1000, ok=False)
+      if attempt >= max_retries:
+        raise
+      logger.warning(f"{upstream} request failed ({e}); retrying ({attempt + 1}/{max_retries}).")
+    else:
+      ok = response.status_code not in RETRY_STATUS_CODES
+      _record_latency(upstream, (time.perf_counter() - start) * 1000, ok=ok)
+      if ok or attempt >= max_retries:
+        return response
+      logger.warning(f"{upstream} returned HTTP {response.status_code}; retrying ({attempt + 1}/{max_retries}).")
+
+    time.sleep(_backoff_seconds(attempt))
+    attempt += 1
@@ -0,0 +1,86 @@
+# File: agent_backend/agent/llm.py
+#
+# A caching layer around the chat model. Every prompt call site (planner,
+# search query, analysis, note-taker) goes through CachedChatModel.invoke, so
+# an identical prompt sent by any user on this machine is only paid for once.
+
+import hashlib
+
+from . import config, metrics
+from .cache import make_cache
+from .concurrency import upstream_limit
+from .logger import logger
+from .rate_limit import call_with_rate_limit, chat_limiter, estimate_tokens
+
+class CachedResponse:
+  """Stands in for the model's message object; call sites only read `.content`."""
+
+  def __init__(self, content: str):
+    self.content = content
+
+class CachedChatModel:
+  """Wraps a LangChain chat model and caches `invoke` results by prompt, model and temperature."""
+
+  def __init__(self, raw_model, cache=None):
+    self.raw_model = raw_model
+    self.cache = cache if cache is not None else make_cache(
+      "llm_responses",
+      backend=config.LLM_CACHE_BACKEND,
+      max_entries=config.LLM_CACHE_MAX_ENTRIES,
+      ttl_seconds=config.LLM_CACHE_TTL_SECONDS,
+    )
+    self.model_name = getattr(raw_model, "model", type(raw_model).__name__)
+    self.temperature = getattr(raw_model, "temperature", None)
+    metrics.register_collector("llm_cache", self.stats)
+
+  def cache_key(self, prompt: str) -> str:
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return self.cache.make_key(self.model_name, self.temperature, prompt_hash)
+
+  def invoke(self, prompt: str, validate=None):
+    """
+    Returns the model's response to `prompt`, from the cache when possible. Only non-empty
+    responses that pass `validate(content)` (when given) are cached, so a completion the caller
+    can't use is never replayed; a validator that raises counts as a rejection.
+    """
+    if self.cache is None:
+      return self._invoke_upstream(prompt)
+
+    key = self.cache_key(prompt)
+    cached = self.cache.get(key)
+    if cached is not None:
+      if self._is_valid(cached, validate):
+        logger.info("LLM cache hit.")
+        return CachedResponse(cached)
+      logger.info("Ignoring a cached LLM response that no longer passes validation.")
+
+    response = self._invoke_upstream(prompt)
+    if isinstance(response.content, str) and response.content and self._is_valid(response.content, validate):
+      self.cache.set(key, response.content)
+    return response
+
+  @staticmethod
+  def _is_valid(content: str, validate) -> bool:
+    if validate is None:
+      return True
+    try:
+      return bool(validate(content))
+    except Exception:
+      return False
+
+  def _invoke_upstream(self, prompt: str):
+    with metrics.span("gemini.chat"), upstream_limit("gemini"):
+      response = call_with_rate_limit(chat_limiter, lambda: self.raw_model.invoke(prompt), estimate_tokens(prompt))
+    self._record_usage(prompt, response)
+    return response
+
+  def _record_usage(self, prompt: str, response):
+    usage = getattr(response, "usage_metadata", None)
+    if isinstance(usage, dict) and "input_tokens" in usage:
+      metrics.record_tokens(self.model_name, usage.get("input_tokens", 0), usage.get("output_tokens", 0))
+    else:
+      content = response.content if isinstance(response.content, str) else ""
+      metrics.record_tokens(self.model_name, estimate_tokens(prompt), estimate_tokens(content), estimated=True)
+
+  def stats(self) -> dict:
+    return self.cache.stats() if self.cache is not None else {"name": "llm_responses", "hits": 0, "misses": 0}
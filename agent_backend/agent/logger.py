@@ -1,4 +1,7 @@
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
 
 # 1. Create a logger instance
@@ -13,9 +16,15 @@ stream_handler = logging.StreamHandler(sys.stdout)
 stream_handler.setFormatter(log_format)
 
 # 4. Create a handler to write logs to a file
-file_handler = logging.FileHandler("agent_run.log")
+file_handler = logging.FileHandler("agent_run.log", delay=True)
 file_handler.setFormatter(log_format)
 
-# 5. Add the handlers to our logger
-logger.addHandler(stream_handler)
-logger.addHandler(file_handler)
\ No newline at end of file
+# 5. Callers only put records on a queue; a background thread does the console and file I/O,
+#    so a slow disk or terminal never blocks a request
+log_queue = queue.SimpleQueue()
+listener = logging.handlers.QueueListener(log_queue, stream_handler, file_handler, respect_handler_level=True)
+logger.addHandler(logging.handlers.QueueHandler(log_queue))
+listener.start()
+
+# 6. Flush whatever is still queued when the process exits
+atexit.register(listener.stop)
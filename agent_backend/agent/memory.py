@@ -1,55 +1,116 @@
-import json
 import uuid
+from dataclasses import dataclass
 import numpy as np
+from . import config, metrics, snapshots
 from .database import SessionLocal
-from .models import Note, Plan, Module, Feedback
+from .models import Note, Plan, Module, Feedback, SourceReputation
+from .cache import SqliteCache
+from .ranking import source_for_link
+from .rate_limit import RateLimitExceeded, call_with_rate_limit, embedding_limiter, estimate_tokens
+from .vector_index import normalize_topic, plan_index
 from sqlalchemy.orm import joinedload
-import tldextract
-from sqlalchemy import func
+from sqlalchemy import case, func, insert
+from sqlalchemy.exc import IntegrityError
+
+# Embeddings are stored as packed float32 so each entry is 4 bytes per dimension
+_embedding_cache = SqliteCache(
+  "embeddings",
+  max_entries=config.EMBEDDING_CACHE_MAX_ENTRIES,
+  encode=lambda vector: np.asarray(vector, dtype=np.float32).tobytes(),
+  decode=lambda blob: np.frombuffer(blob, dtype=np.float32).tolist(),
+)
+metrics.register_collector("embedding_cache", _embedding_cache.stats)
 
 def get_embedding(genai_client, text):
-  #Here we are generating a vector embedding for the text
+  #Here we are generating a vector embedding for the text (or reusing a cached one)
+  cache_key = SqliteCache.make_key(config.EMBEDDING_MODEL_NAME, normalize_topic(text))
+  cached = _embedding_cache.get(cache_key)
+  if cached is not None:
+    return cached
+
   try:
-    result = genai_client.embed_content(model="models/gemini-embedding-001", content=text)
-    return result["embedding"]
+    with metrics.span("gemini.embedding"):
+      result = call_with_rate_limit(
+        embedding_limiter,
+        lambda: genai_client.embed_content(model=config.EMBEDDING_MODEL_NAME, content=text),
+        estimate_tokens(text),
+      )
+    metrics.record_tokens(config.EMBEDDING_MODEL_NAME, estimate_tokens(text), 0, estimated=True)
+  except RateLimitExceeded:
+    raise
   except Exception as e:
     raise RuntimeError(f"[Fatal Error] Could not create embedding: {e}")
+  _embedding_cache.set(cache_key, result["embedding"])
+  return result["embedding"]
   
-def find_similar_plan_in_db(user_embedding):
+def _load_plan_with_modules(plan_id: str, db=None):
+  if db is not None:
+    return db.query(Plan).options(joinedload(Plan.modules)).filter(Plan.id == plan_id).first()
+  db = SessionLocal()
+  try:
+    return db.query(Plan).options(joinedload(Plan.modules)).filter(Plan.id == plan_id).first()
+  finally:
+    db.close()
+
+@metrics.timed("db.find_plan_by_topic")
+def find_plan_by_topic(topic: str):
+  """Exact-match fast path: returns the plan whose topic equals this one (ignoring case and spacing), without embedding it."""
+  # The index refresh and the plan load share one session (and connection checkout)
+  db = SessionLocal()
+  try:
+    plan_index.refresh(db)
+    plan_id = plan_index.lookup_topic(topic)
+    return _load_plan_with_modules(plan_id, db) if plan_id else None
+  finally:
+    db.close()
+
+@metrics.timed("db.find_plan_snapshot_by_topic")
+def find_plan_snapshot_by_topic(topic: str):
+  """Like find_plan_by_topic, but returns the plan's Snapshot instead of loading the plan and its modules."""
+  db = SessionLocal()
+  try:
+    plan_index.refresh(db)
+    plan_id = plan_index.lookup_topic(topic)
+    return snapshots.get_snapshot(plan_id, db) if plan_id else None
+  finally:
+    db.close()
+
+@metrics.timed("db.find_similar_plans")
+def find_similar_plans(user_embedding, k: int = 3, threshold: float = config.SIMILARITY_THRESHOLD):
+  """Returns up to k PlanMatch objects (plan_id, topic, score) scoring above the threshold, best first."""
   if user_embedding is None:
-    return None
-  
-  SIMILARITY_THRESHOLD = 0.6
+    return []
 
   db = SessionLocal()
   try:
-    all_plans = db.query(Plan).options(joinedload(Plan.modules)).all()
-    if not all_plans:
-      return None
-    
-    best_match = None
-    highest_similarity = 0.0
-    
-    user_vector = np.array(user_embedding)
-
-    for plan in all_plans:
-      saved_vector = np.array(plan.embedding)
-      cosine_similarity = np.dot(user_vector, saved_vector) / (np.linalg.norm(user_vector) * np.linalg.norm(saved_vector))
-
-      if cosine_similarity > highest_similarity:
-        highest_similarity = cosine_similarity
-        best_match = plan
-    
-    if highest_similarity > SIMILARITY_THRESHOLD:
-      print(f"  > Found a similar plan in DB ('{best_match.topic}') with similarity: {highest_similarity:.2f}")
-      # The 'best_match' object already contains all the modules thanks to the 'relationship'
-      return best_match
-  
+    plan_index.refresh(db)
   finally:
     db.close()
 
-  return None
+  return [match for match in plan_index.search(user_embedding, k) if match.score > threshold]
+
+def find_similar_plan_in_db(user_embedding):
+  matches = find_similar_plans(user_embedding, k=1)
+  if not matches:
+    return None
+
+  # Only the winning plan's modules are loaded
+  best_match = matches[0]
+  plan = _load_plan_with_modules(best_match.plan_id)
+  if plan:
+    print(f"  > Found a similar plan in DB ('{plan.topic}') with similarity: {best_match.score:.2f}")
+  return plan
 
+def find_similar_plan_snapshot(user_embedding):
+  """Returns the Snapshot of the most similar plan above the threshold, or None."""
+  matches = find_similar_plans(user_embedding, k=1)
+  if not matches:
+    return None
+  best_match = matches[0]
+  print(f"  > Found a similar plan in DB ('{best_match.topic}') with similarity: {best_match.score:.2f}")
+  return snapshots.get_snapshot(best_match.plan_id)
+
+@metrics.timed("db.mark_module_as_complete")
 def mark_module_as_complete(module_id: str):
   """Updates the module's status to complete in the database."""
   db = SessionLocal()
@@ -58,6 +119,7 @@ def mark_module_as_complete(module_id: str):
     module_to_update = db.query(Module).filter(Module.id == module_id).first()
     if module_to_update:
       module_to_update.is_complete = True
+      snapshots.invalidate(db, module_to_update.plan_id)
       db.commit()
       print(f"Progress saved for module: {module_to_update.title}")
     else:
@@ -68,8 +130,69 @@ def mark_module_as_complete(module_id: str):
   finally:
     db.close()
 
+# The topic_key of the global (all topics) reputation rows
+GLOBAL_REPUTATION_KEY = ''
+
+def _rating_column(rating: int):
+  if rating >= 4: # 4 or 5 stars is a "like"
+    return 'likes'
+  if rating <= 2: # 1 or 2 stars is a "dislike"
+    return 'dislikes'
+  return None
+
+def _add_reputation(db, counts: dict):
+  """
+  Adds like/dislike counts ({(topic_key, source): [likes, dislikes]}) to the reputation table,
+  creating rows as needed: one multi-row upsert where the dialect has one.
+  """
+  rows = [
+    {'topic_key': topic_key, 'source': source, 'likes': likes, 'dislikes': dislikes}
+    for (topic_key, source), (likes, dislikes) in counts.items() if likes or dislikes
+  ]
+  if not rows:
+    return
+
+  dialect = db.get_bind().dialect.name
+  if dialect in ('postgresql', 'sqlite'):
+    if dialect == 'postgresql':
+      from sqlalchemy.dialects.postgresql import insert as upsert
+    else:
+      from sqlalchemy.dialects.sqlite import insert as upsert
+    statement = upsert(SourceReputation).values(rows)
+    statement = statement.on_conflict_do_update(
+      index_elements=[SourceReputation.topic_key, SourceReputation.source],
+      set_={
+        'likes': SourceReputation.likes + statement.excluded.likes,
+        'dislikes': SourceReputation.dislikes + statement.excluded.dislikes,
+      },
+    )
+    db.execute(statement)
+    return
+
+  for row in rows:
+    updated = db.query(SourceReputation).filter_by(topic_key=row['topic_key'], source=row['source']).update(
+      {'likes': SourceReputation.likes + row['likes'], 'dislikes': SourceReputation.dislikes + row['dislikes']},
+      synchronize_session=False,
+    )
+    if not updated:
+      db.add(SourceReputation(**row))
+
+def _reputation_counts(topic, ratings) -> dict:
+  """Per (topic_key, source) like/dislike counts for (source, rating) pairs, including the global rows."""
+  counts = {}
+  topic_keys = [normalize_topic(topic), GLOBAL_REPUTATION_KEY] if topic else [GLOBAL_REPUTATION_KEY]
+  for source, rating in ratings:
+    column = _rating_column(rating)
+    if not source or column is None:
+      continue
+    for topic_key in topic_keys:
+      totals = counts.setdefault((topic_key, source), [0, 0])
+      totals[0 if column == 'likes' else 1] += 1
+  return counts
+
+@metrics.timed("db.save_feedback_to_db")
 def save_feedback_to_db(module_id: str, resource_link: str, resource_type: str, source: str, rating: int):
-  """Saves a user's feedback rating for a specific resource to the database."""
+  """Saves a user's feedback rating for a specific resource and updates the source's reputation in the same transaction."""
   db = SessionLocal()
   try:
     new_feedback = Feedback(
@@ -81,6 +204,11 @@ def save_feedback_to_db(module_id: str, resource_link: str, resource_type: str,
       rating= rating
     )
     db.add(new_feedback)
+
+    if source and _rating_column(rating):
+      topic = db.query(Plan.topic).join(Module, Module.plan_id == Plan.id).filter(Module.id == module_id).scalar()
+      _add_reputation(db, _reputation_counts(topic, [(source, rating)]))
+
     db.commit()
     print(f" > Thank you! your feedback for the {resource_type} has been recorded.")
 
@@ -90,6 +218,89 @@ def save_feedback_to_db(module_id: str, resource_link: str, resource_type: str,
   finally:
     db.close()
 
+@metrics.timed("db.record_module_progress")
+def record_module_progress(module_id: str, ratings: list, complete: bool = True) -> bool:
+  """
+  Records the user's ratings for a module's resources and (by default) marks the module complete,
+  all in one transaction: one bulk insert for the feedback rows, one reputation upsert and one
+  module update. Each rating is a dict with 'resource_link', 'resource_type', 'source' and 'rating'.
+  Returns True if everything was saved.
+  """
+  db = SessionLocal()
+  try:
+    module = db.query(Module.plan_id, Plan.topic).join(Plan, Module.plan_id == Plan.id).filter(Module.id == module_id).first()
+    if module is None:
+      print(f"  > Error: Could not find module with ID {module_id} to save progress for.")
+      return False
+
+    if ratings:
+      db.execute(insert(Feedback), [
+        {
+          'id': str(uuid.uuid4()),
+          'module_id': module_id,
+          'resource_link': rating['resource_link'],
+          'resource_type': rating['resource_type'],
+          'source': rating['source'],
+          'rating': rating['rating'],
+        }
+        for rating in ratings
+      ])
+      _add_reputation(db, _reputation_counts(module.topic, [(rating['source'], rating['rating']) for rating in ratings]))
+
+    if complete:
+      db.query(Module).filter(Module.id == module_id).update({Module.is_complete: True}, synchronize_session=False)
+      snapshots.invalidate(db, module.plan_id)
+
+    db.commit()
+    print(" > Thank you! Your feedback and progress have been saved.")
+    return True
+  except Exception as e:
+    print(f"  > Error saving progress: {e}")
+    db.rollback()
+    return False
+  finally:
+    db.close()
+
+@metrics.timed("db.rebuild_source_reputation")
+def rebuild_source_reputation() -> int:
+  """Rebuilds the source_reputation table from every row in feedback. Returns the number of rows written."""
+  db = SessionLocal()
+  try:
+    likes = func.sum(case((Feedback.rating >= 4, 1), else_=0))
+    dislikes = func.sum(case((Feedback.rating <= 2, 1), else_=0))
+    grouped = (
+      db.query(Plan.topic, Feedback.source, likes, dislikes)
+      .join(Module, Feedback.module_id == Module.id)
+      .join(Plan, Module.plan_id == Plan.id)
+      .filter(Feedback.source.isnot(None))
+      .group_by(Plan.topic, Feedback.source)
+      .all()
+    )
+
+    # Topics that only differ in case/spacing share a key, and every source also gets a global row
+    totals = {}
+    for topic, source, topic_likes, topic_dislikes in grouped:
+      for key in (normalize_topic(topic), GLOBAL_REPUTATION_KEY):
+        counts = totals.setdefault((key, source), [0, 0])
+        counts[0] += int(topic_likes or 0)
+        counts[1] += int(topic_dislikes or 0)
+
+    rows = [
+      {'topic_key': key, 'source': source, 'likes': counts[0], 'dislikes': counts[1]}
+      for (key, source), counts in totals.items() if counts[0] or counts[1]
+    ]
+    db.query(SourceReputation).delete(synchronize_session=False)
+    if rows:
+      db.execute(insert(SourceReputation), rows)
+    db.commit()
+    return len(rows)
+  except Exception:
+    db.rollback()
+    raise
+  finally:
+    db.close()
+
+@metrics.timed("db.save_notes_to_db")
 def save_notes_to_db(module_id: str, video_link: str, notes_content: str):
   """Saves the generated notes for a video to the database"""
   db = SessionLocal()
@@ -123,99 +334,158 @@ def save_notes_to_db(module_id: str, video_link: str, notes_content: str):
       db.close()
 
 
-def get_feedback_summary(topic: str) -> str:
-  """Retrieves all feedback for a given topic and creates a summary of liked/disliked resources.
-      Using a 'three strikes' rule for disliked sources."""
+@metrics.timed("db.get_source_reputation")
+def get_source_reputation(topic: str):
+  """
+  Returns ({source: (likes, dislikes)} for this topic, {source: (likes, dislikes)} across all topics),
+  read from the pre-aggregated reputation table in one indexed lookup.
+  """
   db = SessionLocal()
   try:
-    # Step 1: Find the plan to get its associated modules
-    plan = db.query(Plan).filter(func.lower(Plan.topic) == topic.lower()).first()
-    if not plan: return "No past feedback found for this topic."
-
-    modules = db.query(Module).filter(Module.plan_id == plan.id).all()
-    module_ids = [m.id for m in modules]
-    if not module_ids: return "No past feedback found for this topic."
-
-    # Step 2: Get all feedback for those modules
-    all_feedback = db.query(Feedback).filter(Feedback.module_id.in_(module_ids)).all()
-    if not all_feedback: return "No past feedback found for this topic."
-
-    # Step 3: Tally the likes and dislikes for each unique source
-    source_ratings = {}
-    for fb in all_feedback:
-      if fb.source not in source_ratings:
-        source_ratings[fb.source] = {'likes': 0, 'dislikes': 0}
-      if fb.rating >= 4: # 4 or 5 stars is a "like"
-        source_ratings[fb.source]['likes'] += 1
-      elif fb.rating <= 2: # 1 or 2 stars is a "dislike"
-        source_ratings[fb.source]['dislikes'] += 1
-    
-    # Step 4: Apply our rules to create the final lists
-    liked_sources = [source for source, ratings in source_ratings.items() if ratings['likes']>0]
-
-    #Three strike rule
-    disliked_sources = [source for source, ratings in source_ratings.items() if ratings['dislikes']>=3]
-
-    # Step 5: Build the summary string for the AI
-    summary_parts = []
-    if liked_sources:
-      summary_parts.append(f"The user has previously LIKED resources from these sources: {liked_sources}.")
-    if disliked_sources:
-      summary_parts.append(f"The user has previously DISLIKED resources from these sources and they should be AVOIDED: {disliked_sources}.")
-
-    if not summary_parts:
-      return "No strong preferences found in past feedback."
-    
-    return " ".join(summary_parts)
-  
+    rows = db.query(SourceReputation.topic_key, SourceReputation.source, SourceReputation.likes, SourceReputation.dislikes).filter(
+      SourceReputation.topic_key.in_([normalize_topic(topic), GLOBAL_REPUTATION_KEY])
+    ).all()
   finally:
     db.close()
 
+  topic_counts, global_counts = {}, {}
+  for topic_key, source, likes, dislikes in rows:
+    counts = global_counts if topic_key == GLOBAL_REPUTATION_KEY else topic_counts
+    counts[source] = (likes, dislikes)
+  return topic_counts, global_counts
 
+def summarize_feedback(topic_counts: dict) -> str:
+  """Turns per-source (likes, dislikes) counts into the feedback summary given to the AI.
+      Using a 'three strikes' rule for disliked sources."""
+  if not topic_counts: return "No past feedback found for this topic."
 
+  liked_sources = [source for source, (likes, dislikes) in topic_counts.items() if likes > 0]
 
-def save_curriculum_to_db(genai_client, topic, curriculum_data):
-  print(f"\n💾 Saving your curriculum for '{topic}' to the database...")
-  db = SessionLocal()
+  #Three strike rule
+  disliked_sources = [source for source, (likes, dislikes) in topic_counts.items() if dislikes >= 3]
+
+  # Build the summary string for the AI
+  summary_parts = []
+  if liked_sources:
+    summary_parts.append(f"The user has previously LIKED resources from these sources: {liked_sources}.")
+  if disliked_sources:
+    summary_parts.append(f"The user has previously DISLIKED resources from these sources and they should be AVOIDED: {disliked_sources}.")
+
+  if not summary_parts:
+    return "No strong preferences found in past feedback."
+  
+  return " ".join(summary_parts)
+
+def _module_row(plan_id: str, module_data: dict, step_number: int) -> dict:
+  return {
+    'id': module_data.get('id') or str(uuid.uuid4()), # The pipeline assigns ids up front so it can stream modules
+    'plan_id': plan_id,
+    'stepNumber': step_number,
+    'title': module_data['step'],
+    'is_complete': False,
+    'articleTitle': module_data['article']['title'],
+    'articleReason': module_data['article']['reason'],
+    'articleLink': module_data['article']['link'],
+    'videos': module_data['videos'],
+  }
+
+@metrics.timed("db.save_plan_with_modules")
+def save_plan_with_modules(genai_client, topic: str, modules: list):
+  """
+  Saves modules for the plan on `topic`, creating the plan if it doesn't exist yet, in one
+  transaction with a single bulk insert for the modules. Each module is a dict with 'step',
+  'article', 'videos', an optional 'id' and an optional 'stepNumber' (its position in the
+  outline); modules without one are numbered after the plan's existing modules. Modules for a step
+  the plan already has are skipped, so a repeated generation can't duplicate a plan's modules.
+  Returns the plan id, or None if nothing was saved.
+  """
+  # The embedding (usually cached by now) is computed before the session opens, so a slow or
+  # rate limited embedding call never holds a connection and an open transaction
   try:
-    #creating the vector embedding of the topic
     topic_embedding = get_embedding(genai_client, topic)
-    if not topic_embedding:
-      print("  [Error] Could not create embedding. Aborting save.")
-      return
-    
-    #Create the main plan record
-    new_plan = Plan(
-      id=str(uuid.uuid4()), # Generate a unique ID
-      topic= topic,
-      embedding = topic_embedding,
-    )
-    db.add(new_plan) # Adding the new plan to the session
-
-    for i, step_data in enumerate(curriculum_data):
-      new_module = Module(
-        id = str(uuid.uuid4()),
-        plan_id = new_plan.id,
-        stepNumber = i+1,
-        title = step_data['step'],
-        articleTitle = step_data['article']['title'],
-        articleReason = step_data['article']['reason'],
-        articleLink = step_data['article']['link'],
-        #Converting the videos dictionary into a json string for storage
-        videosJson = json.dumps(step_data['videos'])
-      )
-      db.add(new_module) #Add the new module to our workspace
+  except RateLimitExceeded:
+    raise
+  except Exception as e:
+    print(f"  [Error] {e}. Aborting save.")
+    return None
+  if not topic_embedding:
+    print("  [Error] Could not create embedding. Aborting save.")
+    return None
 
-    # Committing your work and saving your changes in the database
-    db.commit()
-    print("✅ Your plan has been saved to the database!")
+  db = SessionLocal()
+  try:
+    # Two writers can race to create the same plan; the loser retries against the winner's row
+    for attempt in range(2):
+      try:
+        plan_id = db.query(Plan.id).filter(Plan.topic == topic).scalar()
+        if plan_id is None:
+          plan_id = str(uuid.uuid4())
+          db.add(Plan(id=plan_id, topic=topic, embedding=topic_embedding))
+          db.flush() # The plan row must exist before the modules that reference it
+
+        # A step the plan already has was saved by an earlier (or concurrent) generation; it is never added twice
+        existing_steps = {step for (step,) in db.query(Module.stepNumber).filter(Module.plan_id == plan_id)}
+        next_step = max(existing_steps, default=0) + 1
+        rows = []
+        for module_data in modules:
+          step_number = module_data.get('stepNumber')
+          if step_number is None:
+            step_number, next_step = next_step, next_step + 1
+          elif step_number in existing_steps:
+            print(f"  > Plan for '{topic}' already has module {step_number}; not adding '{module_data['step']}' again.")
+            continue
+          existing_steps.add(step_number)
+          rows.append(_module_row(plan_id, module_data, step_number))
+        if rows:
+          db.execute(insert(Module), rows)
+          snapshots.invalidate(db, plan_id)
+
+        # Committing your work and saving your changes in the database
+        db.commit()
+        return plan_id
+      except IntegrityError:
+        db.rollback()
+        if attempt:
+          raise
+  except RateLimitExceeded:
+    db.rollback()
+    raise
   except Exception as e:
     print(f"  [Error] Could not save to database: {e}")
     db.rollback() # Incase anything goes wrong, undo all the changes
+    return None
   finally:
     #End of session
     db.close()
 
+@dataclass
+class ModuleView:
+  """What the interactive session needs about one module, computed once when the plan is loaded."""
+  id: str
+  step_number: int
+  title: str
+  article_title: str
+  article_link: str
+  article_source: str
+  videos: list # [(category, video_info)], in display order
+  is_complete: bool
+
+def module_views(plan: Plan) -> list:
+  """The plan's modules in step order, with each article's feedback source already resolved."""
+  return [
+    ModuleView(
+      id=module.id,
+      step_number=module.stepNumber,
+      title=module.title,
+      article_title=module.articleTitle or '',
+      article_link=module.articleLink,
+      article_source=source_for_link(module.articleLink),
+      videos=list((module.videos or {}).items()),
+      is_complete=bool(module.is_complete),
+    )
+    for module in sorted(plan.modules, key=lambda m: m.stepNumber)
+  ]
+
 def format_plan_for_display(plan: Plan):
   output = []
   output.append(f"🎉 Here is your complete, detailed learning curriculum! 🎉")
@@ -233,8 +503,7 @@ def format_plan_for_display(plan: Plan):
     output.append(f"    Link: {module.articleLink}")
 
     output.append("\n🎓 Recommended YouTube Videos:")
-    videos = json.loads(module.videosJson) # Turn the JSON string back into a Python dictionary
-    for category, video_info in videos.items():
+    for category, video_info in module.videos.items():
         output.append(f"  - Best ({category}): {video_info['title']}")
         output.append(f"    Reason: {video_info['reason']}")
         output.append(f"    Link: {video_info['link']}")
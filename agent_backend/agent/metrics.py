@@ -0,0 +1,250 @@
+# File: agent_backend/agent/metrics.py
+#
+# Process-wide instrumentation: timing spans around tools, upstream calls and
+# database operations, Gemini token usage, and simple counters. The existing
+# stats of the caches, the ranking stage, the HTTP client and the YouTube quota
+# are pulled in through collectors at export time rather than counted twice.
+#
+# Exports:
+#   - summary() / run_summary(): a JSON-serialisable snapshot (per request, a
+#     delta against the snapshot taken when the request started), appended to
+#     METRICS_DIR/runs.jsonl by the CLI and the worker
+#   - render_prometheus() / write_prometheus(): Prometheus text format, written
+#     by long-running workers to a file for a node_exporter textfile collector.
+#     A worker's file is removed when it exits, and files left by workers that
+#     died are pruned, so the collector never reports a dead process's series.
+
+import atexit
+import functools
+import glob
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from . import config
+
+_lock = threading.Lock()
+_spans = {}     # name -> {"count", "errors", "total_ms", "max_ms"}
+_counters = {}  # (name, labels) -> value
+_collectors = {}   # name -> (fn, gauge field names)
+
+def observe(name: str, elapsed_ms: float, ok: bool = True):
+  """Records one timed operation under `name`."""
+  with _lock:
+    stats = _spans.setdefault(name, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+    stats["count"] += 1
+    stats["total_ms"] += elapsed_ms
+    stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+    if not ok:
+      stats["errors"] += 1
+
+@contextmanager
+def span(name: str):
+  """Times the enclosed block under `name`; an exception counts as an error and is re-raised."""
+  start = time.perf_counter()
+  ok = False
+  try:
+    yield
+    ok = True
+  finally:
+    observe(name, (time.perf_counter() - start) * 1000, ok)
+
+def timed(name: str):
+  """Decorator form of span()."""
+  def decorate(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+      with span(name):
+        return fn(*args, **kwargs)
+    return wrapper
+  return decorate
+
+def increment(name: str, amount=1, **labels):
+  key = (name, tuple(sorted(labels.items())))
+  with _lock:
+    _counters[key] = _counters.get(key, 0) + amount
+
+def record_tokens(model: str, input_tokens: int, output_tokens: int, estimated: bool = False):
+  """Records the tokens of one Gemini call (estimated when the response carries no usage metadata)."""
+  source = "estimated" if estimated else "reported"
+  increment("llm_calls", model=model, source=source)
+  increment("llm_tokens", input_tokens, model=model, kind="input", source=source)
+  increment("llm_tokens", output_tokens, model=model, kind="output", source=source)
+
+def register_collector(name: str, fn, gauges=()):
+  """
+  Adds a callable returning a flat dict of numbers (or a dict of such dicts) to every export.
+  Its fields are cumulative counts, except those named in `gauges`.
+  """
+  with _lock:
+    _collectors[name] = (fn, frozenset(gauges))
+
+def _collect() -> dict:
+  with _lock:
+    collectors = {name: fn for name, (fn, _) in _collectors.items()}
+  collected = {}
+  for name, fn in collectors.items():
+    try:
+      collected[name] = fn()
+    except Exception as e:
+      collected[name] = {"error": str(e)}
+  return collected
+
+def summary() -> dict:
+  """A snapshot of every span, counter and collector in this process."""
+  with _lock:
+    spans = {name: dict(stats) for name, stats in _spans.items()}
+    counters = dict(_counters)
+  return {
+    "spans": spans,
+    "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in counters.items()],
+    "collectors": _collect(),
+  }
+
+def _delta(after, before):
+  """after - before for nested dicts of numbers; anything else is taken from `after`."""
+  if isinstance(after, dict):
+    before = before if isinstance(before, dict) else {}
+    return {key: _delta(value, before.get(key)) for key, value in after.items()}
+  if isinstance(after, (int, float)) and not isinstance(after, bool) and isinstance(before, (int, float)):
+    return after - before
+  return after
+
+def run_summary(start_snapshot: dict, **info) -> dict:
+  """What happened since `start_snapshot` (taken with summary()), plus average span times."""
+  now = summary()
+  spans = {}
+  for name, stats in _delta(now["spans"], start_snapshot["spans"]).items():
+    if not stats["count"]:
+      continue
+    spans[name] = {
+      "count": stats["count"],
+      "errors": stats["errors"],
+      "total_ms": round(stats["total_ms"], 3),
+      "avg_ms": round(stats["total_ms"] / stats["count"], 3),
+      # A maximum can't be subtracted, so this one is process-wide
+      "process_max_ms": round(now["spans"][name]["max_ms"], 3),
+    }
+
+  before = {(c["name"], tuple(sorted(c["labels"].items()))): c["value"] for c in start_snapshot["counters"]}
+  counters = []
+  for c in now["counters"]:
+    value = c["value"] - before.get((c["name"], tuple(sorted(c["labels"].items()))), 0)
+    if value:
+      counters.append({**c, "value": value})
+
+  return {
+    **info,
+    "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    "spans": spans,
+    "counters": counters,
+    "collectors": _delta(now["collectors"], start_snapshot["collectors"]),
+  }
+
+def append_run_summary(run: dict):
+  """Appends one run summary to METRICS_DIR/runs.jsonl."""
+  os.makedirs(config.METRICS_DIR, exist_ok=True)
+  with open(os.path.join(config.METRICS_DIR, "runs.jsonl"), "a", encoding="utf-8") as f:
+    f.write(json.dumps(run) + "\n")
+
+def _label_text(labels: dict) -> str:
+  if not labels:
+    return ""
+  escaped = {key: str(value).replace("\\", "\\\\").replace('"', '\\"') for key, value in labels.items()}
+  return "{" + ",".join(f'{key}="{value}"' for key, value in escaped.items()) + "}"
+
+def _metric_name(*parts) -> str:
+  return "_".join("".join(ch if ch.isalnum() else "_" for ch in str(part)) for part in parts)
+
+def render_prometheus() -> str:
+  """Every metric in the Prometheus text exposition format."""
+  snapshot = summary()
+  lines = [
+    "# HELP agent_span_seconds Time spent in instrumented tools, upstream calls and database operations.",
+    "# TYPE agent_span_seconds summary",
+  ]
+  for name, stats in sorted(snapshot["spans"].items()):
+    labels = _label_text({"span": name})
+    lines.append(f"agent_span_seconds_sum{labels} {stats['total_ms'] / 1000:.6f}")
+    lines.append(f"agent_span_seconds_count{labels} {stats['count']}")
+  lines.append("# TYPE agent_span_errors_total counter")
+  for name, stats in sorted(snapshot["spans"].items()):
+    lines.append(f"agent_span_errors_total{_label_text({'span': name})} {stats['errors']}")
+
+  counter_names = sorted({c["name"] for c in snapshot["counters"]})
+  for counter_name in counter_names:
+    lines.append(f"# TYPE agent_{counter_name}_total counter")
+    for c in snapshot["counters"]:
+      if c["name"] == counter_name:
+        lines.append(f"agent_{counter_name}_total{_label_text(c['labels'])} {c['value']}")
+
+  # One metric per numeric collector field: a counter (with the '_total' suffix) unless the
+  # collector registered it as a gauge. Grouped collectors share one metric, labelled by group.
+  with _lock:
+    gauges_by_collector = {name: gauges for name, (_, gauges) in _collectors.items()}
+  collector_metrics = {} # metric name -> (type, [sample lines])
+  for collector, values in sorted(snapshot["collectors"].items()):
+    gauges = gauges_by_collector.get(collector, frozenset())
+    groups = values if values and all(isinstance(v, dict) for v in values.values()) else {None: values}
+    for group, fields in groups.items():
+      labels = _label_text({"group": group} if group is not None else {})
+      for field, value in fields.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+          kind = "gauge" if field in gauges else "counter"
+          name = f"agent_{_metric_name(collector, field)}" + ("_total" if kind == "counter" else "")
+          collector_metrics.setdefault(name, (kind, []))[1].append(f"{name}{labels} {value}")
+  for name, (kind, samples) in collector_metrics.items():
+    lines.append(f"# TYPE {name} {kind}")
+    lines.extend(samples)
+  return "\n".join(lines) + "\n"
+
+_PROM_FILE = re.compile(r"agent_(\d+)\.prom$")
+_cleanup_registered = False
+
+def _pid_alive(pid: int) -> bool:
+  try:
+    os.kill(pid, 0)
+  except ProcessLookupError:
+    return False
+  except PermissionError:
+    return True
+  return True
+
+def _prune_dead_files(directory: str):
+  """Removes the .prom files of workers that are no longer running."""
+  for path in glob.glob(os.path.join(directory, "agent_*.prom")):
+    match = _PROM_FILE.search(os.path.basename(path))
+    if match and not _pid_alive(int(match.group(1))):
+      try:
+        os.remove(path)
+      except OSError:
+        pass
+
+def _remove_file(path: str):
+  try:
+    os.remove(path)
+  except OSError:
+    pass
+
+def write_prometheus(path=None):
+  """
+  Writes render_prometheus() to `path` atomically. The default, METRICS_DIR/agent_<pid>.prom, is
+  removed when the process exits; files of other workers that are gone are pruned on each write.
+  """
+  global _cleanup_registered
+  default_path = path is None
+  path = path or os.path.join(config.METRICS_DIR, f"agent_{os.getpid()}.prom")
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  tmp_path = f"{path}.tmp"
+  with open(tmp_path, "w", encoding="utf-8") as f:
+    f.write(render_prometheus())
+  os.replace(tmp_path, path)
+  if default_path:
+    _prune_dead_files(config.METRICS_DIR)
+    if not _cleanup_registered:
+      atexit.register(_remove_file, path)
+      _cleanup_registered = True
+  return path
@@ -1,16 +1,37 @@
-from sqlalchemy import Column, String, Integer, DateTime, Float, ForeignKey, Boolean, Text
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Boolean, Text, JSON, LargeBinary, Index
 from sqlalchemy.orm import relationship
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.dialects.postgresql import JSONB
 import datetime
+import numpy as np
 
-from .database import Base
+from .database import Base, engine
+
+class Float32Vector(TypeDecorator):
+  """A vector stored as packed float32 bytes (4 bytes per dimension) and read back as a NumPy array without copying."""
+  impl = LargeBinary
+  cache_ok = True
+
+  def process_bind_param(self, value, dialect):
+    if value is None:
+      return None
+    return np.asarray(value, dtype=np.float32).tobytes()
+
+  def process_result_value(self, value, dialect):
+    if value is None:
+      return None
+    # Read-only view over the fetched bytes
+    return np.frombuffer(value, dtype=np.float32)
+
+# JSONB on Postgres (parsed once by the driver, indexable); plain JSON elsewhere
+JsonDocument = JSON().with_variant(JSONB(), 'postgresql')
 
 class Plan(Base):
   __tablename__ = 'plans' # The names of the table
 
   id = Column(String, primary_key=True, index=True)
   topic = Column(String, unique=True, index=True)
-  embedding = Column(ARRAY(Float)) # this is a special coloum type for a list of numbers
+  embedding = Column(Float32Vector) # the topic's embedding, packed as float32
   createdAt = Column(DateTime, default=datetime.datetime.utcnow)
 
   #This is creating a link: a plan can have many modules
@@ -30,7 +51,7 @@ class Module(Base):
   articleReason = Column(String)
   articleLink = Column(String)
 
-  videosJson = Column(String) # We will store the videos list as a JSON text block
+  videos = Column(JsonDocument) # {category: {title, link, reason, thumbnail}}
 
   # This is the foreign key that links this module back to a specific plan
   plan_id = Column(String, ForeignKey('plans.id'))
@@ -42,6 +63,11 @@ class Module(Base):
   #A new relationship for notes
   notes = relationship("Note", back_populates="module")
 
+  # Containment lookups such as "which modules recommend this video link" use the GIN index
+  __table_args__ = (
+    Index('ix_modules_videos', videos, postgresql_using='gin', postgresql_ops={'videos': 'jsonb_path_ops'}).ddl_if(dialect='postgresql'),
+  )
+
 # A new class for our new table called feedback
 class Feedback(Base):
   __tablename__ = 'feedback'
@@ -70,4 +96,42 @@ class Note(Base):
 
   # This links the note back to a specific module in a plan
   module_id = Column(String, ForeignKey('modules.id'))
-  module = relationship("Module", back_populates="notes")
\ No newline at end of file
+  module = relationship("Module", back_populates="notes")
+
+# Running like/dislike counts per source, kept up to date as feedback is saved.
+# topic_key is the normalized plan topic; the empty string holds the global counts.
+class SourceReputation(Base):
+  __tablename__ = 'source_reputation'
+
+  # The composite primary key doubles as the index for "all sources for this topic"
+  topic_key = Column(String, primary_key=True)
+  source = Column(String, primary_key=True)
+  likes = Column(Integer, default=0, nullable=False)
+  dislikes = Column(Integer, default=0, nullable=False)
+
+# The serialized response for a plan and its modules, with an ETag (a hash of the body).
+# Every change to the plan bumps the version and clears the body; the next read rebuilds it,
+# storing it only if the version is still the one it started from (see agent/snapshots.py).
+class PlanSnapshot(Base):
+  __tablename__ = 'plan_snapshots'
+
+  plan_id = Column(String, ForeignKey('plans.id', ondelete='CASCADE'), primary_key=True)
+  version = Column(Integer, default=0, nullable=False)
+  etag = Column(String) # NULL while the snapshot is invalidated
+  body = Column(Text)
+  createdAt = Column(DateTime, default=datetime.datetime.utcnow)
+
+# A plan that is being generated right now. Other worker processes that get a request for
+# the same (or a similar) topic wait for it instead of generating it again (see agent/singleflight.py).
+class PlanClaim(Base):
+  __tablename__ = 'plan_claims'
+
+  topic_key = Column(String, primary_key=True) # The normalized topic
+  owner = Column(String, nullable=False)
+  embedding = Column(Float32Vector)
+  expiresAt = Column(DateTime, nullable=False) # Pushed forward by the owner's heartbeat
+
+# The embedded SQLite database is created on first use; Postgres schemas are managed
+# with create_tables.py and migrate_storage.py
+if engine.dialect.name == 'sqlite':
+  Base.metadata.create_all(bind=engine)
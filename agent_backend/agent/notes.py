@@ -0,0 +1,105 @@
+# File: agent_backend/agent/notes.py
+#
+# Video note generation. Kept separate from agent_tools so the YouTube-notes
+# entry point doesn't have to import LangChain's agent machinery.
+#
+# Long transcripts are handled map-reduce style: the transcript is split on
+# timestamp lines into token-bounded chunks, the chunks are summarized
+# concurrently, and the chunk notes are merged into one timestamped set.
+
+from concurrent.futures import as_completed
+
+from . import config, events, metrics
+from .concurrency import io_pool
+from .logger import logger
+from .rate_limit import estimate_tokens
+from .tools import get_youtube_transcript
+
+NOTE_INSTRUCTIONS = """
+	Your instructions are:
+	1.  Identify the main, high-level concepts discussed in the video.
+	2.  For each concept, provide a concise, 2-3 sentence summary.
+	3.  Crucially, for each summary, you MUST provide the starting timestamp (e.g., [02:35]) where that concept is first introduced in the transcript.
+	4.  Format your output as a clean, structured list. Do not add any conversational fluff or introductory sentences.
+"""
+
+def split_transcript(transcript: str, max_tokens: int = config.NOTES_CHUNK_MAX_TOKENS) -> list:
+	"""Splits a transcript into chunks of whole timestamped lines, each at most about max_tokens long."""
+	chunks, current, current_tokens = [], [], 0
+	for line in transcript.splitlines(keepends=True):
+		line_tokens = estimate_tokens(line)
+		if current and current_tokens + line_tokens > max_tokens:
+			chunks.append("".join(current))
+			current, current_tokens = [], 0
+		current.append(line)
+		current_tokens += line_tokens
+	if current:
+		chunks.append("".join(current))
+	return chunks
+
+def _summarize_chunk(model, chunk: str, part: int, total_parts: int) -> str:
+	part_note = f" This is part {part} of {total_parts} of the transcript." if total_parts > 1 else ""
+	note_taker_prompt = f"""
+	You are an expert academic note-taker. Your task is to analyze the following video transcript and distill it into a set of key concepts.{part_note}
+
+	The transcript is provided with timestamps in the format [MM:SS].
+{NOTE_INSTRUCTIONS}
+	Here is the transcript:
+	---
+	{chunk}
+	---
+	"""
+	return model.invoke(note_taker_prompt).content
+
+def _merge_chunk_notes(model, chunk_notes: list) -> str:
+	joined_notes = "\n\n".join(f"--- Part {i + 1} ---\n{notes}" for i, notes in enumerate(chunk_notes))
+	merge_prompt = f"""
+	You are an expert academic note-taker. Below are notes taken on consecutive parts of one video, in order.
+	Merge them into a single set of notes for the whole video.
+
+	Your instructions are:
+	1.  Combine concepts that appear in more than one part into one entry, keeping the EARLIEST timestamp.
+	2.  Keep every distinct concept and keep each summary to 2-3 sentences.
+	3.  Every entry MUST keep its starting timestamp (e.g., [02:35]), and entries must be in timestamp order.
+	4.  Format your output as a clean, structured list. Do not add any conversational fluff or introductory sentences.
+
+	Here are the notes:
+	---
+	{joined_notes}
+	---
+	"""
+	return model.invoke(merge_prompt).content
+
+@metrics.timed("notes.generate")
+def generate_video_notes(model, video_url: str, module_id=None) -> str:
+	"""
+	Generates timestamped notes for a YouTube video.
+	If a 'module_id' is provided, the notes are also saved to the database.
+	"""
+	#Step 1: Get transcript using our specialist function
+	transcript = get_youtube_transcript(video_url)
+	if transcript.startswith("Error:"):
+		return transcript
+
+	#Step 2: Summarize every chunk of the transcript at the same time, then merge
+	chunks = split_transcript(transcript)
+	logger.info(f"Summarizing transcript in {len(chunks)} chunk(s).")
+	futures = {io_pool.submit(_summarize_chunk, model, chunk, i + 1, len(chunks)): i for i, chunk in enumerate(chunks)}
+	chunk_notes = [None] * len(chunks)
+	for future in as_completed(futures):
+		i = futures[future]
+		chunk_notes[i] = future.result()
+		events.emit("notes_chunk", part=i + 1, total=len(chunks), notes=chunk_notes[i])
+
+	notes_content = chunk_notes[0] if len(chunk_notes) == 1 else _merge_chunk_notes(model, chunk_notes)
+
+	# --- NEW STEP: Save the generated notes to the database ---
+	if module_id and notes_content:
+		from .memory import save_notes_to_db
+
+		logger.info(f"Saving notes for module {module_id} to the database.")
+		save_notes_to_db(module_id, video_url, notes_content)
+	elif not module_id:
+		logger.info("No module_id provided. Skipping database save for this one-off request.")
+
+	return notes_content
@@ -0,0 +1,74 @@
+# File: agent_backend/agent/pipeline.py
+#
+# Direct plan generation: outline -> research every module in parallel -> persist.
+# Unlike the ReAct agent loop there is no "thought" round trip between tool
+# calls and no free-text tool input to parse, so latency is a fixed number of
+# LLM calls and the result doesn't depend on how the agent reasons.
+
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+from . import config, events, metrics
+from .logger import logger
+from .memory import save_plan_with_modules
+from .research import plan_outline, research_module
+
+# Modules get their own pool: research_module itself fans out on the shared I/O pool,
+# and waiting on that pool from inside it could deadlock once every thread is busy.
+_module_pool = ThreadPoolExecutor(max_workers=config.PIPELINE_MAX_PARALLEL_MODULES, thread_name_prefix="agent-module")
+
+class StageTimer:
+  """Records how long each named stage of a run takes, in seconds."""
+
+  def __init__(self):
+    self.timings = {}
+
+  @contextmanager
+  def stage(self, name: str):
+    start = time.perf_counter()
+    try:
+      with metrics.span(f"pipeline.{name}"):
+        yield
+    finally:
+      self.timings[name] = round(time.perf_counter() - start, 3)
+
+def generate_plan(chat_model, genai_client, topic: str) -> dict:
+  """Generates and saves a plan for `topic`. Returns the stage timings."""
+  timer = StageTimer()
+
+  with timer.stage("outline"):
+    steps = plan_outline(chat_model, topic)
+  logger.info(f"Outline for '{topic}' has {len(steps)} modules.")
+  events.emit("plan_outline", topic=topic, modules=steps)
+
+  plan_id = None
+  try:
+    with timer.stage("research"):
+      futures = {_module_pool.submit(research_module, chat_model, topic, step): i for i, step in enumerate(steps)}
+      curriculum = [None] * len(steps)
+      # Stream each module as soon as it is researched, whatever order they finish in
+      for future in as_completed(futures):
+        i = futures[future]
+        module_data = future.result()
+        module_data['id'] = str(uuid.uuid4())
+        module_data['stepNumber'] = i + 1
+        curriculum[i] = module_data
+        events.emit("module_ready", module=events.module_payload(
+          module_data['id'], i + 1, module_data['step'], module_data['article'], module_data['videos']))
+
+    with timer.stage("persist"):
+      # The plan and every module go to the database in one transaction
+      plan_id = save_plan_with_modules(genai_client, topic, curriculum)
+  finally:
+    if not plan_id:
+      # The client may already show streamed modules; they were never stored, so it must drop them
+      events.emit("plan_discarded", topic=topic)
+  if not plan_id:
+    raise RuntimeError(f"Could not save the plan for '{topic}'.")
+  logger.info(f"Plan for '{topic}' saved with {len(curriculum)} modules.")
+
+  timer.timings["total"] = round(sum(timer.timings.values()), 3)
+  logger.info(f"Plan pipeline stage timings for '{topic}': {timer.timings}")
+  return timer.timings
@@ -0,0 +1,34 @@
+# File: agent_backend/agent/prompts.py
+#
+# The ReAct prompt used by the LangChain agent is bundled with the package so
+# that building the agent never needs a network round trip to LangChain Hub.
+# Run `python -m agent.prompts --refresh` to update the bundled copy from the Hub.
+
+import os
+import sys
+
+from langchain_core.prompts import PromptTemplate
+
+REACT_PROMPT_HUB_NAME = "hwchase17/react"
+REACT_PROMPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "react_prompt.txt")
+
+def load_react_prompt() -> PromptTemplate:
+  """Loads the bundled ReAct prompt from disk."""
+  with open(REACT_PROMPT_PATH, encoding="utf-8") as f:
+    return PromptTemplate.from_template(f.read())
+
+def refresh_react_prompt() -> str:
+  """Pulls the latest ReAct prompt from LangChain Hub and overwrites the bundled copy."""
+  from langchain import hub
+
+  prompt = hub.pull(REACT_PROMPT_HUB_NAME)
+  with open(REACT_PROMPT_PATH, "w", encoding="utf-8") as f:
+    f.write(prompt.template)
+  return prompt.template
+
+if __name__ == "__main__":
+  if "--refresh" in sys.argv[1:]:
+    refresh_react_prompt()
+    print(f"Refreshed bundled prompt from '{REACT_PROMPT_HUB_NAME}' into {REACT_PROMPT_PATH}")
+  else:
+    print(load_react_prompt().template)
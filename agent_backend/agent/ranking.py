@@ -0,0 +1,167 @@
+# File: agent_backend/agent/ranking.py
+#
+# Local pre-ranking of search results before the model sees them. Each raw
+# Serper/YouTube result is projected to the few fields the model actually
+# uses, then every candidate list is scored in one vectorized pass: search
+# position, a smoothed like-per-view ratio and view count for videos, plus the
+# source's reputation from past feedback. When one candidate clearly wins it is
+# picked without a model call; otherwise only the top few compact candidates
+# are sent.
+
+import functools
+import threading
+
+import numpy as np
+
+from . import config, metrics
+
+# Smoothing for like ratios, so a video with 3 views and 1 like doesn't look like the best on YouTube
+_PRIOR_LIKE_RATE = 0.04
+_PRIOR_VIEWS = 1000
+
+# Score weights (reputation is in [-1, 1], every other component in [0, 1])
+_POSITION_WEIGHT = 0.2
+_LIKE_RATIO_WEIGHT = 0.4
+_VIEWS_WEIGHT = 0.2
+_REPUTATION_WEIGHT = 0.6
+# Global reputation counts for less than feedback given on this topic
+_GLOBAL_REPUTATION_WEIGHT = 0.5
+# Three strikes: a source disliked three times on this topic sinks below everything else
+_DISLIKED_PENALTY = 2.0
+
+_SNIPPET_MAX_CHARS = 200
+
+_stats_lock = threading.Lock()
+_stats = {"local_picks": 0, "model_picks": 0, "candidates_seen": 0, "candidates_sent": 0}
+
+def _count(name: str, amount: int = 1):
+  with _stats_lock:
+    _stats[name] += amount
+
+def stats() -> dict:
+  sources = source_for_link.cache_info()
+  with _stats_lock:
+    return {"name": "ranking", **_stats, "source_cache_hits": sources.hits, "source_cache_misses": sources.misses}
+
+metrics.register_collector("ranking", stats)
+
+@functools.lru_cache(maxsize=4096)
+def source_for_link(link: str) -> str:
+  """The feedback 'source' for a link: its domain, keeping any subdomain other than www (cached per URL)."""
+  import tldextract
+
+  extracted = tldextract.extract(link or '')
+  if extracted.subdomain and extracted.subdomain != 'www':
+    source = f"{extracted.subdomain}.{extracted.domain}.{extracted.suffix}"
+  else:
+    source = extracted.registered_domain
+  return source if source.strip('.') else "Unknown Website"
+
+def compact_candidate(result: dict, search_type: str) -> dict:
+  """Projects a raw search result to the fields the model needs to choose between candidates."""
+  if search_type == 'video':
+    views = int(result.get('viewCount') or 0)
+    likes = int(result.get('likeCount') or 0)
+    return {
+      'title': result.get('title'),
+      'link': result.get('link'),
+      'channelTitle': result.get('channelTitle'),
+      'viewCount': views,
+      'likeRatio': round(likes / views, 4) if views else 0.0,
+    }
+  return {
+    'title': result.get('title'),
+    'link': result.get('link'),
+    'source': source_for_link(result.get('link')),
+    'snippet': (result.get('snippet') or '')[:_SNIPPET_MAX_CHARS],
+  }
+
+def _reputation_scores(sources, reputation) -> np.ndarray:
+  topic_counts, global_counts = reputation
+  counts = np.array(
+    [topic_counts.get(source, (0, 0)) + global_counts.get(source, (0, 0)) for source in sources], dtype=np.float64
+  ).reshape(-1, 4)
+  topic_likes, topic_dislikes, global_likes, global_dislikes = counts.T
+  scores = (topic_likes - topic_dislikes) / (topic_likes + topic_dislikes + 1)
+  scores += _GLOBAL_REPUTATION_WEIGHT * (global_likes - global_dislikes) / (global_likes + global_dislikes + 1)
+  scores = np.clip(scores, -1.0, 1.0)
+  scores[topic_dislikes >= 3] -= _DISLIKED_PENALTY
+  return scores
+
+def score_candidates(results, search_type: str, reputation=({}, {})) -> np.ndarray:
+  """Scores a list of raw search results (in search order); higher is better."""
+  n = len(results)
+  if n == 0:
+    return np.zeros(0)
+
+  scores = _POSITION_WEIGHT / (1.0 + np.arange(n))
+  sources = ['youtube.com' if search_type == 'video' else source_for_link(result.get('link')) for result in results]
+  scores += _REPUTATION_WEIGHT * _reputation_scores(sources, reputation)
+
+  if search_type == 'video':
+    views = np.array([float(result.get('viewCount') or 0) for result in results])
+    likes = np.array([float(result.get('likeCount') or 0) for result in results])
+    like_ratio = (likes + _PRIOR_LIKE_RATE * _PRIOR_VIEWS) / (views + _PRIOR_VIEWS)
+    log_views = np.log1p(views)
+    # Normalized within the list, so the components are comparable across queries
+    scores += _LIKE_RATIO_WEIGHT * like_ratio / like_ratio.max()
+    if log_views.max() > 0:
+      scores += _VIEWS_WEIGHT * log_views / log_views.max()
+  return scores
+
+def rank_candidates(results, search_type: str, reputation=({}, {}), exclude_links=()) -> list:
+  """
+  Returns [(score, raw_result)] best first, with duplicate links removed. Links in
+  exclude_links (already picked for another category) are dropped unless nothing else is left.
+  """
+  unique, seen = [], set()
+  for result in results:
+    link = result.get('link')
+    if link and link not in seen:
+      seen.add(link)
+      unique.append(result)
+
+  scores = score_candidates(unique, search_type, reputation)
+  ranked = [(float(scores[i]), unique[i]) for i in np.argsort(-scores, kind='stable')]
+  remaining = [(score, result) for score, result in ranked if result.get('link') not in exclude_links]
+  _count("candidates_seen", len(results))
+  return remaining or ranked
+
+def clear_winner(ranked: list, margin=None):
+  """Returns the top raw result if it beats the runner-up by at least `margin`, else None."""
+  if margin is None:
+    margin = config.RANKING_CLEAR_WIN_MARGIN
+  if not ranked:
+    return None
+  if len(ranked) == 1 or ranked[0][0] - ranked[1][0] >= margin:
+    _count("local_picks")
+    return ranked[0][1]
+  return None
+
+def top_candidates(ranked: list, search_type: str, k=None) -> list:
+  """The compact form of the best k candidates, to be sent to the model."""
+  if k is None:
+    k = config.RANKING_LLM_TOP_K
+  candidates = [compact_candidate(result, search_type) for _, result in ranked[:k]]
+  _count("model_picks")
+  _count("candidates_sent", len(candidates))
+  return candidates
+
+def local_pick(result: dict, search_type: str, reputation=({}, {})) -> dict:
+  """Builds the pick for a candidate chosen without the model, with a one-sentence reason."""
+  pick = {'title': result.get('title'), 'link': result.get('link')}
+  topic_counts, _ = reputation
+  if search_type == 'video':
+    views = int(result.get('viewCount') or 0)
+    likes = int(result.get('likeCount') or 0)
+    pick['reason'] = f"Clearly the strongest candidate by engagement: {likes:,} likes on {views:,} views."
+    if result.get('thumbnail'):
+      pick['thumbnail'] = result['thumbnail']
+    return pick
+
+  source = source_for_link(result.get('link'))
+  if topic_counts.get(source, (0, 0))[0] > 0:
+    pick['reason'] = f"A top search result from {source}, a source you have liked before."
+  else:
+    pick['reason'] = f"Clearly the strongest search result, from {source}."
+  return pick
@@ -0,0 +1,102 @@
+# File: agent_backend/agent/rate_limit.py
+#
+# Process-wide rate limiting for Gemini. Each model has a token bucket for
+# requests per minute and one for tokens per minute; callers block until both
+# have capacity, so bursts queue up instead of turning into 429s. When a 429
+# does come back, every caller of that model pauses (adaptive backoff) and the
+# call is retried with exponential backoff.
+
+import random
+import threading
+import time
+
+from . import config
+from .logger import logger
+
+class RateLimitExceeded(RuntimeError):
+  """Raised when a call is still rate limited after all retries."""
+
+class _Bucket:
+  def __init__(self, per_minute: float):
+    self.capacity = float(per_minute)
+    self.level = float(per_minute)
+    self.rate = per_minute / 60.0
+
+  def refill(self, elapsed: float):
+    self.level = min(self.capacity, self.level + elapsed * self.rate)
+
+  def wait_time(self, amount: float) -> float:
+    return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+class TokenBucketLimiter:
+  """Limits calls to `requests_per_minute` and (optionally) estimated tokens to `tokens_per_minute`."""
+
+  def __init__(self, name: str, requests_per_minute: float, tokens_per_minute=None):
+    self.name = name
+    self._requests = _Bucket(requests_per_minute)
+    self._tokens = _Bucket(tokens_per_minute) if tokens_per_minute else None
+    self._lock = threading.Lock()
+    self._last_refill = time.monotonic()
+    self._paused_until = 0.0
+
+  def _refill(self, now: float):
+    elapsed = now - self._last_refill
+    self._last_refill = now
+    self._requests.refill(elapsed)
+    if self._tokens:
+      self._tokens.refill(elapsed)
+
+  def acquire(self, tokens: int = 1):
+    """Blocks until one request and `tokens` tokens are available, then takes them."""
+    while True:
+      with self._lock:
+        now = time.monotonic()
+        self._refill(now)
+        # A single prompt larger than the whole bucket can never fit; let it through when the bucket is full
+        token_amount = min(tokens, self._tokens.capacity) if self._tokens else 0
+        wait = max(
+          self._paused_until - now,
+          self._requests.wait_time(1),
+          self._tokens.wait_time(token_amount) if self._tokens else 0.0,
+        )
+        if wait <= 0:
+          self._requests.level -= 1
+          if self._tokens:
+            self._tokens.level -= token_amount
+          return
+      time.sleep(wait)
+
+  def pause(self, seconds: float):
+    """Holds back every caller of this limiter for `seconds` (used after a 429)."""
+    with self._lock:
+      self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+def is_rate_limit_error(error: Exception) -> bool:
+  text = f"{type(error).__name__} {error}"
+  return "429" in text or "ResourceExhausted" in text or "RESOURCE_EXHAUSTED" in text
+
+def estimate_tokens(text: str) -> int:
+  """Rough token count (about four characters per token) used for the tokens-per-minute bucket."""
+  return max(1, len(text) // 4)
+
+def call_with_rate_limit(limiter: TokenBucketLimiter, fn, tokens: int = 1, max_retries=None):
+  """Calls fn() once the limiter allows it, retrying 429s with exponential backoff."""
+  if max_retries is None:
+    max_retries = config.GEMINI_MAX_RETRIES
+  attempt = 0
+  while True:
+    limiter.acquire(tokens)
+    try:
+      return fn()
+    except Exception as e:
+      if not is_rate_limit_error(e):
+        raise
+      if attempt >= max_retries:
+        raise RateLimitExceeded(f"{limiter.name} is still rate limited after {max_retries} retries: {e}") from e
+      wait = config.GEMINI_BACKOFF_BASE_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5)
+      logger.warning(f"{limiter.name} returned 429; backing off {wait:.1f}s ({attempt + 1}/{max_retries}).")
+      limiter.pause(wait)
+      attempt += 1
+
+chat_limiter = TokenBucketLimiter("gemini-chat", config.GEMINI_CHAT_RPM, config.GEMINI_CHAT_TPM)
+embedding_limiter = TokenBucketLimiter("gemini-embedding", config.GEMINI_EMBEDDING_RPM, config.GEMINI_EMBEDDING_TPM)
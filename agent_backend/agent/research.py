@@ -0,0 +1,66 @@
+# File: agent_backend/agent/research.py
+#
+# The two building blocks of plan generation, as plain functions: drafting the
+# module outline and researching one module. The LangChain tools in
+# agent_tools.py and the direct pipeline in pipeline.py both use them.
+
+from . import metrics
+from .tools import google_search, youtube_search_orders
+from .analysis import analyze_module_results
+from .concurrency import io_pool
+from .logger import logger
+
+# The video categories shown for each module, and the YouTube sort order behind each one
+VIDEO_CATEGORIES = {
+	"General": "relevance",
+	"Most Viewed": "viewCount",
+	"Highest Rated": "rating",
+}
+
+def plan_outline(model, topic: str) -> list:
+	"""Asks the model for the module titles of a learning plan on `topic`."""
+	planner_prompt = f"""
+	You are an expert curriculum designer. Your task is to generate a list of main module titles for a learning plan on the topic: '{topic}'.
+	IMPORTANT: The output MUST BE a simple, numbered list and NOTHING ELSE. Just provide the main titles for 3 modules.
+	Example for 'Learning Guitar': 1. Parts of the Guitar\n2. Basic Chords\n3. First Song
+	Now, generate the output for the topic: '{topic}'.
+	"""
+
+	plan_response = model.invoke(planner_prompt)
+	return [step.strip() for step in plan_response.content.split('\n') if step.strip()]
+
+@metrics.timed("research.module")
+def research_module(model, topic: str, step_description: str) -> dict:
+	"""
+	Finds and curates the resources for one module.
+	Returns {'step': ..., 'article': {...}, 'videos': {category: {...}}}.
+	"""
+	logger.info(f"Researching module: '{step_description}'")
+
+	search_query_prompt = f"""
+	You are an expert at generating search queries. Your task is to take the following learning topic and create a single, simple, and effective search query for a beginner.
+
+	IMPORTANT: Your output MUST be the search query string and NOTHING ELSE. Do not add numbers, bullets, explanations, quotes, or any extra text.
+
+	Here is a perfect example:
+	Input: "1. Understanding the Parts of the Guitar"
+	Output: guitar parts for beginners
+
+	Now, generate the output for the following input:
+	Input: "{step_description}"
+	"""
+	
+	search_query_response = model.invoke(search_query_prompt)
+	search_query = search_query_response.content.strip().replace('"', '')
+	
+	# Search operations run concurrently; each upstream is bounded by its own limit.
+	# The three YouTube sort orders share a single batched statistics lookup.
+	web_future = io_pool.submit(google_search, search_query)
+	videos_by_order = youtube_search_orders(search_query, list(VIDEO_CATEGORIES.values()))
+	web_results = web_future.result()
+	video_categories = {category: videos_by_order[order] for category, order in VIDEO_CATEGORIES.items()}
+	
+	# Analyze all four candidate sets with a single model call
+	curated_article, curated_videos = analyze_module_results(model, topic, search_query, web_results, video_categories)
+
+	return {'step': step_description, 'article': curated_article, 'videos': curated_videos}
@@ -0,0 +1,113 @@
+# File: agent_backend/agent/search_cache.py
+#
+# A persistent cache for Serper and YouTube search results, keyed by provider,
+# query, sort order and max_results. Each provider has its own TTL (video
+# statistics go stale faster than web results). With stale-while-revalidate
+# on, an expired entry is still served immediately and refreshed in the
+# background, so a popular query never waits on the upstream twice.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import config, metrics
+from .cache import SqliteCache
+from .logger import logger
+
+# Expired entries are kept (only the size bound evicts) so they can be served stale
+_cache = SqliteCache("search_results", max_entries=config.SEARCH_CACHE_MAX_ENTRIES)
+
+_TTL_SECONDS = {
+  "serper": config.SERPER_CACHE_TTL_SECONDS,
+  "youtube": config.YOUTUBE_CACHE_TTL_SECONDS,
+}
+
+# Refreshes get their own pool: a refresh can fan out on the shared I/O pool (YouTube searches
+# do), and waiting on that pool from inside it could deadlock once every thread is busy.
+_refresh_pool = ThreadPoolExecutor(max_workers=config.SEARCH_CACHE_REFRESH_WORKERS, thread_name_prefix="search-refresh")
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0}
+
+def _count(name: str):
+  with _stats_lock:
+    _stats[name] += 1
+
+def stats() -> dict:
+  with _stats_lock:
+    return {"name": "search_results", **_stats}
+
+metrics.register_collector("search_cache", stats)
+
+def _key(provider: str, query: str, order, max_results) -> str:
+  return SqliteCache.make_key(provider, query.strip().lower(), order, max_results)
+
+def get(provider: str, query: str, order=None, max_results=None):
+  """
+  Returns (results, is_stale) for a cached search, or None on a miss. Stale entries
+  are only returned when SEARCH_CACHE_STALE_WHILE_REVALIDATE is on.
+  """
+  entry = _cache.get_entry(_key(provider, query, order, max_results))
+  if entry is None:
+    _count("misses")
+    return None
+  results, age = entry
+  if age <= _TTL_SECONDS[provider]:
+    _count("hits")
+    return results, False
+  if config.SEARCH_CACHE_STALE_WHILE_REVALIDATE:
+    _count("stale_hits")
+    return results, True
+  _count("misses")
+  return None
+
+def put(provider: str, results, query: str, order=None, max_results=None):
+  # Empty results usually mean the upstream failed; don't pin them in the cache
+  if results:
+    _cache.set(_key(provider, query, order, max_results), results)
+
+def revalidate_orders(provider: str, fetch_orders, query: str, orders, max_results=None):
+  """
+  Refreshes the entries for several sort orders of one search with a single background
+  fetch_orders(orders) call, which returns {order: results}. Orders already being refreshed are left out.
+  """
+  keys = {}
+  with _refreshing_lock:
+    for order in orders:
+      key = _key(provider, query, order, max_results)
+      if key not in _refreshing:
+        _refreshing.add(key)
+        keys[order] = key
+  if not keys:
+    return
+
+  def refresh():
+    try:
+      fetched = fetch_orders(list(keys))
+      for order in keys:
+        put(provider, fetched[order], query, order, max_results)
+        _count("refreshes")
+    except Exception as e:
+      logger.warning(f"Background refresh of cached {provider} search '{query}' failed: {e}")
+    finally:
+      with _refreshing_lock:
+        _refreshing.difference_update(keys.values())
+
+  _refresh_pool.submit(refresh)
+
+def revalidate(provider: str, fetch, query: str, order=None, max_results=None):
+  """Refreshes one entry in the background with fetch(); concurrent refreshes of the same entry are collapsed."""
+  revalidate_orders(provider, lambda orders: {order: fetch()}, query, [order], max_results)
+
+def cached(provider: str, fetch, query: str, order=None, max_results=None):
+  """Returns cached results for this search, calling fetch() on a miss (and in the background when stale)."""
+  hit = get(provider, query, order, max_results)
+  if hit is not None:
+    results, is_stale = hit
+    if is_stale:
+      revalidate(provider, fetch, query, order, max_results)
+    return results
+  results = fetch()
+  put(provider, results, query, order, max_results)
+  return results
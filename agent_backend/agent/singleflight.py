@@ -0,0 +1,179 @@
+# File: agent_backend/agent/singleflight.py
+#
+# Single-flight plan generation. When several requests for the same new topic
+# (or a similar one) arrive together, one of them generates the plan and the
+# others wait for it, so a spike on a trending topic costs one generation
+# instead of N.
+#
+#   - Within a process, followers wait on the leader's in-flight entry and get
+#     its outcome, including its exception.
+#   - Across worker processes, the leader holds a row in plan_claims. Others
+#     wait while an unexpired claim on the topic (or a similar embedding)
+#     exists. The leader keeps its claim alive with a heartbeat and deletes it
+#     when it finishes; a crashed leader's claim expires.
+# In the web server, concurrent requests for the same topic are merged onto one
+# worker job before they get here (web_frontend/src/lib/agentPool.ts), and
+# those followers also receive the leader's progress events.
+#
+# Similar-topic matching is best effort: two workers that claim different but
+# similar topics at the same instant both generate. Identical topics can't,
+# since the claim's primary key is the normalized topic.
+
+import datetime
+import threading
+import time
+import uuid
+
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+
+from . import config, metrics
+from .database import SessionLocal
+from .logger import logger
+from .models import PlanClaim
+from .vector_index import normalize_topic
+
+# Identifies this process's claims
+_OWNER = str(uuid.uuid4())
+
+class _Flight:
+  def __init__(self, key: str, vector):
+    self.key = key
+    self.vector = vector
+    self.done = threading.Event()
+    self.error = None
+
+_lock = threading.Lock()
+_flights = {} # normalized topic -> _Flight
+
+def _unit(embedding):
+  if embedding is None:
+    return None
+  vector = np.asarray(embedding, dtype=np.float32)
+  norm = np.linalg.norm(vector)
+  return vector / norm if norm else None
+
+def _similar(a, b) -> bool:
+  if not config.PLAN_COALESCE_SIMILAR or a is None or b is None or a.shape != b.shape:
+    return False
+  return float(a @ b) > config.SIMILARITY_THRESHOLD
+
+def _join_or_lead(key: str, vector):
+  """Returns (flight, is_leader): the in-flight generation to wait for, or a new one this caller runs."""
+  with _lock:
+    flight = _flights.get(key) or next((f for f in _flights.values() if _similar(vector, f.vector)), None)
+    if flight is not None:
+      return flight, False
+    flight = _flights[key] = _Flight(key, vector)
+    return flight, True
+
+def _expiry():
+  return datetime.datetime.utcnow() + datetime.timedelta(seconds=config.PLAN_CLAIM_TTL_SECONDS)
+
+def _active_claim(db, key: str, vector):
+  """The topic key of an unexpired claim on this topic or a similar one, if any."""
+  claims = db.query(PlanClaim.topic_key, PlanClaim.embedding).filter(PlanClaim.expiresAt > datetime.datetime.utcnow()).all()
+  for topic_key, embedding in claims:
+    if topic_key == key or _similar(vector, _unit(embedding)):
+      return topic_key
+  return None
+
+def _try_claim(db, key: str, embedding) -> bool:
+  # An expired claim on this topic was left by a worker that died
+  db.query(PlanClaim).filter(PlanClaim.topic_key == key, PlanClaim.expiresAt <= datetime.datetime.utcnow()).delete(synchronize_session=False)
+  db.add(PlanClaim(topic_key=key, owner=_OWNER, embedding=embedding, expiresAt=_expiry()))
+  try:
+    db.commit()
+    return True
+  except IntegrityError:
+    db.rollback()
+    return False
+
+def _heartbeat(key: str, stop: threading.Event):
+  while not stop.wait(config.PLAN_CLAIM_TTL_SECONDS / 3):
+    db = SessionLocal()
+    try:
+      db.query(PlanClaim).filter(PlanClaim.topic_key == key, PlanClaim.owner == _OWNER).update(
+        {PlanClaim.expiresAt: _expiry()}, synchronize_session=False
+      )
+      db.commit()
+    except Exception as e:
+      logger.warning(f"Could not extend the generation claim on '{key}': {e}")
+      db.rollback()
+    finally:
+      db.close()
+
+def _release(key: str):
+  db = SessionLocal()
+  try:
+    db.query(PlanClaim).filter(PlanClaim.topic_key == key, PlanClaim.owner == _OWNER).delete(synchronize_session=False)
+    db.commit()
+  except Exception as e:
+    # The claim expires on its own
+    logger.warning(f"Could not release the generation claim on '{key}': {e}")
+    db.rollback()
+  finally:
+    db.close()
+
+def _claim_across_processes(key: str, embedding, vector, plan_exists) -> bool:
+  """Waits until no other worker is generating this topic. Returns True once this process holds the claim, False if the plan exists."""
+  waited = False
+  while True:
+    db = SessionLocal()
+    try:
+      other = _active_claim(db, key, vector)
+      if other is None:
+        if not _try_claim(db, key, embedding):
+          continue
+        # Checked again while holding the claim: another worker may have committed the plan
+        # and released its claim since the caller's lookup (or while we waited)
+        if plan_exists():
+          _release(key)
+          return False
+        return True
+    finally:
+      db.close()
+
+    if not waited:
+      logger.info(f"'{key}' is already being generated by another worker (as '{other}'). Waiting for it.")
+      waited = True
+    time.sleep(config.PLAN_CLAIM_POLL_SECONDS)
+
+def generate_plan_once(topic: str, embedding, generate, plan_exists) -> bool:
+  """
+  Runs generate() for `topic` unless the same or a similar topic is already being generated, in
+  this process or another worker, in which case it waits for that generation instead. Returns
+  True if this call generated the plan. plan_exists() is checked once the claim is held, so a plan
+  committed by another worker after the caller's own lookup is never generated twice.
+  """
+  key = normalize_topic(topic)
+  vector = _unit(embedding)
+  flight, is_leader = _join_or_lead(key, vector)
+  if not is_leader:
+    logger.info(f"'{key}' is already being generated by this worker (as '{flight.key}'). Waiting for it.")
+    metrics.increment("plan_generations_coalesced", scope="process")
+    flight.done.wait()
+    if flight.error is not None:
+      raise flight.error
+    return False
+
+  try:
+    if not _claim_across_processes(key, embedding, vector, plan_exists):
+      metrics.increment("plan_generations_coalesced", scope="cluster")
+      return False
+
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(key, stop), daemon=True).start()
+    try:
+      generate()
+    finally:
+      stop.set()
+      _release(key)
+    return True
+  except Exception as e:
+    flight.error = e
+    raise
+  finally:
+    with _lock:
+      _flights.pop(key, None)
+    flight.done.set()
@@ -0,0 +1,171 @@
+# File: agent_backend/agent/snapshots.py
+#
+# Read-optimized plan snapshots. Plans are read far more often than they
+# change, so the response for a plan is serialized once and stored in the
+# plan_snapshots table together with an ETag (a hash of the JSON). Each process
+# also keeps the parsed payloads of recently read plans in an LRU; a read checks
+# the stored ETag (one primary-key lookup) before serving its cached payload, so
+# a snapshot that another worker invalidated is never served.
+#
+# Anything that changes what a plan looks like to the user (modules saved,
+# progress marked) calls invalidate() inside its own transaction. That bumps
+# the plan's snapshot version and clears the stored body; the next read
+# rebuilds it from the plan and its modules. A rebuild only stores its result
+# if the version is still the one it read before loading the plan, so a write
+# that commits while a snapshot is being built can't leave a stale one behind.
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import joinedload
+
+from . import config, metrics
+from .database import SessionLocal
+from .models import Plan, PlanSnapshot
+
+@dataclass(frozen=True)
+class Snapshot:
+  plan_id: str
+  etag: str
+  payload: dict # Shared by every reader of this version, so it must not be modified
+
+_lock = threading.Lock()
+_snapshots = OrderedDict() # plan_id -> Snapshot, least recently used first
+_stats = {"memory_hits": 0, "stored_hits": 0, "builds": 0, "invalidations": 0}
+
+def _count(name: str):
+  with _lock:
+    _stats[name] += 1
+
+def stats() -> dict:
+  with _lock:
+    return {"name": "plan_snapshots", "entries": len(_snapshots), **_stats}
+
+metrics.register_collector("plan_snapshots", stats, gauges=("entries",))
+
+def plan_payload(plan) -> dict:
+  """The JSON-serialisable form of a plan and its modules, in step order (what the frontend gets)."""
+  return {
+    "id": plan.id,
+    "topic": plan.topic,
+    "modules": [
+      {
+        "id": module.id,
+        "stepNumber": module.stepNumber,
+        "title": module.title,
+        "is_complete": module.is_complete,
+        "articleTitle": module.articleTitle,
+        "articleReason": module.articleReason,
+        "articleLink": module.articleLink,
+        "videos": module.videos,
+      }
+      for module in sorted(plan.modules, key=lambda m: m.stepNumber)
+    ],
+  }
+
+def _etag(body: str) -> str:
+  return hashlib.sha256(body.encode("utf-8")).hexdigest()[:32]
+
+def _remember(snapshot: Snapshot):
+  with _lock:
+    _snapshots[snapshot.plan_id] = snapshot
+    _snapshots.move_to_end(snapshot.plan_id)
+    while len(_snapshots) > config.PLAN_SNAPSHOT_CACHE_SIZE:
+      _snapshots.popitem(last=False)
+
+def _cached(plan_id: str):
+  with _lock:
+    snapshot = _snapshots.get(plan_id)
+    if snapshot is not None:
+      _snapshots.move_to_end(plan_id)
+    return snapshot
+
+def _build(db, plan_id: str, version):
+  """
+  Builds a plan's snapshot and stores it if the plan's snapshot version is still `version` (None:
+  no snapshot row existed). Returns the Snapshot even when it isn't stored.
+  """
+  plan = db.query(Plan).options(joinedload(Plan.modules)).filter(Plan.id == plan_id).first()
+  if plan is None:
+    return None
+  payload = plan_payload(plan)
+  body = json.dumps(payload)
+  etag = _etag(body)
+  try:
+    if version is None:
+      # Fails if a writer (or another reader) created the row since we looked
+      db.add(PlanSnapshot(plan_id=plan_id, version=0, etag=etag, body=body))
+    else:
+      # Matches nothing if the plan was invalidated since we read the version
+      db.query(PlanSnapshot).filter(PlanSnapshot.plan_id == plan_id, PlanSnapshot.version == version).update(
+        {PlanSnapshot.etag: etag, PlanSnapshot.body: body}, synchronize_session=False
+      )
+    db.commit()
+  except (IntegrityError, OperationalError):
+    # Lost the race (on SQLite, a writer committed since our read began); the next read rebuilds it
+    db.rollback()
+  return Snapshot(plan_id, etag, payload)
+
+@metrics.timed("db.get_plan_snapshot")
+def get_snapshot(plan_id: str, db=None):
+  """
+  Returns the current Snapshot of a plan, or None if the plan doesn't exist. A missing snapshot
+  is built and stored, committing `db` if one is passed in.
+  """
+  owns_session = db is None
+  if owns_session:
+    db = SessionLocal()
+  try:
+    cached = _cached(plan_id)
+    if cached is not None:
+      if db.query(PlanSnapshot.etag).filter(PlanSnapshot.plan_id == plan_id).scalar() == cached.etag:
+        _count("memory_hits")
+        return cached
+
+    # The version is read before the plan itself, so a write committed in between is detected
+    row = db.query(PlanSnapshot.version, PlanSnapshot.etag, PlanSnapshot.body).filter(PlanSnapshot.plan_id == plan_id).first()
+    if row is not None and row.body is not None:
+      snapshot = Snapshot(plan_id, row.etag, json.loads(row.body))
+      _count("stored_hits")
+    else:
+      snapshot = _build(db, plan_id, row.version if row is not None else None)
+      if snapshot is None:
+        return None
+      _count("builds")
+    _remember(snapshot)
+    return snapshot
+  finally:
+    if owns_session:
+      db.close()
+
+def invalidate(db, plan_id: str):
+  """
+  Marks a plan's stored snapshot out of date as part of the caller's transaction (bumping its
+  version, so a snapshot being built concurrently isn't stored), and drops this process's copy.
+  """
+  dialect = db.get_bind().dialect.name
+  if dialect in ('postgresql', 'sqlite'):
+    if dialect == 'postgresql':
+      from sqlalchemy.dialects.postgresql import insert as upsert
+    else:
+      from sqlalchemy.dialects.sqlite import insert as upsert
+    statement = upsert(PlanSnapshot).values(plan_id=plan_id, version=1, etag=None, body=None)
+    statement = statement.on_conflict_do_update(
+      index_elements=[PlanSnapshot.plan_id],
+      set_={'version': PlanSnapshot.version + 1, 'etag': None, 'body': None},
+    )
+    db.execute(statement)
+  else:
+    updated = db.query(PlanSnapshot).filter(PlanSnapshot.plan_id == plan_id).update(
+      {PlanSnapshot.version: PlanSnapshot.version + 1, PlanSnapshot.etag: None, PlanSnapshot.body: None},
+      synchronize_session=False,
+    )
+    if not updated:
+      db.add(PlanSnapshot(plan_id=plan_id, version=1))
+  with _lock:
+    _snapshots.pop(plan_id, None)
+    _stats["invalidations"] += 1
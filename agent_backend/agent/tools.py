@@ -1,17 +1,24 @@
 # File: agent_backend/agent/tools.py
 
-import os
 import requests
 import json
+import threading
 
-from googleapiclient.discovery import build
-from . import config
+from . import config, http_client, metrics, search_cache
+from .concurrency import io_pool, upstream_limit
 from .logger import logger
-from youtube_transcript_api import TranscriptsDisabled, NoTranscriptFound, YouTubeTranscriptApi
+
+# googleapiclient and youtube_transcript_api are imported inside the functions
+# that use them, so entry points that never search YouTube don't pay for them.
 
 
 # Now to our new tool
 def google_search(query: str):
+  return search_cache.cached("serper", lambda: _serper_search(query), query)
+
+@metrics.timed("serper.search")
+def _serper_search(query: str):
+  config.require("web_search")
   url = "https://google.serper.dev/search"
   payload = json.dumps({'q' : query})
   headers = {
@@ -22,7 +29,8 @@ def google_search(query: str):
   print(f" > Web searching for: {query}...")
 
   try:
-    response = requests.request("POST", url, headers=headers, data=payload)
+    with upstream_limit("serper"):
+      response = http_client.request("POST", url, upstream="serper", headers=headers, data=payload)
     response.raise_for_status()
     return response.json().get('organic',[])
   except requests.exceptions.RequestException as e:
@@ -32,59 +40,178 @@ def google_search(query: str):
 
 
 # Now we have to get to work on the youtube search
-def youtube_search(query: str, order: str = 'relevance', max_results=5):
+class YouTubeClient:
   """
-  Performs a YouTube search using the official YouTube API v3.
-  'order' can be 'relevance', 'viewCount', or 'date'.
+  A reusable YouTube Data API v3 client. The discovery document is parsed once,
+  each thread keeps its own service object and keep-alive HTTP connection
+  (googleapiclient objects aren't thread-safe), and quota units are counted.
   """
-  logger.info(f"YouTube Search (Official API, order by {order}): {query}...")
-  try:
-      youtube = build('youtube', 'v3', developerKey=config.YOUTUBE_API_KEY)
 
-      search_response = youtube.search().list(
+  # Quota cost of each API method, in units
+  SEARCH_LIST_COST = 100
+  VIDEOS_LIST_COST = 1
+  # videos().list accepts at most 50 ids per call
+  MAX_IDS_PER_CALL = 50
+
+  def __init__(self, api_key: str):
+    self._api_key = api_key
+    self._discovery_doc = None
+    self._local = threading.local()
+    self._quota_lock = threading.Lock()
+    self.quota_units = 0
+
+  def _service(self):
+    service = getattr(self._local, "service", None)
+    if service is None:
+      import httplib2
+      from googleapiclient import discovery_cache
+      from googleapiclient.discovery import build_from_document
+
+      if self._discovery_doc is None:
+        self._discovery_doc = discovery_cache.get_static_doc("youtube", "v3")
+      service = build_from_document(
+        self._discovery_doc,
+        developerKey=self._api_key,
+        http=httplib2.Http(timeout=config.YOUTUBE_TIMEOUT_SECONDS),
+      )
+      self._local.service = service
+    return service
+
+  def _charge(self, units: int):
+    with self._quota_lock:
+      self.quota_units += units
+
+  def search_ids(self, query: str, order: str, max_results: int) -> list:
+    """Returns the video ids of one search().list call, in ranking order."""
+    with metrics.span("youtube.search"), upstream_limit("youtube"):
+      self._charge(self.SEARCH_LIST_COST)
+      search_response = self._service().search().list(
         q=query,
         part='id',
         maxResults=max_results,
         type='video',
         order=order
       ).execute()
+    return [item['id']['videoId'] for item in search_response.get('items', [])]
+
+  def video_details(self, video_ids) -> dict:
+    """Fetches snippet and statistics for the given ids in as few videos().list calls as possible."""
+    details = {}
+    unique_ids = list(dict.fromkeys(video_ids))
+    for start in range(0, len(unique_ids), self.MAX_IDS_PER_CALL):
+      with metrics.span("youtube.videos"), upstream_limit("youtube"):
+        self._charge(self.VIDEOS_LIST_COST)
+        video_response = self._service().videos().list(
+          part='snippet,statistics',
+          id=','.join(unique_ids[start:start + self.MAX_IDS_PER_CALL])
+        ).execute()
+      for item in video_response.get('items', []):
+        details[item.get('id')] = _to_rich_result(item)
+    return details
+
+  def search_orders(self, query: str, orders, max_results: int = 5) -> dict:
+    """
+    Runs one search per sort order concurrently, then fetches the statistics for the
+    union of the returned ids in one batched call. Returns {order: [rich results]}.
+    """
+    futures = {order: io_pool.submit(self.search_ids, query, order, max_results) for order in orders}
+    ids_by_order = {}
+    for order, future in futures.items():
+      try:
+        ids_by_order[order] = future.result()
+      except Exception as e:
+        logger.error(f"Could not perform YouTube search (order by {order}): {e}")
+        ids_by_order[order] = []
+
+    all_ids = [video_id for ids in ids_by_order.values() for video_id in ids]
+    if not all_ids:
+      return {order: [] for order in orders}
+    try:
+      details = self.video_details(all_ids)
+    except Exception as e:
+      logger.error(f"Could not fetch YouTube video statistics: {e}")
+      return {order: [] for order in orders}
+
+    return {order: [details[video_id] for video_id in ids if video_id in details] for order, ids in ids_by_order.items()}
+
+def _to_rich_result(item) -> dict:
+  snippet = item.get('snippet', {})
+  stats = item.get('statistics', {})
+  return {
+      'title': snippet.get('title'),
+      'link': f"https://www.youtube.com/watch?v={item.get('id')}",
+      'channelTitle': snippet.get('channelTitle'),
+      'viewCount': int(stats.get('viewCount', 0)),
+      'likeCount': int(stats.get('likeCount', 0)),
+      'thumbnail': snippet.get('thumbnails', {}).get('medium', {}).get('url')
+  }
 
-      video_ids = [item['id']['videoId'] for item in search_response.get('items', [])]
-      if not video_ids: return []
-      
-      video_response = youtube.videos().list(
-        part='snippet,statistics',
-        id=','.join(video_ids)
-      ).execute()
+_youtube_client = None
+_youtube_client_lock = threading.Lock()
 
-      rich_results = []
-      for item in video_response.get('items', []):
-        snippet = item.get('snippet', {})
-        stats = item.get('statistics', {})
-        rich_results.append({
-            'title': snippet.get('title'),
-            'link': f"https://www.youtube.com/watch?v={item.get('id')}",
-            'channelTitle': snippet.get('channelTitle'),
-            'viewCount': int(stats.get('viewCount', 0)),
-            'likeCount': int(stats.get('likeCount', 0)),
-            # ==================================================================
-            # THE ONLY CHANGE IS ADDING THIS LINE
-            # ==================================================================
-            'thumbnail': snippet.get('thumbnails', {}).get('medium', {}).get('url')
-        })
-      return rich_results
-  except Exception as e:
-    logger.error(f"Could not perform YouTube search: {e}")
-    return []
+def get_youtube_client() -> YouTubeClient:
+  """Returns the process-wide YouTube client, creating it on first use."""
+  global _youtube_client
+  with _youtube_client_lock:
+    if _youtube_client is None:
+      config.require("youtube")
+      _youtube_client = YouTubeClient(config.YOUTUBE_API_KEY)
+  return _youtube_client
+
+def youtube_search(query: str, order: str = 'relevance', max_results=5):
+  """
+  Performs a YouTube search using the official YouTube API v3.
+  'order' can be 'relevance', 'viewCount', or 'date'.
+  """
+  return youtube_search_orders(query, [order], max_results)[order]
+
+def youtube_search_orders(query: str, orders, max_results=5) -> dict:
+  """
+  Searches YouTube once per sort order and returns {order: [rich results]}, sharing one statistics lookup.
+  Cached orders are served from the search cache; stale ones are refreshed in the background.
+  """
+  results, missing, stale = {}, [], []
+  for order in orders:
+    hit = search_cache.get("youtube", query, order, max_results)
+    if hit is None:
+      missing.append(order)
+      continue
+    results[order], is_stale = hit
+    if is_stale:
+      stale.append(order)
+  if stale:
+    # One refresh for all stale orders, so they still share a statistics lookup
+    search_cache.revalidate_orders(
+      "youtube", lambda stale_orders: get_youtube_client().search_orders(query, stale_orders, max_results),
+      query, stale, max_results,
+    )
+
+  if missing:
+    logger.info(f"YouTube Search (Official API, order by {', '.join(missing)}): {query}...")
+    fetched = get_youtube_client().search_orders(query, missing, max_results)
+    for order in missing:
+      search_cache.put("youtube", fetched[order], query, order, max_results)
+    results.update(fetched)
+  return {order: results[order] for order in orders}
+
+def youtube_quota_used() -> int:
+  """Total YouTube API quota units this process has consumed so far."""
+  return _youtube_client.quota_units if _youtube_client is not None else 0
+
+metrics.register_collector("youtube", lambda: {"quota_units": youtube_quota_used()})
+metrics.register_collector("http", http_client.latency_stats, gauges=("max_ms",))
 
 
 
 #New function to get youtube transcript
+@metrics.timed("youtube.transcript")
 def get_youtube_transcript(video_url: str) -> str:
   """
   Fetches the transcript for a given YouTube video URL.
   Returns the transcript text or an error message string.
   """
+  from youtube_transcript_api import TranscriptsDisabled, NoTranscriptFound, YouTubeTranscriptApi
+
   logger.info(f"Fetching Transcript for video: {video_url}")
   try:
       if "youtu.be/" in video_url:
@@ -104,14 +231,13 @@ def get_youtube_transcript(video_url: str) -> str:
       ytt_api = YouTubeTranscriptApi()
       transcript_data = ytt_api.fetch(video_id, languages=['en', 'en-US', 'en-GB'])
 
-      transcript_text = ""
+      lines = []
       for snippet in transcript_data:
           minutes, seconds = divmod(int(snippet.start), 60)
-          timestamp = f"[{minutes:02d}:{seconds:02d}]"
-          transcript_text += f"{timestamp} {snippet.text}\n"
-          
-      print(transcript_text)    
-      return transcript_text
+          lines.append(f"[{minutes:02d}:{seconds:02d}] {snippet.text}\n")
+
+      logger.info(f"Fetched transcript with {len(lines)} lines.")
+      return "".join(lines)
 
   except (TranscriptsDisabled, NoTranscriptFound):
       logger.warning(f"No transcript found or transcripts are disabled for video: {video_id}")
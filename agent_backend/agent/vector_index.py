@@ -0,0 +1,205 @@
+# File: agent_backend/agent/vector_index.py
+#
+# An in-memory similarity index over plan embeddings. It keeps a pre-normalized
+# float32 matrix (one row per plan) that is extended incrementally with plans
+# created since the last refresh, so a lookup is one matrix-vector product
+# instead of loading every plan and module from the database. The index is
+# periodically reconciled with the plan ids in the database, which picks up plans
+# committed behind that createdAt watermark and drops deleted ones.
+
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from . import config
+from .logger import logger
+from .models import Plan
+
+# hnswlib is optional: without it (or for small catalogues) we use exact search
+try:
+  import hnswlib
+except ImportError:
+  hnswlib = None
+
+_RECONCILE_BATCH_SIZE = 500
+
+@dataclass
+class PlanMatch:
+  plan_id: str
+  topic: str
+  score: float
+
+def normalize_topic(topic: str) -> str:
+  """Case- and whitespace-insensitive form of a topic, used for exact-match lookups and cache keys."""
+  return " ".join(topic.lower().split())
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+  norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+  norms[norms == 0] = 1.0
+  return vectors / norms
+
+class PlanIndex:
+  """Exact (brute-force) cosine search over all plans, with an optional HNSW backend."""
+
+  def __init__(self, ann_min_plans: int = config.PLAN_INDEX_ANN_MIN_PLANS):
+    self._lock = threading.Lock() # Guards the index itself; searches only wait on this
+    self._refresh_lock = threading.Lock() # One refresh (and its queries) at a time
+    self._ids = []
+    self._topics = []
+    self._known_ids = set()
+    self._seen_ids = set() # Every plan id refresh has processed, including skipped ones
+    self._ids_by_topic = {}
+    self._matrix = None
+    self._last_created_at = None
+    self._last_reconciled = 0.0
+    self._ann_min_plans = ann_min_plans
+    self._ann = None
+
+  def __len__(self):
+    return len(self._ids)
+
+  def _reconcile(self, db, rows: list):
+    """
+    Returns the ids of every plan in the database, and adds to `rows` the plans the createdAt
+    watermark skipped: createdAt comes from each writer's clock and commits can land late, so
+    a plan can be older than the newest one already loaded. Only called with _refresh_lock held.
+    """
+    live_ids = {plan_id for (plan_id,) in db.query(Plan.id)}
+    seen = self._seen_ids | {row[0] for row in rows}
+    missing = [plan_id for plan_id in live_ids if plan_id not in seen]
+    for start in range(0, len(missing), _RECONCILE_BATCH_SIZE):
+      batch = missing[start:start + _RECONCILE_BATCH_SIZE]
+      rows.extend(db.query(Plan.id, Plan.topic, Plan.embedding, Plan.createdAt).filter(Plan.id.in_(batch)).all())
+    if missing:
+      logger.info(f"Plan index picked up {len(missing)} plan(s) committed behind its createdAt watermark.")
+    return live_ids
+
+  def refresh(self, db):
+    """
+    Adds plans created since the last refresh. Only id, topic and embedding are loaded. Every
+    PLAN_INDEX_RECONCILE_SECONDS it also compares the index with the plan ids in the database,
+    adding plans it missed and dropping deleted ones.
+    """
+    with self._refresh_lock:
+      query = db.query(Plan.id, Plan.topic, Plan.embedding, Plan.createdAt)
+      if self._last_created_at is not None:
+        # '>=' so plans sharing the last timestamp aren't missed; known ids are skipped below
+        query = query.filter(Plan.createdAt >= self._last_created_at)
+      rows = query.order_by(Plan.createdAt).all()
+
+      live_ids = None
+      now = time.monotonic()
+      if self._last_created_at is None:
+        # The first refresh loads every plan
+        self._last_reconciled = now
+      elif now - self._last_reconciled >= config.PLAN_INDEX_RECONCILE_SECONDS:
+        self._last_reconciled = now
+        live_ids = self._reconcile(db, rows)
+
+      with self._lock:
+        added = self._add_rows(rows)
+        if live_ids is not None:
+          self._evict_deleted(live_ids)
+        return added
+
+  def _add_rows(self, rows) -> int:
+    new_ids, new_topics, new_vectors = [], [], []
+    dim = self._matrix.shape[1] if self._matrix is not None else None
+    for plan_id, topic, embedding, created_at in rows:
+      if created_at is not None and (self._last_created_at is None or created_at > self._last_created_at):
+        self._last_created_at = created_at
+      self._seen_ids.add(plan_id)
+      if plan_id in self._known_ids or embedding is None:
+        continue
+      vector = np.asarray(embedding, dtype=np.float32)
+      if dim is None:
+        dim = vector.shape[0]
+      if vector.shape[0] != dim:
+        logger.warning(f"Skipping plan '{topic}': embedding has {vector.shape[0]} dimensions, index has {dim}.")
+        continue
+      self._known_ids.add(plan_id)
+      new_ids.append(plan_id)
+      new_topics.append(topic)
+      new_vectors.append(vector)
+
+    for plan_id, topic in zip(new_ids, new_topics):
+      self._ids_by_topic[normalize_topic(topic)] = plan_id
+
+    if not new_vectors:
+      return 0
+
+    block = _normalize(np.vstack(new_vectors))
+    start = len(self._ids)
+    self._matrix = block if self._matrix is None else np.vstack([self._matrix, block])
+    self._ids.extend(new_ids)
+    self._topics.extend(new_topics)
+    self._update_ann(block, start)
+    return len(new_ids)
+
+  def _evict_deleted(self, live_ids: set):
+    """Drops plans that are no longer in the database, so search never returns a deleted plan."""
+    self._seen_ids &= live_ids
+    deleted = self._known_ids - live_ids
+    if not deleted:
+      return
+    keep = [i for i, plan_id in enumerate(self._ids) if plan_id not in deleted]
+    self._ids = [self._ids[i] for i in keep]
+    self._topics = [self._topics[i] for i in keep]
+    self._matrix = self._matrix[keep] if keep else None
+    self._known_ids -= deleted
+    self._ids_by_topic = {normalize_topic(topic): plan_id for plan_id, topic in zip(self._ids, self._topics)}
+    # Positions have shifted, so the ANN index is rebuilt (plans are only deleted by hand, so this is rare)
+    self._ann = None
+    if self._matrix is not None:
+      self._update_ann(self._matrix, 0)
+    logger.info(f"Plan index dropped {len(deleted)} deleted plan(s).")
+
+  def _update_ann(self, block: np.ndarray, start: int):
+    if hnswlib is None or len(self._ids) < self._ann_min_plans:
+      return
+    if self._ann is None:
+      # Build the ANN index from everything we have so far
+      self._ann = hnswlib.Index(space="ip", dim=self._matrix.shape[1])
+      self._ann.init_index(max_elements=len(self._ids) * 2, ef_construction=200, M=16)
+      self._ann.add_items(self._matrix, np.arange(len(self._ids)))
+      self._ann.set_ef(64)
+      logger.info(f"Built HNSW plan index over {len(self._ids)} plans.")
+      return
+    if len(self._ids) > self._ann.get_max_elements():
+      self._ann.resize_index(len(self._ids) * 2)
+    self._ann.add_items(block, np.arange(start, start + len(block)))
+
+  def lookup_topic(self, topic: str):
+    """Returns the id of the plan whose topic matches exactly (after normalization), or None."""
+    return self._ids_by_topic.get(normalize_topic(topic))
+
+  def search(self, embedding, k: int = 1):
+    """Returns up to k PlanMatch objects, best first, scored by cosine similarity."""
+    with self._lock:
+      if self._matrix is None or k <= 0:
+        return []
+      query = np.asarray(embedding, dtype=np.float32)
+      if query.shape[0] != self._matrix.shape[1]:
+        return []
+      query = _normalize(query)
+      k = min(k, len(self._ids))
+
+      if self._ann is not None:
+        labels, distances = self._ann.knn_query(query, k=k)
+        # For the 'ip' space hnswlib returns 1 - inner product
+        indices, scores = labels[0], 1.0 - distances[0]
+      else:
+        all_scores = self._matrix @ query
+        if k < len(all_scores):
+          indices = np.argpartition(-all_scores, k - 1)[:k]
+        else:
+          indices = np.arange(len(all_scores))
+        indices = indices[np.argsort(-all_scores[indices])]
+        scores = all_scores[indices]
+
+      return [PlanMatch(self._ids[i], self._topics[i], float(s)) for i, s in zip(indices, scores)]
+
+# One index per process; workers keep it warm across requests
+plan_index = PlanIndex()
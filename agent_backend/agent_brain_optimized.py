@@ -1,75 +1,51 @@
 # File: agent_backend/agent_brain_optimized.py
+#
+# Each entry point imports only what it needs: a YouTube link loads the chat
+# model and transcript API, a cache hit loads the embedding client and the
+# database, and only a cache miss pays for the search tools (plus the LangChain
+# agent when plans are generated in 'agent' mode).
 
+import argparse
 import json
-import google.generativeai as genai
-import os
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.agents import AgentExecutor, create_react_agent
-from langchain import hub
-import tldextract
-from agent import config
-from agent.logger import logger
 import re
-import sys 
-
-from agent.agent_tools import (
-	curriculum_planning_tool,
-	research_and_save_module_tool,
-	set_models,
-	youtube_note_taker_tool
-)
-from agent.memory import (
-	find_similar_plan_in_db,
-	get_embedding,
-	format_plan_for_display,
-	mark_module_as_complete,
-	save_feedback_to_db
-)
-
-def plan_to_dict(plan):
-    if not plan:
-        return None
-    sorted_modules = sorted(plan.modules, key=lambda m: m.stepNumber)
-    return {
-        "id": plan.id,
-        "topic": plan.topic,
-        "modules": [
-            {
-                "id": module.id,
-                "stepNumber": module.stepNumber,
-                "title": module.title,
-                "is_complete": module.is_complete,
-                "articleTitle": module.articleTitle,
-                "articleReason": module.articleReason,
-                "articleLink": module.articleLink,
-                "videos": json.loads(module.videosJson) 
-            }
-            for module in sorted_modules
-        ]
-    }
+import sys
+import time
+
+from agent import config, metrics
+from agent.logger import logger
+
+# Inputs matching this are YouTube links (turned into notes), anything else is a topic
+YOUTUBE_LINK_REGEX = r"(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})"
+
+def is_youtube_link(user_input):
+	return re.match(YOUTUBE_LINK_REGEX, user_input) is not None
+
+def snapshot_to_dict(snapshot, etag=None):
+	"""The response for a stored plan, or {'notModified': True, 'etag': ...} when the caller already has this version."""
+	if etag and etag == snapshot.etag:
+		return {"notModified": True, "etag": snapshot.etag}
+	return {**snapshot.payload, "etag": snapshot.etag}
 
 def interactive_session(plan):
+	from agent.memory import format_plan_for_display, module_views, record_module_progress
+	from agent.notes import generate_video_notes
+
 	logger.info("Plan loaded, Entering interactive session.")
 	print("Commands: 'next', 'quit', 'view plan', 'notes <video_number>' (e.g., 'notes 1')")
+	# Sorted once, with each article's source resolved up front
+	modules = module_views(plan)
 	while True:
-		current_module = None
-		sorted_modules = sorted(plan.modules, key=lambda m: m.stepNumber)
-		for module in sorted_modules:
-			if not module.is_complete:
-				current_module = module
-				break
+		current_module = next((module for module in modules if not module.is_complete), None)
 		if current_module is None:
 			logger.info("All modules for this plan are complete.")
 			print("\n🎉 Congratulations! You have completed all modules for this plan! 🎉")
 			break
 		print("-"* 50)
-		print(f"Current Step ({current_module.stepNumber}/{len(plan.modules)}): {current_module.title}")
-		videos = json.loads(current_module.videosJson)
-		video_list = []
+		print(f"Current Step ({current_module.step_number}/{len(modules)}): {current_module.title}")
+		video_list = [video_info for _, video_info in current_module.videos]
 		print("  Available Videos for Notes:")
-		for i, (category, video_info) in enumerate(videos.items()):
+		for i, (category, video_info) in enumerate(current_module.videos):
 				print(f"    {i+1}: [{category}] {video_info['title'][:60]}...")
-				video_list.append(video_info)
 		user_command = input("> ").lower().strip()
 		if user_command == 'quit':
 			logger.info("User quit the interactive session.")
@@ -77,35 +53,29 @@ def interactive_session(plan):
 			break
 		elif user_command == 'next':
 			print("\nGreat! Before we move on, how helpful were the resources for this module?")
-			article_url = current_module.articleLink
-			extracted_article = tldextract.extract(article_url)
-			if extracted_article.subdomain and extracted_article.subdomain != 'www':
-				article_source = f"{extracted_article.subdomain}.{extracted_article.domain}.{extracted_article.suffix}"
-			else:
-				article_source = extracted_article.registered_domain
-			if not article_source.strip('.'):
-				article_source = "Unknown Website"
+			article_source = current_module.article_source
+			# Every rating is collected first, then saved with the module's progress in one transaction
+			ratings = []
 			while True:
 				try:
-					article_rating = int(input(f"  - Rate the article from '{article_source}' (1 to 5): '{current_module.articleTitle[:50]}...'\n > "))
+					article_rating = int(input(f"  - Rate the article from '{article_source}' (1 to 5): '{current_module.article_title[:50]}...'\n > "))
 					if 1<= article_rating <= 5:
-						save_feedback_to_db(current_module.id, current_module.articleLink, 'article', article_source, article_rating)
+						ratings.append({'resource_link': current_module.article_link, 'resource_type': 'article', 'source': article_source, 'rating': article_rating})
 						break
 					else: print(" Please enter a number between 1 and 5.")
 				except ValueError: print("  Invalid input. Please enter a number.")
-			videos = json.loads(current_module.videosJson)
-			for category, video_info in videos.items():
+			for category, video_info in current_module.videos:
 				video_source = 'youtube.com'
 				while True:
 					try:
 						video_rating = int(input(f"  - Rate the '{category}' video from YouTube (1-5): '{video_info['title'][:50]}...'\n  > "))
 						if 1 <= video_rating <= 5:
-							save_feedback_to_db(current_module.id, video_info['link'], 'video', video_source, video_rating)
+							ratings.append({'resource_link': video_info['link'], 'resource_type': 'video', 'source': video_source, 'rating': video_rating})
 							break
 						else: print("  Please enter a number between 1 and 5.")
 					except ValueError: print("  Invalid input. Please enter a number.")
-			mark_module_as_complete(current_module.id)
-			current_module.is_complete = True
+			if record_module_progress(current_module.id, ratings):
+				current_module.is_complete = True
 		elif user_command == 'view plan':
 			print("\nLoading your plan...\n")
 			print(format_plan_for_display(plan))
@@ -120,7 +90,7 @@ def interactive_session(plan):
 							selected_video = video_list[video_number - 1]
 							video_url = selected_video['link']
 							print(f"\n🤖 Generating notes for: '{selected_video['title']}'...")
-							notes = youtube_note_taker_tool.invoke({ "video_url": video_url, "module_id": current_module.id })
+							notes = generate_video_notes(get_chat_model(), video_url, current_module.id)
 							print("\n--- Generated Notes ---")
 							print(notes)
 							print("-----------------------")
@@ -132,53 +102,168 @@ def interactive_session(plan):
 			print("Unknown command. Available commands: 'next', 'quit', 'view plan'")
 
 
-def main():
-	"""Main function to run the AI Learning Buddy as a LangChain Agent."""
-	
-	genai.configure(api_key=config.GEMINI_API_KEY)
-
-	# FIXED: Added google_api_key parameter
-	llm = ChatGoogleGenerativeAI(
-		model=config.CHAT_MODEL_NAME, 
-		temperature=0.5, 
-		convert_system_message_to_human=True,
-		google_api_key=config.GEMINI_API_KEY
-	)
-	
-	set_models(llm, genai)
+# Built lazily, once per process, and reused for every request
+_genai = None
+_chat_model = None
+_agent_executor = None
+
+def get_genai():
+	"""Imports and configures the Gemini SDK (used for embeddings)."""
+	global _genai
+	if _genai is None:
+		import google.generativeai as genai
+
+		config.require("gemini")
+		genai.configure(api_key=config.GEMINI_API_KEY)
+		_genai = genai
+	return _genai
+
+def get_chat_model():
+	"""Builds the Gemini chat model, wrapped in the shared LLM response cache."""
+	global _chat_model
+	if _chat_model is None:
+		from langchain_google_genai import ChatGoogleGenerativeAI
+		from agent.llm import CachedChatModel
+
+		config.require("gemini")
+		# FIXED: Added google_api_key parameter
+		_chat_model = CachedChatModel(ChatGoogleGenerativeAI(
+			model=config.CHAT_MODEL_NAME, 
+			temperature=0.5, 
+			convert_system_message_to_human=True,
+			google_api_key=config.GEMINI_API_KEY
+		))
+	return _chat_model
+
+def init_models():
+	"""Builds the chat model, tools and agent executor (once per process)."""
+	global _agent_executor
+	if _agent_executor is not None:
+		return _agent_executor
+
+	from langchain.agents import AgentExecutor, create_react_agent
+	from agent.agent_tools import curriculum_planning_tool, research_and_save_module_tool, set_models
+	from agent.prompts import load_react_prompt
+
+	chat_model = get_chat_model()
+	set_models(chat_model, get_genai())
 	tools = [curriculum_planning_tool, research_and_save_module_tool]
-	prompt = hub.pull("hwchase17/react")
-	agent = create_react_agent(llm, tools, prompt)
-	agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True, handle_parsing_errors=True)
+	prompt = load_react_prompt()
+	# The ReAct loop needs the raw runnable model; the tools use the cached wrapper
+	agent = create_react_agent(chat_model.raw_model, tools, prompt)
+	_agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True, handle_parsing_errors=True)
+	return _agent_executor
 
-	if len(sys.argv) > 1:
-		user_input = sys.argv[1]
-	else:
-		user_input = input("How can I help you learn today? (Enter a topic, or a YouTube link for notes): ")
+def handle_request(user_input, mode=None, etag=None):
+	"""
+	Serve a single request (a topic or a YouTube link) and return the JSON-serialisable result.
+	`mode` picks how a new plan is generated: 'pipeline' (direct) or 'agent' (ReAct loop).
+	Plans carry the ETag of their snapshot; pass it back as `etag` to get {'notModified': True}
+	instead of the whole plan when it hasn't changed.
+	When METRICS_EXPORT is on, the request's timings, token usage and cache hits are appended
+	to METRICS_DIR/runs.jsonl.
+	"""
+	if not config.METRICS_EXPORT:
+		return _serve_request(user_input, mode, etag)
 
-	youtube_regex = r"(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})"
-	is_youtube_link = re.match(youtube_regex, user_input)
+	snapshot = metrics.summary()
+	start = time.perf_counter()
+	outcome = "error"
+	try:
+		payload = _serve_request(user_input, mode, etag)
+		outcome = "error" if "error" in payload else "ok"
+		return payload
+	finally:
+		run = metrics.run_summary(snapshot, input=user_input, mode=mode or config.PLAN_GENERATION_MODE,
+			outcome=outcome, wall_ms=round((time.perf_counter() - start) * 1000, 3))
+		try:
+			metrics.append_run_summary(run)
+		except OSError as e:
+			logger.warning(f"Could not write the run summary: {e}")
+
+def _serve_request(user_input, mode=None, etag=None):
+	if is_youtube_link(user_input):
+		from agent.notes import generate_video_notes
 
-	if is_youtube_link:
 		logger.info(f"YouTube link detected. Running Note-Taker tool for: {user_input}")
-		notes = youtube_note_taker_tool.invoke({"video_url": user_input})
-		print(json.dumps({"notes": notes}))
-		return
+		notes = generate_video_notes(get_chat_model(), user_input)
+		return {"notes": notes}
+
+	from agent.memory import find_plan_snapshot_by_topic, find_similar_plan_snapshot, get_embedding
 
 	user_topic = user_input
 	logger.info(f"User requested topic: '{user_topic}'")
-	user_topic_embedding = get_embedding(genai, user_topic)
-	found_plan = find_similar_plan_in_db(user_topic_embedding)
 
-	if found_plan:
-		logger.info(f"Found similar plan for '{found_plan.topic}'. Returning existing plan.")
-		plan_dict = plan_to_dict(found_plan)
-		print(json.dumps(plan_dict))
-		return
+	# Repeat topics are served without calling the embedding API at all
+	snapshot = find_plan_snapshot_by_topic(user_topic)
+	if snapshot:
+		logger.info(f"Found existing plan for '{snapshot.payload['topic']}'. Returning existing plan.")
+		return snapshot_to_dict(snapshot, etag)
+
+	user_topic_embedding = get_embedding(get_genai(), user_topic)
+	snapshot = find_similar_plan_snapshot(user_topic_embedding)
+
+	if snapshot:
+		logger.info(f"Found similar plan for '{snapshot.payload['topic']}'. Returning existing plan.")
+		return snapshot_to_dict(snapshot, etag)
 	
+	from agent.rate_limit import RateLimitExceeded
+	from agent.singleflight import generate_plan_once
+	from agent.tools import youtube_quota_used
+
+	mode = mode or config.PLAN_GENERATION_MODE
+	def generate():
+		quota_before = youtube_quota_used()
+		if mode == "pipeline":
+			from agent.pipeline import generate_plan
+
+			logger.info(f"No existing plan found. Running the plan pipeline for '{user_topic}'.")
+			generate_plan(get_chat_model(), get_genai(), user_topic)
+		else:
+			run_agent(user_topic)
+		logger.info(f"YouTube API quota used for this plan: {youtube_quota_used() - quota_before} units")
+
+	def plan_exists():
+		return bool(find_plan_snapshot_by_topic(user_topic) or find_similar_plan_snapshot(user_topic_embedding))
+
+	# Concurrent requests for the same (or a similar) new topic share one generation
+	try:
+		if not generate_plan_once(user_topic, user_topic_embedding, generate, plan_exists):
+			logger.info(f"The plan for '{user_topic}' was generated by a concurrent request.")
+	except RateLimitExceeded as e:
+		logger.error(f"Plan generation for '{user_topic}' was rate limited: {e}")
+		return {"error": "The AI model is busy right now. Please try again in a minute."}
+
+	logger.info("Fetching newly created plan from the database...")
+	snapshot = find_plan_snapshot_by_topic(user_topic) or find_similar_plan_snapshot(user_topic_embedding)
+	
+	if snapshot:
+		return snapshot_to_dict(snapshot)
+	return {"error": "Failed to create or retrieve the learning plan."}
+
+def lookup_plan(user_topic, etag=None):
+	"""
+	Serve an existing plan without ever generating one: its snapshot, {'notModified': True} when
+	`etag` is still current, or {'notFound': True}. YouTube links never have a plan.
+	"""
+	if is_youtube_link(user_topic):
+		return {"notFound": True}
+
+	from agent.memory import find_plan_snapshot_by_topic, find_similar_plan_snapshot, get_embedding
+
+	snapshot = find_plan_snapshot_by_topic(user_topic)
+	if not snapshot:
+		snapshot = find_similar_plan_snapshot(get_embedding(get_genai(), user_topic))
+	if not snapshot:
+		return {"notFound": True}
+	return snapshot_to_dict(snapshot, etag)
+
+def run_agent(user_topic):
+	"""Generates and saves a plan by letting the LangChain ReAct agent drive the tools."""
+	agent_executor = init_models()
 	logger.info(f"No existing plan found. Launching LangChain agent for '{user_topic}'.")
 	
-	result = agent_executor.invoke({
+	agent_executor.invoke({
 		"input": f"Your mission is to create and save a learning plan for the topic: '{user_topic}'. "
 							"Follow these steps precisely: "
 							"1. First, use the 'curriculum_planning_tool' with input '{user_topic}' to get a JSON list of module titles. "
@@ -189,15 +274,45 @@ def main():
 	})
 	
 	logger.info("LangChain agent has finished its work.")
-	logger.info("Fetching newly created plan from the database...")
-	newly_created_plan = find_similar_plan_in_db(user_topic_embedding)
-	
-	if newly_created_plan:
-		plan_dict = plan_to_dict(newly_created_plan)
-		print(json.dumps(plan_dict))
-	else:
-		error_message = {"error": "Failed to create or retrieve the learning plan."}
-		print(json.dumps(error_message))
+
+def main():
+	"""Main function to run the AI Learning Buddy."""
+	parser = argparse.ArgumentParser(description="AI Learning Buddy")
+	parser.add_argument("user_input", nargs="?", help="A topic to learn, or a YouTube link for notes")
+	parser.add_argument("--mode", choices=["pipeline", "agent"], default=None,
+		help="How to generate new plans (default: PLAN_GENERATION_MODE, 'pipeline')")
+	parser.add_argument("--events", action="store_true",
+		help="Write JSON-lines progress events (see agent/events.py) to stdout and human output to stderr")
+	args = parser.parse_args()
+
+	user_input = args.user_input
+	if not user_input:
+		user_input = input("How can I help you learn today? (Enter a topic, or a YouTube link for notes): ")
+
+	if not args.events:
+		print(json.dumps(handle_request(user_input, args.mode)))
+		return
+
+	from agent import events
+	from agent.logger import stream_handler
+
+	events_out = sys.stdout
+	def write_event(event):
+		events_out.write(json.dumps(event) + "\n")
+		events_out.flush()
+
+	sys.stdout = sys.stderr
+	stream_handler.setStream(sys.stderr)
+	events.set_sink(write_event)
+	try:
+		payload = handle_request(user_input, args.mode)
+		if "error" in payload:
+			events.emit("error", message=payload["error"])
+		else:
+			events.emit("done", result=payload)
+	except Exception as e:
+		events.emit("error", message=str(e))
+		raise
 
 if __name__ == "__main__":
 	main()
\ No newline at end of file
@@ -0,0 +1,91 @@
+# File: agent_backend/agent_worker.py
+#
+# A long-lived worker process. It loads the models, tools and database engine
+# once and then serves jobs read from stdin, so requests no longer pay the
+# interpreter start-up and import cost of agent_brain_optimized.py.
+#
+# Protocol: one JSON object per line.
+#   stdin : {"id": "<job id>", "input": "<topic or YouTube link>", "mode": "pipeline" | "agent" (optional),
+#            "etag": "<ETag of the plan the caller already has>" (optional),
+#            "lookup": true (optional: only return an existing plan, never generate one)}
+#   stdout: {"type": "ready"}
+#           {"id": "<job id>", "type": "event", "event": "<name>", "data": {...}}
+#
+# Event names and payloads are listed in agent/events.py. Every job ends with
+# exactly one "done" or "error" event. Human log output goes to stderr only.
+#
+# With --lookup-only the worker skips loading the models and serves only lookup
+# jobs, so the web server can keep lookups off the workers busy generating plans.
+
+import argparse
+import json
+import sys
+import threading
+
+from agent import config, events, metrics
+from agent.logger import logger, stream_handler
+import agent_brain_optimized as brain
+
+# The real stdout is reserved for protocol messages
+_protocol_out = sys.stdout
+_protocol_lock = threading.Lock()
+
+def send_message(message):
+	"""Write a single protocol message to the real stdout."""
+	with _protocol_lock:
+		_protocol_out.write(json.dumps(message) + "\n")
+		_protocol_out.flush()
+
+def run_job(job, lookup_only=False):
+	"""Run one job, forwarding its progress events tagged with the job id."""
+	job_id = job.get("id")
+	events.set_sink(lambda event: send_message({"id": job_id, "type": "event", **event}))
+	try:
+		if lookup_only and not job.get("lookup"):
+			payload = {"error": "This worker only serves plan lookups."}
+		elif job.get("lookup"):
+			payload = brain.lookup_plan(job["input"], job.get("etag"))
+		else:
+			payload = brain.handle_request(job["input"], job.get("mode"), job.get("etag"))
+		if "error" in payload:
+			events.emit("error", message=payload["error"])
+		else:
+			events.emit("done", result=payload)
+	except Exception as e:
+		logger.error(f"Job {job_id} failed: {e}")
+		events.emit("error", message=str(e))
+	finally:
+		events.set_sink(None)
+		if config.METRICS_EXPORT:
+			try:
+				metrics.write_prometheus()
+			except OSError as e:
+				logger.warning(f"Could not write the metrics file: {e}")
+
+def main():
+	parser = argparse.ArgumentParser(description="Serve agent jobs read from stdin.")
+	parser.add_argument("--lookup-only", action="store_true", help="Only serve lookup jobs; the models are never loaded")
+	args = parser.parse_args()
+
+	# print() and log output must never reach the protocol stream
+	sys.stdout = sys.stderr
+	stream_handler.setStream(sys.stderr)
+	if not args.lookup_only:
+		brain.init_models()
+	send_message({"type": "ready"})
+
+	for line in sys.stdin:
+		if not line.strip():
+			continue
+		try:
+			job = json.loads(line)
+		except json.JSONDecodeError as e:
+			logger.error(f"Ignoring malformed job line: {e}")
+			continue
+		if "input" not in job:
+			send_message({"id": job.get("id"), "type": "event", "event": "error", "data": {"message": "Job is missing 'input'."}})
+			continue
+		run_job(job, args.lookup_only)
+
+if __name__ == "__main__":
+	main()
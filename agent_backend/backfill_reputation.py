@@ -0,0 +1,13 @@
+from agent.database import engine, Base
+from agent.models import SourceReputation
+from agent.memory import rebuild_source_reputation
+
+def main():
+  # Make sure the reputation table exists before filling it
+  Base.metadata.create_all(bind=engine, tables=[SourceReputation.__table__])
+  print("Rebuilding source reputation from existing feedback")
+  rows = rebuild_source_reputation()
+  print(f"Source reputation rebuilt: {rows} rows written.")
+
+if __name__ == "__main__":
+  main()
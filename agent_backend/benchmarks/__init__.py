@@ -0,0 +1,3 @@
+# Benchmarks for the AI Learning Buddy backend. Run from agent_backend/, e.g.
+#   python -m benchmarks.startup
+#   python -m benchmarks.suite --quick        (fake LLM/search upstreams, scratch SQLite database)
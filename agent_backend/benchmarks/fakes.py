@@ -0,0 +1,262 @@
+# File: agent_backend/benchmarks/fakes.py
+#
+# Deterministic local stand-ins for Gemini (chat and embeddings), Serper,
+# YouTube and the transcript API. Each one sleeps for a configurable latency,
+# can inject 429s at a configurable rate (from a seeded RNG, so runs are
+# repeatable), and counts its calls. install() patches them in at the same
+# boundaries the real services sit behind, so everything above them (caching,
+# rate limiting, ranking, persistence) runs unchanged.
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+import numpy as np
+
+class FakeRateLimitError(Exception):
+  """Looks like a Gemini 429 to agent.rate_limit.is_rate_limit_error."""
+
+class CallCounter:
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.counts = {}
+
+  def add(self, name: str, amount: int = 1):
+    with self._lock:
+      self.counts[name] = self.counts.get(name, 0) + amount
+
+  def reset(self):
+    with self._lock:
+      self.counts = {}
+
+  def get(self, name: str) -> int:
+    with self._lock:
+      return self.counts.get(name, 0)
+
+class FakeUpstream:
+  """Shared latency, 429 injection and call counting."""
+
+  def __init__(self, name: str, counter: CallCounter, latency: float = 0.0, rate_limit_rate: float = 0.0, seed: int = 0):
+    self.name = name
+    self.counter = counter
+    self.latency = latency
+    self.rate_limit_rate = rate_limit_rate
+    self._rng = random.Random(f"{name}:{seed}")
+    self._rng_lock = threading.Lock()
+
+  def call(self):
+    """Counts one call, sleeps for the latency, and raises a 429 if one is injected."""
+    self.counter.add(self.name)
+    if self.latency:
+      time.sleep(self.latency)
+    with self._rng_lock:
+      injected = self._rng.random() < self.rate_limit_rate
+    if injected:
+      self.counter.add("injected_429")
+      raise FakeRateLimitError(f"429 Resource has been exhausted ({self.name})")
+
+def _digest(*parts) -> int:
+  return int(hashlib.sha256("|".join(map(str, parts)).encode("utf-8")).hexdigest()[:12], 16)
+
+class FakeMessage:
+  def __init__(self, content: str):
+    self.content = content
+
+def _json_after(prompt: str, marker: str):
+  start = prompt.index("{", prompt.index(marker))
+  return json.JSONDecoder().raw_decode(prompt[start:])[0]
+
+class FakeChatModel(FakeUpstream):
+  """Answers every prompt the backend sends with a well-formed, deterministic response."""
+
+  def __init__(self, counter: CallCounter, **kwargs):
+    super().__init__("llm_chat", counter, **kwargs)
+    self.model = "fake-chat"
+    self.temperature = 0.5
+
+  def invoke(self, prompt: str):
+    self.call()
+    return FakeMessage(self.respond(prompt))
+
+  def respond(self, prompt: str) -> str:
+    if "main module titles" in prompt:
+      topic = re.findall(r"on the topic: '([^']*)'", prompt)[-1]
+      return "\n".join(f"{i}. {title} of {topic}" for i, title in enumerate(("Foundations", "Core Techniques", "First Project"), 1))
+    if "generating search queries" in prompt:
+      step = re.findall(r'Input: "([^"]*)"', prompt)[-1]
+      return re.sub(r"^\s*\d+\.\s*", "", step).lower() + " for beginners"
+    if "grouped by category" in prompt:
+      data = _json_after(prompt, "Search Results (JSON format):")
+      picks = {}
+      for name, candidates in data["categories"].items():
+        ids = list(candidates)
+        picks[name] = {"id": ids[0], "reason": "The top-ranked candidate suits a beginner."}
+      return json.dumps(picks)
+    if "keyed by id" in prompt:
+      candidates = _json_after(prompt, "Search Results (JSON format, keyed by id, best-ranked first):")
+      return json.dumps({"id": next(iter(candidates)), "reason": "The top-ranked candidate suits a beginner."})
+    if "Here is the transcript" in prompt:
+      timestamps = re.findall(r"\[\d{2}:\d{2}\]", prompt)[::40] or ["[00:00]"]
+      return "\n".join(f"- {ts} Concept introduced here, summarized in two short sentences." for ts in timestamps)
+    if "Merge them into a single set" in prompt:
+      return "\n".join(line for line in prompt.splitlines() if line.strip().startswith("- ["))
+    return "OK"
+
+class FakeGenai(FakeUpstream):
+  """Stands in for the google.generativeai module; only embed_content is used."""
+
+  def __init__(self, counter: CallCounter, dim: int = 768, **kwargs):
+    super().__init__("llm_embedding", counter, **kwargs)
+    self.dim = dim
+
+  def embed_content(self, model: str, content: str):
+    self.call()
+    return {"embedding": fake_embedding(content, self.dim).tolist()}
+
+def fake_embedding(text: str, dim: int) -> np.ndarray:
+  """A deterministic unit vector for `text`; similar topics are not similar, only identical ones."""
+  rng = np.random.default_rng(_digest(" ".join(text.lower().split())))
+  vector = rng.standard_normal(dim).astype(np.float32)
+  return vector / np.linalg.norm(vector)
+
+_DOMAINS = ["realpython.com", "docs.python.org", "www.w3schools.com", "developer.mozilla.org", "www.geeksforgeeks.org",
+            "medium.com", "www.freecodecamp.org", "stackoverflow.com", "en.wikipedia.org", "learn.microsoft.com"]
+
+class FakeSerper(FakeUpstream):
+  """Replaces agent.tools._serper_search; returns raw organic results including the unused fields."""
+
+  def __init__(self, counter: CallCounter, **kwargs):
+    super().__init__("serper", counter, **kwargs)
+
+  def search(self, query: str):
+    try:
+      self.call()
+    except FakeRateLimitError:
+      # The real client retries, then gives up with no results
+      return []
+    offset = _digest("serper", query) % len(_DOMAINS)
+    results = []
+    for position in range(1, 11):
+      domain = _DOMAINS[(offset + position) % len(_DOMAINS)]
+      slug = query.replace(" ", "-")
+      results.append({
+        "title": f"{query.title()} - {domain}",
+        "link": f"https://{domain}/{slug}-{position}",
+        "snippet": f"A guide to {query} covering everything from setup to advanced usage. " * 3,
+        "position": position,
+        "sitelinks": [{"title": f"Section {i}", "link": f"https://{domain}/{slug}#s{i}"} for i in range(4)],
+        "date": "Jan 1, 2024",
+      })
+    return results
+
+class _FakeRequest:
+  def __init__(self, upstream: FakeUpstream, respond):
+    self._upstream = upstream
+    self._respond = respond
+
+  def execute(self):
+    try:
+      self._upstream.call()
+    except FakeRateLimitError as e:
+      raise RuntimeError(str(e))
+    return self._respond()
+
+class _FakeSearchResource:
+  def __init__(self, upstream):
+    self._upstream = upstream
+
+  def list(self, q, part, maxResults, type, order):
+    # Every query has a pool of ten videos; each sort order ranks them differently, so orders overlap
+    pool = [f"{_digest('yt', q, i) % 10**11:011d}" for i in range(10)]
+    ranked = sorted(pool, key=lambda video_id: _digest(order, video_id))[:maxResults]
+    return _FakeRequest(self._upstream, lambda: {"items": [{"id": {"videoId": video_id}} for video_id in ranked]})
+
+class _FakeVideosResource:
+  def __init__(self, upstream):
+    self._upstream = upstream
+
+  def list(self, part, id):
+    def respond():
+      items = []
+      for video_id in id.split(","):
+        views = 1000 + _digest("views", video_id) % 5_000_000
+        items.append({
+          "id": video_id,
+          "snippet": {
+            "title": f"Video {video_id}",
+            "channelTitle": f"Channel {_digest('channel', video_id) % 50}",
+            "description": "A long description that the backend never reads. " * 10,
+            "thumbnails": {size: {"url": f"https://i.ytimg.com/vi/{video_id}/{size}.jpg"} for size in ("default", "medium", "high")},
+          },
+          "statistics": {"viewCount": str(views), "likeCount": str(views * (1 + _digest("likes", video_id) % 60) // 1000)},
+        })
+      return {"items": items}
+    return _FakeRequest(self._upstream, respond)
+
+class FakeYouTubeService:
+  """Mimics the googleapiclient service object that YouTubeClient builds."""
+
+  def __init__(self, counter: CallCounter, **kwargs):
+    self._search = _FakeSearchResource(FakeUpstream("youtube_search", counter, **kwargs))
+    self._videos = _FakeVideosResource(FakeUpstream("youtube_videos", counter, **kwargs))
+
+  def search(self):
+    return self._search
+
+  def videos(self):
+    return self._videos
+
+def fake_transcript(minutes: int, seconds_per_line: int = 4) -> str:
+  """A transcript of the given length, one timestamped line every few seconds."""
+  lines = []
+  for second in range(0, minutes * 60, seconds_per_line):
+    m, s = divmod(second, 60)
+    lines.append(f"[{m:02d}:{s:02d}] and this is where the speaker explains the next idea in a little more detail\n")
+  return "".join(lines)
+
+class FakeStack:
+  """All fakes for one benchmark run, sharing one call counter."""
+
+  def __init__(self, llm_latency=0.0, search_latency=0.0, rate_limit_rate=0.0, embedding_dim=768, seed=0):
+    self.counter = CallCounter()
+    upstream_args = {"latency": search_latency, "rate_limit_rate": rate_limit_rate, "seed": seed}
+    self.chat = FakeChatModel(self.counter, latency=llm_latency, rate_limit_rate=rate_limit_rate, seed=seed)
+    self.genai = FakeGenai(self.counter, dim=embedding_dim, latency=llm_latency / 4, rate_limit_rate=rate_limit_rate, seed=seed)
+    self.serper = FakeSerper(self.counter, **upstream_args)
+    self.youtube = FakeYouTubeService(self.counter, **upstream_args)
+    self.transcript_minutes = 180
+
+  def upstreams(self):
+    return [self.chat, self.genai, self.serper, self.youtube._search._upstream, self.youtube._videos._upstream]
+
+  def set_rate_limit_rate(self, rate: float):
+    """Changes the 429 injection rate of every fake at once."""
+    for upstream in self.upstreams():
+      upstream.rate_limit_rate = rate
+
+  def install(self):
+    """Patches the fakes into the backend modules (import them only after the environment is set up)."""
+    from agent import notes, tools
+    from agent.llm import CachedChatModel
+    import agent_brain_optimized as brain
+
+    tools._serper_search = self.serper.search
+    client = tools.YouTubeClient("fake-key")
+    client._service = lambda: self.youtube
+    tools._youtube_client = client
+    notes.get_youtube_transcript = lambda video_url: fake_transcript(self.transcript_minutes)
+
+    brain._genai = self.genai
+    brain._chat_model = CachedChatModel(self.chat)
+    return self
+
+  def snapshot(self) -> dict:
+    counts = dict(self.counter.counts)
+    return {
+      "llm_calls": counts.get("llm_chat", 0) + counts.get("llm_embedding", 0),
+      "upstream_calls": counts.get("serper", 0) + counts.get("youtube_search", 0) + counts.get("youtube_videos", 0),
+      "injected_429": counts.get("injected_429", 0),
+    }
@@ -0,0 +1,110 @@
+# File: agent_backend/benchmarks/importtime.py
+#
+# Produces an import-time report (from `python -X importtime`) for each entry
+# point path and writes it to benchmarks/importtime_report.md. With --baseline,
+# the report starts with a before/after table against an older commit, whose
+# entry point imported everything up front for every path.
+#
+#   python -m benchmarks.importtime [--baseline <git rev>]
+
+import argparse
+import io
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPORT_PATH = os.path.join(BACKEND_DIR, "benchmarks", "importtime_report.md")
+
+# The modules each request path imports before it can do any work. An exact topic match needs
+# no embedding, so only the similar-plan path loads the Gemini SDK.
+ENTRY_POINTS = {
+  "entry point only": "import agent_brain_optimized",
+  "youtube notes": "import agent_brain_optimized as b; b.get_chat_model(); import agent.notes; import youtube_transcript_api",
+  "cached plan (exact topic)": "import agent_brain_optimized as b; from agent.memory import find_plan_snapshot_by_topic",
+  "cached plan (similar topic)": "import agent_brain_optimized as b; from agent.memory import find_similar_plan_snapshot; b.get_genai()",
+  "plan generation (cache miss)": "import agent_brain_optimized as b; b.init_models()",
+}
+
+# Before the entry point was split up, importing it loaded everything every path needs
+BASELINE_CODE = "import agent_brain_optimized"
+
+TOP_N = 15
+
+def environment(workdir):
+  """Placeholder keys and a scratch database, so every path (and the old eager config checks) can import."""
+  env = dict(os.environ)
+  for key in ("GEMINI_API_KEY", "SERPER_API_KEY", "YOUTUBE_API_KEY"):
+    env.setdefault(key, "placeholder")
+  env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'importtime.db')}")
+  return env
+
+def measure(code, cwd=BACKEND_DIR, env=None):
+  """Runs `code` in a fresh interpreter and returns [(cumulative_us, module)] sorted slowest first."""
+  result = subprocess.run(
+    [sys.executable, "-X", "importtime", "-c", code],
+    cwd=cwd, env=env, capture_output=True, text=True,
+  )
+  if result.returncode != 0:
+    raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+  rows = []
+  for line in result.stderr.splitlines():
+    if not line.startswith("import time:") or "cumulative" in line:
+      continue
+    _, cumulative_us, module = line.split("|")
+    # Only keep top-level entries; nested imports are indented further
+    if module.startswith("  "):
+      continue
+    rows.append((int(cumulative_us), module.strip()))
+  return sorted(rows, reverse=True)
+
+def measure_baseline(rev, workdir):
+  """Extracts agent_backend at `rev` into `workdir` and measures importing its entry point."""
+  archive = subprocess.run(
+    ["git", "archive", "--format=tar", rev, "--", "."],
+    cwd=BACKEND_DIR, capture_output=True, check=True,
+  ).stdout
+  tree = os.path.join(workdir, "baseline")
+  with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+    tar.extractall(tree)
+  return measure(BASELINE_CODE, cwd=tree, env=environment(workdir))
+
+def total_ms(rows) -> float:
+  return sum(us for us, _ in rows) / 1000
+
+def main():
+  parser = argparse.ArgumentParser(description="Write the import-time report for each entry point path.")
+  parser.add_argument("--baseline", metavar="REV", help="git revision to compare against")
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as workdir:
+    env = environment(workdir)
+    measured = {name: measure(code, env=env) for name, code in ENTRY_POINTS.items()}
+    baseline = measure_baseline(args.baseline, workdir) if args.baseline else None
+
+  lines = ["# Import-time report", "", f"Generated with `python -X importtime` ({sys.version.split()[0]}).", ""]
+  if baseline is not None:
+    baseline_ms = total_ms(baseline)
+    lines += ["## Before and after", "",
+              f"Baseline: `{args.baseline}`, where importing the entry point (`{BASELINE_CODE}`) loaded every path's modules.", "",
+              "| path | baseline (ms) | now (ms) | saved |", "|---|---|---|---|"]
+    for name, rows in measured.items():
+      now_ms = total_ms(rows)
+      lines.append(f"| {name} | {baseline_ms:.1f} | {now_ms:.1f} | {1 - now_ms / baseline_ms:.0%} |")
+    lines.append("")
+
+  for name, rows in measured.items():
+    lines += [f"## {name}", "", f"Total top-level import time: **{total_ms(rows):.1f} ms**", "",
+              "| module | cumulative (ms) |", "|---|---|"]
+    lines += [f"| `{module}` | {us / 1000:.1f} |" for us, module in rows[:TOP_N]]
+    lines.append("")
+
+  with open(REPORT_PATH, "w", encoding="utf-8") as f:
+    f.write("\n".join(lines))
+  print(f"Wrote {REPORT_PATH}")
+
+if __name__ == "__main__":
+  main()
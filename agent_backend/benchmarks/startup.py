@@ -0,0 +1,34 @@
+# File: agent_backend/benchmarks/startup.py
+#
+# Measures what agent construction costs with the bundled ReAct prompt compared
+# to pulling it from LangChain Hub, and what a second (cached) init costs.
+#
+#   python -m benchmarks.startup            # bundled prompt only
+#   python -m benchmarks.startup --hub      # also time hub.pull (needs network)
+
+import sys
+import time
+
+def timed(label, fn, repeat=1):
+  start = time.perf_counter()
+  for _ in range(repeat):
+    result = fn()
+  elapsed_ms = (time.perf_counter() - start) * 1000 / repeat
+  print(f"{label:<40} {elapsed_ms:10.2f} ms")
+  return result
+
+def main():
+  from agent.prompts import REACT_PROMPT_HUB_NAME, load_react_prompt
+
+  timed("load_react_prompt() (bundled)", load_react_prompt, repeat=20)
+
+  if "--hub" in sys.argv[1:]:
+    from langchain import hub
+    timed(f"hub.pull('{REACT_PROMPT_HUB_NAME}')", lambda: hub.pull(REACT_PROMPT_HUB_NAME), repeat=3)
+
+  import agent_brain_optimized as brain
+  timed("init_models() first call", brain.init_models)
+  timed("init_models() cached call", brain.init_models, repeat=1000)
+
+if __name__ == "__main__":
+  main()
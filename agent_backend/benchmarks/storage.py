@@ -0,0 +1,99 @@
+# File: agent_backend/benchmarks/storage.py
+#
+# Compares the old and new storage layouts for plan embeddings (float8[] vs
+# packed float32 bytes) and module videos (JSON text vs JSON/JSONB column):
+# bytes per row and the time to turn fetched rows into what the code uses.
+#
+#   python -m benchmarks.storage                  # synthetic rows, no database needed
+#   python -m benchmarks.storage --plans 100000   # more rows
+#   python -m benchmarks.storage --database       # also measure the configured database
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+# Postgres stores float8[] as a 24-byte array header plus 8 bytes per element, and
+# bytea as a 4-byte varlena header plus the raw bytes
+ARRAY_HEADER_BYTES = 24
+VARLENA_HEADER_BYTES = 4
+
+SAMPLE_VIDEOS = {
+  category: {
+    "title": f"A beginner friendly {category.lower()} tutorial",
+    "link": "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "reason": "Clearly the strongest candidate by engagement: 12,345 likes on 456,789 views.",
+    "thumbnail": "https://i.ytimg.com/vi/dQw4w9WgXcQ/mqdefault.jpg",
+  }
+  for category in ("General", "Most Viewed", "Highest Rated")
+}
+
+def timed(label, fn, repeat=1):
+  start = time.perf_counter()
+  for _ in range(repeat):
+    result = fn()
+  elapsed_ms = (time.perf_counter() - start) * 1000 / repeat
+  print(f"{label:<52} {elapsed_ms:10.2f} ms")
+  return result
+
+def synthetic(plans: int, dim: int, modules: int, reads: int):
+  rng = np.random.default_rng(0)
+  vectors = rng.standard_normal((plans, dim)).astype(np.float32)
+  # What the driver hands back for each layout
+  as_lists = [vector.astype(np.float64).tolist() for vector in vectors]
+  as_bytes = [vector.tobytes() for vector in vectors]
+
+  print(f"Embeddings: {plans} plans x {dim} dimensions")
+  print(f"{'  bytes per row, float8[]':<52} {ARRAY_HEADER_BYTES + 8 * dim:10d}")
+  print(f"{'  bytes per row, float32 bytea':<52} {VARLENA_HEADER_BYTES + 4 * dim:10d}")
+  timed("  load matrix from float8[] lists", lambda: np.stack([np.asarray(row, dtype=np.float32) for row in as_lists]))
+  timed("  load matrix from float32 bytes (frombuffer)", lambda: np.stack([np.frombuffer(row, dtype=np.float32) for row in as_bytes]))
+
+  videos_text = json.dumps(SAMPLE_VIDEOS)
+  print(f"\nVideos: {modules} modules, each read {reads} times (e.g. interactive loop iterations)")
+  print(f"{'  bytes per row, JSON text':<52} {len(videos_text.encode()):10d}")
+  timed("  json.loads on every read (videosJson)", lambda: [json.loads(videos_text) for _ in range(modules * reads)])
+  # The driver parses a JSON/JSONB column once, when the row is fetched
+  timed("  parsed once at fetch (videos column)", lambda: [json.loads(videos_text) for _ in range(modules)])
+
+def measure_database():
+  from sqlalchemy import text
+  from agent.database import engine
+  from agent.models import Plan
+
+  print(f"\nConfigured database ({engine.dialect.name})")
+  with engine.connect() as connection:
+    if engine.dialect.name == 'postgresql':
+      embedding_bytes, videos_bytes = connection.execute(text(
+        "SELECT (SELECT avg(pg_column_size(embedding)) FROM plans), (SELECT avg(pg_column_size(videos)) FROM modules)"
+      )).one()
+      print(f"{'  avg bytes per embedding':<52} {float(embedding_bytes or 0):10.0f}")
+      print(f"{'  avg bytes per videos document':<52} {float(videos_bytes or 0):10.0f}")
+
+  from agent.database import SessionLocal
+  def load():
+    db = SessionLocal()
+    try:
+      embeddings = [row.embedding for row in db.query(Plan.embedding).filter(Plan.embedding.isnot(None))]
+      return np.stack(embeddings) if embeddings else None
+    finally:
+      db.close()
+  matrix = timed("  load every plan embedding into a matrix", load)
+  print(f"{'  plans loaded':<52} {0 if matrix is None else matrix.shape[0]:10d}")
+
+def main():
+  parser = argparse.ArgumentParser(description="Storage layout benchmarks")
+  parser.add_argument("--plans", type=int, default=10000)
+  parser.add_argument("--dim", type=int, default=3072)
+  parser.add_argument("--modules", type=int, default=3000)
+  parser.add_argument("--reads", type=int, default=10)
+  parser.add_argument("--database", action="store_true", help="also measure the database in DATABASE_URL")
+  args = parser.parse_args()
+
+  synthetic(args.plans, args.dim, args.modules, args.reads)
+  if args.database:
+    measure_database()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,345 @@
+# File: agent_backend/benchmarks/suite.py
+#
+# End-to-end benchmarks for the lookup, plan, feedback and notes paths, run
+# against the fakes in benchmarks/fakes.py and a throwaway SQLite database, so
+# no API keys, network or database server are needed and runs are repeatable.
+# Each scenario reports wall time, LLM calls, upstream (search) calls and peak
+# Python memory (tracemalloc); results can be saved as a baseline and compared
+# against later runs.
+#
+#   python -m benchmarks.suite                              # every scenario
+#   python -m benchmarks.suite --quick                      # smaller sizes
+#   python -m benchmarks.suite -s lookup_10k -s notes_long_transcript
+#   python -m benchmarks.suite --save before                # write benchmarks/baselines/before.json
+#   python -m benchmarks.suite --compare before             # show the change against it
+#   python -m benchmarks.suite --llm-latency 0.8 --rate-limit-rate 0.1
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(BACKEND_DIR, "benchmarks", "baselines")
+
+# Metrics compared against a baseline; lower is better for all of them
+COMPARED_METRICS = ("wall_s", "llm_calls", "upstream_calls", "peak_mb", "per_call_ms")
+
+def prepare_environment(workdir: str):
+  """Points the backend at a scratch database and caches, before any agent module is imported."""
+  os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+  os.environ["AGENT_CACHE_DIR"] = os.path.join(workdir, "cache")
+  os.environ["METRICS_DIR"] = os.path.join(workdir, "metrics")
+  # Call counts should reflect the code path, not what an earlier scenario left in the LLM cache
+  os.environ["LLM_CACHE_BACKEND"] = "none"
+  for key in ("GEMINI_API_KEY", "SERPER_API_KEY", "YOUTUBE_API_KEY"):
+    os.environ[key] = "fake"
+  # The fakes are the only thing being rate limited, so the limiter shouldn't be the bottleneck;
+  # injected 429s still go through the real retry/backoff logic, just with a short base delay
+  os.environ.setdefault("GEMINI_CHAT_RPM", "100000")
+  os.environ.setdefault("GEMINI_CHAT_TPM", "1000000000")
+  os.environ.setdefault("GEMINI_EMBEDDING_RPM", "100000")
+  os.environ.setdefault("GEMINI_EMBEDDING_TPM", "1000000000")
+  os.environ.setdefault("GEMINI_BACKOFF_BASE_SECONDS", "0.05")
+  os.environ.setdefault("HTTP_BACKOFF_BASE_SECONDS", "0.01")
+
+def reset_database():
+  from agent.database import Base, engine
+  from agent.vector_index import plan_index
+
+  Base.metadata.drop_all(bind=engine)
+  Base.metadata.create_all(bind=engine)
+  plan_index.__init__()
+
+def seed_plans(count: int, dim: int, batch_size: int = 5000):
+  """Bulk-inserts `count` plans with random embeddings (and no modules)."""
+  import datetime as dt
+  import uuid
+  import numpy as np
+  from sqlalchemy import insert
+  from agent.database import SessionLocal
+  from agent.models import Plan
+
+  rng = np.random.default_rng(0)
+  # Distinct timestamps, as real plans have; the index refresh keys off createdAt
+  first_created = dt.datetime(2024, 1, 1)
+  db = SessionLocal()
+  try:
+    for start in range(0, count, batch_size):
+      size = min(batch_size, count - start)
+      vectors = rng.standard_normal((size, dim)).astype(np.float32)
+      db.execute(insert(Plan), [
+        {"id": str(uuid.uuid4()), "topic": f"seeded topic {start + i}", "embedding": vectors[i],
+         "createdAt": first_created + dt.timedelta(seconds=start + i)}
+        for i in range(size)
+      ])
+    db.commit()
+  finally:
+    db.close()
+
+def seed_feedback(count: int, sources: int = 50, batch_size: int = 20000):
+  """Creates one plan with three modules and `count` feedback rows spread over `sources` sources, then builds the reputation table."""
+  import uuid
+  from sqlalchemy import insert
+  from agent.database import SessionLocal
+  from agent.memory import rebuild_source_reputation
+  from agent.models import Feedback, Module, Plan
+
+  db = SessionLocal()
+  try:
+    db.add(Plan(id="feedback-plan", topic="Feedback Topic"))
+    module_ids = [f"feedback-module-{i}" for i in range(3)]
+    for i, module_id in enumerate(module_ids):
+      db.add(Module(id=module_id, plan_id="feedback-plan", stepNumber=i + 1, title=f"Module {i + 1}", videos={}))
+    db.flush()
+    for start in range(0, count, batch_size):
+      db.execute(insert(Feedback), [
+        {
+          "id": str(uuid.uuid4()), "module_id": module_ids[n % 3], "resource_type": "article",
+          "resource_link": f"https://source{n % sources}.example.com/page", "source": f"source{n % sources}.example.com",
+          "rating": 1 + (n * 7) % 5,
+        }
+        for n in range(start, min(start + batch_size, count))
+      ])
+    db.commit()
+  finally:
+    db.close()
+  rebuild_source_reputation()
+
+def quiet_backend():
+  """Keeps benchmark runs out of agent_run.log and stops per-call log output from skewing the timings."""
+  from agent.logger import file_handler, listener, logger, stream_handler
+
+  listener.handlers = (stream_handler,)
+  file_handler.close()
+  logger.setLevel(logging.WARNING)
+
+def warm_up():
+  """Pays one-time costs (lazy imports, the domain suffix list) before anything is measured."""
+  import agent.notes, agent.pipeline, agent.research  # noqa: F401
+  from agent.ranking import source_for_link
+
+  source_for_link("https://www.example.com/")
+
+class Scenario:
+  def __init__(self, name, description, setup, run):
+    self.name = name
+    self.description = description
+    self.setup = setup
+    self.run = run
+
+def build_scenarios(args, fakes) -> list:
+  import numpy as np
+  from agent import memory
+  import agent_brain_optimized as brain
+
+  lookup_sizes = [100, 10_000] if args.quick else [100, 10_000, 100_000]
+  feedback_sizes = [10_000] if args.quick else [10_000, 100_000]
+  query = np.random.default_rng(1).standard_normal(args.dim).astype(np.float32)
+
+  def lookup_run():
+    start = time.perf_counter()
+    memory.find_similar_plan_in_db(query)
+    cold_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+      memory.find_similar_plan_in_db(query)
+    return {"cold_ms": round(cold_ms, 3), "per_call_ms": round((time.perf_counter() - start) * 1000 / args.repeat, 3)}
+
+  def plan_run(topic):
+    def run():
+      result = brain.handle_request(topic, "pipeline")
+      return {"modules": len(result.get("modules", [])), "error": result.get("error")}
+    return run
+
+  def rate_limited_setup():
+    reset_database()
+    fakes.set_rate_limit_rate(args.rate_limit_rate or 0.15)
+
+  def rate_limited_run():
+    try:
+      return plan_run("Rate Limited Topic")()
+    finally:
+      fakes.set_rate_limit_rate(args.rate_limit_rate)
+
+  def spike_run():
+    # Concurrent requests for one new topic, as on a trending topic; they should cost one generation
+    topics = ["Trending Topic", "trending  topic", "TRENDING TOPIC", "Trending Topic"]
+    with ThreadPoolExecutor(max_workers=len(topics)) as pool:
+      results = list(pool.map(lambda topic: brain.handle_request(topic, "pipeline"), topics))
+    return {"requests": len(topics), "plans": len({result.get("id") for result in results if result.get("id")})}
+
+  def repeat_setup():
+    reset_database()
+    brain.handle_request("Repeated Topic", "pipeline")
+
+  def repeat_run():
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+      brain.handle_request("Repeated Topic", "pipeline")
+    return {"per_call_ms": round((time.perf_counter() - start) * 1000 / args.repeat, 3)}
+
+  def feedback_run():
+    # What analysis does for every module: the reputation lookup, then the summary given to the model
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+      memory.summarize_feedback(memory.get_source_reputation("Feedback Topic")[0])
+    return {"per_call_ms": round((time.perf_counter() - start) * 1000 / args.repeat, 3)}
+
+  def notes_setup():
+    fakes.transcript_minutes = args.transcript_minutes
+
+  def notes_run():
+    notes = brain.handle_request("https://www.youtube.com/watch?v=dQw4w9WgXcQ")["notes"]
+    return {"notes_lines": len(notes.splitlines())}
+
+  scenarios = []
+  for size in lookup_sizes:
+    label = f"{size // 1000}k" if size >= 1000 else str(size)
+    scenarios.append(Scenario(
+      f"lookup_{label}", f"similar-plan lookup over {size} plans (cold, then {args.repeat} warm)",
+      lambda size=size: (reset_database(), seed_plans(size, args.dim)), lookup_run,
+    ))
+  scenarios.append(Scenario("plan_generation", "full plan generation through handle_request", reset_database, plan_run("Benchmark Topic")))
+  scenarios.append(Scenario("plan_generation_rate_limited", "full plan generation with injected 429s", rate_limited_setup, rate_limited_run))
+  scenarios.append(Scenario("plan_generation_spike", "4 concurrent requests for the same new topic", reset_database, spike_run))
+  scenarios.append(Scenario("plan_repeat_request", f"{args.repeat} repeat requests for an existing plan", repeat_setup, repeat_run))
+  for size in feedback_sizes:
+    scenarios.append(Scenario(
+      f"feedback_summary_{size // 1000}k", f"{args.repeat} feedback summaries over {size} feedback rows",
+      lambda size=size: (reset_database(), seed_feedback(size)), feedback_run,
+    ))
+  scenarios.append(Scenario(
+    "notes_long_transcript", f"notes for a {args.transcript_minutes}-minute transcript", notes_setup, notes_run,
+  ))
+  return scenarios
+
+def measure(scenario, fakes, trace_memory: bool, verbose: bool = False) -> dict:
+  from agent.tools import youtube_quota_used
+
+  with contextlib.redirect_stdout(sys.stdout if verbose else io.StringIO()):
+    return _measure(scenario, fakes, trace_memory, youtube_quota_used)
+
+def _measure(scenario, fakes, trace_memory, youtube_quota_used) -> dict:
+  scenario.setup()
+  fakes.counter.reset()
+  quota_before = youtube_quota_used()
+  if trace_memory:
+    tracemalloc.start()
+  start = time.perf_counter()
+  try:
+    extra = scenario.run() or {}
+  finally:
+    wall = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+    if trace_memory:
+      tracemalloc.stop()
+  return {
+    "wall_s": round(wall, 3),
+    **fakes.snapshot(),
+    "youtube_quota": youtube_quota_used() - quota_before,
+    "peak_mb": round(peak / 2**20, 2) if trace_memory else None,
+    **extra,
+  }
+
+def print_results(results: dict):
+  print(f"\n{'scenario':<30} {'wall_s':>9} {'llm':>6} {'upstream':>9} {'429s':>5} {'peak_mb':>8}  other")
+  for name, metrics in results.items():
+    other = {k: v for k, v in metrics.items() if k not in ("wall_s", "llm_calls", "upstream_calls", "injected_429", "peak_mb")}
+    peak = "-" if metrics["peak_mb"] is None else f"{metrics['peak_mb']:.2f}"
+    print(f"{name:<30} {metrics['wall_s']:>9.3f} {metrics['llm_calls']:>6} {metrics['upstream_calls']:>9} "
+          f"{metrics['injected_429']:>5} {peak:>8}  {json.dumps(other)}")
+
+def compare(results: dict, baseline: dict):
+  print(f"\nCompared with baseline '{baseline['name']}' ({baseline['created']}):")
+  print(f"{'scenario':<30} {'metric':<15} {'baseline':>12} {'current':>12} {'change':>9}")
+  for name, metrics in results.items():
+    old = baseline["results"].get(name)
+    if old is None:
+      print(f"{name:<30} (not in baseline)")
+      continue
+    for metric in COMPARED_METRICS:
+      before, after = old.get(metric), metrics.get(metric)
+      if before is None or after is None:
+        continue
+      change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+      print(f"{name:<30} {metric:<15} {before:>12} {after:>12} {change:>9}")
+
+def baseline_path(name: str) -> str:
+  return os.path.join(BASELINE_DIR, f"{name}.json")
+
+def main():
+  parser = argparse.ArgumentParser(description="Backend benchmark suite (fake LLM and search upstreams)")
+  parser.add_argument("-s", "--scenario", action="append", help="run only these scenarios (repeatable)")
+  parser.add_argument("--list", action="store_true", help="list the scenarios and exit")
+  parser.add_argument("--quick", action="store_true", help="smaller lookup and feedback sizes")
+  parser.add_argument("--dim", type=int, default=768, help="embedding dimensions for seeded plans and fake embeddings")
+  parser.add_argument("--repeat", type=int, default=100, help="calls per scenario for the per-call timings")
+  parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake chat call (embeddings take a quarter)")
+  parser.add_argument("--search-latency", type=float, default=0.1, help="seconds per fake Serper/YouTube call")
+  parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of fake calls that return a 429")
+  parser.add_argument("--transcript-minutes", type=int, default=180)
+  parser.add_argument("-v", "--verbose", action="store_true", help="show the backend's log and print output")
+  parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (it slows Python code down)")
+  parser.add_argument("--save", metavar="NAME", help="save the results as benchmarks/baselines/NAME.json")
+  parser.add_argument("--compare", metavar="NAME", help="compare the results with a saved baseline")
+  args = parser.parse_args()
+
+  baseline = None
+  if args.compare:
+    with open(baseline_path(args.compare), encoding="utf-8") as f:
+      baseline = json.load(f)
+
+  workdir = tempfile.mkdtemp(prefix="agent-bench-")
+  prepare_environment(workdir)
+  sys.path.insert(0, BACKEND_DIR)
+
+  from benchmarks.fakes import FakeStack
+  fakes = FakeStack(
+    llm_latency=args.llm_latency, search_latency=args.search_latency,
+    rate_limit_rate=args.rate_limit_rate, embedding_dim=args.dim,
+  ).install()
+  if not args.verbose:
+    quiet_backend()
+  warm_up()
+
+  scenarios = build_scenarios(args, fakes)
+  if args.list:
+    for scenario in scenarios:
+      print(f"{scenario.name:<30} {scenario.description}")
+    return
+  if args.scenario:
+    unknown = set(args.scenario) - {scenario.name for scenario in scenarios}
+    if unknown:
+      parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+    scenarios = [scenario for scenario in scenarios if scenario.name in args.scenario]
+
+  results = {}
+  for scenario in scenarios:
+    print(f"Running {scenario.name}: {scenario.description}...", file=sys.stderr)
+    results[scenario.name] = measure(scenario, fakes, not args.no_memory, args.verbose)
+  print_results(results)
+
+  if baseline:
+    compare(results, baseline)
+  if args.save:
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    with open(baseline_path(args.save), "w", encoding="utf-8") as f:
+      json.dump({
+        "name": args.save,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("save", "compare", "scenario", "list")},
+        "results": results,
+      }, f, indent=2)
+    print(f"\nSaved baseline to {baseline_path(args.save)}")
+
+if __name__ == "__main__":
+  main()
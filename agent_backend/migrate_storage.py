@@ -0,0 +1,57 @@
+# Migrates an existing Postgres database to the compact storage layout:
+#   plans.embedding    float8[]          -> bytea (packed float32)
+#   modules.videosJson varchar (JSON text) -> modules.videos jsonb, with a GIN index
+# Safe to run more than once; steps that are already done are skipped.
+# Everything runs in one transaction, so a failure leaves the old layout intact.
+
+import numpy as np
+from sqlalchemy import inspect, text
+
+from agent.database import engine
+
+BATCH_SIZE = 500
+
+def _columns(connection, table):
+  return {column['name']: column['type'] for column in inspect(connection).get_columns(table)}
+
+def migrate_embeddings(connection) -> int:
+  embedding_type = _columns(connection, 'plans').get('embedding')
+  if embedding_type is None or embedding_type.__class__.__name__ != 'ARRAY':
+    return 0
+
+  connection.execute(text("ALTER TABLE plans ADD COLUMN embedding_f32 bytea"))
+  rows = connection.execute(text("SELECT id, embedding FROM plans WHERE embedding IS NOT NULL")).fetchall()
+  for start in range(0, len(rows), BATCH_SIZE):
+    batch = rows[start:start + BATCH_SIZE]
+    connection.execute(
+      text("UPDATE plans SET embedding_f32 = :embedding WHERE id = :id"),
+      [{'id': plan_id, 'embedding': np.asarray(embedding, dtype=np.float32).tobytes()} for plan_id, embedding in batch],
+    )
+  connection.execute(text("ALTER TABLE plans DROP COLUMN embedding"))
+  connection.execute(text("ALTER TABLE plans RENAME COLUMN embedding_f32 TO embedding"))
+  return len(rows)
+
+def migrate_videos(connection) -> bool:
+  if 'videosJson' not in _columns(connection, 'modules'):
+    return False
+  connection.execute(text('ALTER TABLE modules ALTER COLUMN "videosJson" TYPE jsonb USING "videosJson"::jsonb'))
+  connection.execute(text('ALTER TABLE modules RENAME COLUMN "videosJson" TO videos'))
+  return True
+
+def main():
+  if engine.dialect.name != 'postgresql':
+    print(f"Nothing to migrate: the {engine.dialect.name} schema is created with the compact layout.")
+    return
+
+  with engine.begin() as connection:
+    print("Migrating plan embeddings to packed float32...")
+    print(f"  {migrate_embeddings(connection)} embeddings converted.")
+
+    print("Migrating module videos to jsonb...")
+    print("  Done." if migrate_videos(connection) else "  Already migrated.")
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_modules_videos ON modules USING gin (videos jsonb_path_ops)"))
+
+  print("Storage migration finished successfully!")
+
+if __name__ == "__main__":
+  main()
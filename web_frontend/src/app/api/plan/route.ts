@@ -0,0 +1,53 @@
+// File: web_frontend/src/app/api/plan/route.ts
+
+import { NextResponse } from 'next/server';
+import { getAgentPool, AgentEvent } from '@/lib/agentPool';
+
+// The result of a lookup job (see lookup_plan in agent_backend/agent_brain_optimized.py)
+type LookupResult = { etag?: string; notModified?: boolean; notFound?: boolean };
+
+// This function handles GET requests to /api/plan?topic=...
+// It only returns an existing plan (never generates one), with the ETag of the plan's
+// snapshot, so the browser can revalidate with If-None-Match and get a 304 while the plan is unchanged.
+export async function GET(request: Request) {
+  try {
+    const topic = new URL(request.url).searchParams.get('topic');
+    if (!topic) {
+      return NextResponse.json({ error: 'Topic is required' }, { status: 400 });
+    }
+
+    // The first ETag the client sent, without quotes or a weak-validator prefix
+    const ifNoneMatch = request.headers.get('if-none-match');
+    const etag = ifNoneMatch?.split(',')[0].trim().replace(/^W\//, '').replace(/"/g, '') || undefined;
+
+    const event = await new Promise<AgentEvent>((resolve) => {
+      getAgentPool().submit(topic, (event) => {
+        if (event.event === 'done' || event.event === 'error') resolve(event);
+      }, { lookup: true, etag });
+    });
+
+    if (event.event === 'error') {
+      console.error(`Plan lookup failed: ${event.data.message}`);
+      return NextResponse.json({ error: event.data.message }, { status: 500 });
+    }
+    if (event.event !== 'done') {
+      return NextResponse.json({ error: 'Unexpected response from the agent' }, { status: 500 });
+    }
+
+    const result = event.data.result as LookupResult;
+    if (result.notFound) {
+      return NextResponse.json({ error: 'No plan found for this topic' }, { status: 404 });
+    }
+
+    // 'no-cache' lets the browser keep the plan but makes it revalidate on every use
+    const headers = { ETag: `"${result.etag}"`, 'Cache-Control': 'no-cache' };
+    if (result.notModified) {
+      return new Response(null, { status: 304, headers });
+    }
+    return NextResponse.json(result, { headers });
+
+  } catch (error) {
+    console.error('Error in plan API route:', error);
+    return NextResponse.json({ error: 'An internal server error occurred' }, { status: 500 });
+  }
+}
@@ -2,7 +2,8 @@
 'use client';
 import { useState, useEffect, useRef } from "react";
 // Import our new types
-import { Plan, Module } from "@/types";
+import { Plan } from "@/types";
+import type { AgentEvent } from "@/lib/agentPool";
 
 // Import all the components we will need for different states
 import WelcomeScreen from "./WelcomeScreen";
@@ -12,6 +13,10 @@ import ChatWindow from "./ChatWindow";
 
 type AppStatus = 'idle' | 'loading' | 'ready';
 
+// The same pattern the backend uses to tell a YouTube link (notes) from a topic (a plan),
+// see YOUTUBE_LINK_REGEX in agent_backend/agent_brain_optimized.py
+const YOUTUBE_LINK_REGEX = /^(https?:\/\/)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)\/(watch\?v=|embed\/|v\/|.+\?v=)?([^&=%\?]{11})/;
+
 export default function Dashboard() {
   const [status, setStatus] = useState<AppStatus>('idle');
   const [planData, setPlanData] = useState<Plan | null>(null);
@@ -33,10 +38,71 @@ export default function Dashboard() {
   const handleStartGeneration = async (topic: string) => {
     setStatus('loading');
     setLogMessages([{ sender: 'ai', text: `Initializing agent for topic: "${topic}"...` }]);
-    let finalJsonString = '';
+    const addMessage = (text: string) => setLogMessages(prev => [...prev, { sender: 'ai', text }]);
+
+    // Handle one structured event from the backend (see agent_backend/agent/events.py)
+    const handleEvent = ({ event, data }: AgentEvent) => {
+      switch (event) {
+        case 'plan_outline':
+          addMessage(`Outline ready: ${data.modules.length} modules. Researching resources...`);
+          break;
+
+        // Show the plan as soon as the first module is ready, then fill it in
+        case 'module_ready':
+          setPlanData(prev => {
+            const modules = [...(prev?.modules ?? []), data.module]
+              .sort((a, b) => a.stepNumber - b.stepNumber);
+            return { id: prev?.id ?? '', topic: prev?.topic ?? topic, modules };
+          });
+          setStatus('ready');
+          addMessage(`Module ${data.module.stepNumber} ready: ${data.module.title}`);
+          break;
+
+        // The modules streamed so far were never saved; an 'error' event follows
+        case 'plan_discarded':
+          setPlanData(null);
+          setStatus('loading');
+          addMessage('The plan could not be saved, so the modules shown so far were discarded.');
+          break;
+
+        case 'notes_chunk':
+          addMessage(`Notes (part ${data.part} of ${data.total}):\n${data.notes}`);
+          break;
+
+        case 'error':
+          addMessage(`An error occurred: ${data.message}`);
+          break;
+
+        // The final, saved plan replaces anything streamed so far
+        case 'done': {
+          const result = data.result as Partial<Plan> & { notes?: string };
+          if (result.modules) {
+            setPlanData(result as Plan);
+            addMessage('Plan generated successfully! Here is your curriculum.');
+            setStatus('ready');
+          } else if (result.notes) {
+            addMessage(result.notes);
+          }
+          break;
+        }
+      }
+    };
 
     try {
-      // 1. Connect to our new streaming API endpoint
+      // 1. An existing plan is served from its snapshot without starting a generation job.
+      //    The browser revalidates its cached copy with the plan's ETag (a 304 while unchanged).
+      //    YouTube links never have a plan, so they go straight to the stream.
+      if (!YOUTUBE_LINK_REGEX.test(topic)) {
+        const existing = await fetch(`/api/plan?topic=${encodeURIComponent(topic)}`);
+        if (existing.ok) {
+          setPlanData(await existing.json());
+          addMessage('Found your existing plan for this topic.');
+          setStatus('ready');
+          return;
+        }
+      }
+
+      // 2. Otherwise connect to our streaming API endpoint
       const response = await fetch('/api/stream', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
@@ -47,49 +113,35 @@ export default function Dashboard() {
         throw new Error("Response body is null");
       }
 
-      // 2. Set up a reader to process the stream
+      // 3. Set up a reader to process the stream
       const reader = response.body.getReader();
       const decoder = new TextDecoder();
+      let buffer = '';
 
-      // 3. Loop forever to read chunks from the stream
+      // 4. Read Server-Sent Events until the stream ends. An event can be split
+      //    across chunks, so only complete events (ending in a blank line) are parsed.
       while (true) {
         const { done, value } = await reader.read();
-        if (done) break; // Exit the loop when the stream is finished
-
-        // Decode the chunk of data
-        const chunk = decoder.decode(value);
-        
-        // Process Server-Sent Events (SSE) formatted data
-        const lines = chunk.split('\n\n');
-        for (const line of lines) {
-          if (line.startsWith('data: ')) {
-            const data = line.substring(6);
-            
-            // Check if the data is our final JSON object
-            if (data.trim().startsWith('{') && data.trim().endsWith('}')) {
-              finalJsonString = data; // This is the final plan object
-            } else {
-              // It's a regular log message, so we add it to our state
-              setLogMessages(prev => [...prev, { sender: 'ai', text: data }]);
-            }
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const blocks = buffer.split('\n\n');
+        buffer = blocks.pop() ?? '';
+
+        for (const block of blocks) {
+          let eventName = 'message';
+          let data = '';
+          for (const line of block.split('\n')) {
+            if (line.startsWith('event: ')) eventName = line.substring(7);
+            else if (line.startsWith('data: ')) data += line.substring(6);
           }
+          if (data) handleEvent({ event: eventName, data: JSON.parse(data) } as AgentEvent);
         }
       }
 
-      // 4. Once the stream is finished, parse the final JSON and update the state
-      if (finalJsonString) {
-        console.log("Stream finished. Parsing final JSON.");
-        const parsedPlan: Plan = JSON.parse(finalJsonString);
-        setPlanData(parsedPlan);
-        setLogMessages(prev => [...prev, { sender: 'ai', text: 'Plan generated successfully! Here is your curriculum.' }]);
-        setStatus('ready');
-      } else {
-        throw new Error("No final JSON plan received from the stream.");
-      }
-
     } catch (error) {
       console.error("Error during stream processing:", error);
-      setLogMessages(prev => [...prev, { sender: 'ai', text: `An error occurred: ${error}` }]);
+      addMessage(`An error occurred: ${error}`);
       // Optionally reset to idle state on error:
       // setStatus('idle'); 
     }
@@ -0,0 +1,309 @@
+// File: web_frontend/src/lib/agentPool.ts
+
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process';
+import path from 'path';
+import readline from 'readline';
+import { Module } from '@/types';
+
+// Progress events emitted by the backend (see agent_backend/agent/events.py).
+// Every job ends with exactly one 'done' or 'error' event.
+export type AgentEvent =
+  | { event: 'plan_outline'; data: { topic: string; modules: string[] } }
+  | { event: 'module_ready'; data: { module: Module } }
+  | { event: 'plan_discarded'; data: { topic: string } }
+  | { event: 'notes_chunk'; data: { part: number; total: number; notes: string } }
+  | { event: 'error'; data: { message: string } }
+  | { event: 'done'; data: { result: unknown } };
+
+// Messages written by agent_backend/agent_worker.py, one JSON object per line
+type WorkerMessage =
+  | { type: 'ready' }
+  | ({ id: string; type: 'event' } & AgentEvent);
+
+// Per-job options passed through to the worker (see agent_backend/agent_worker.py)
+export interface JobOptions {
+  // The ETag of the plan the caller already has; an unchanged plan comes back as { notModified: true }
+  etag?: string;
+  // Only look up an existing plan ({ notFound: true } if there is none), never generate one
+  lookup?: boolean;
+}
+
+interface Job {
+  id: string;
+  input: string;
+  options: JobOptions;
+  // Delivers at most one 'done' or 'error' event; anything after that is dropped
+  onEvent: (event: AgentEvent) => void;
+  settled: boolean;
+  timer?: ReturnType<typeof setTimeout>;
+}
+
+const PYTHON_EXECUTABLE = process.env.AGENT_PYTHON || 'python3';
+const POOL_SIZE = Math.max(1, parseInt(process.env.AGENT_POOL_SIZE || '2', 10));
+// Extra workers that only serve lookups (they don't load the models), so a lookup never waits
+// behind plan generations that take minutes
+const LOOKUP_POOL_SIZE = Math.max(0, parseInt(process.env.AGENT_LOOKUP_POOL_SIZE || '1', 10));
+const BACKEND_DIR = path.resolve('../agent_backend');
+const WORKER_SCRIPT = path.join(BACKEND_DIR, 'agent_worker.py');
+// How long a job may take, counted from when it is submitted (so time spent queued counts too)
+const JOB_TIMEOUT_MS = parseInt(process.env.AGENT_JOB_TIMEOUT_MS || '600000', 10);
+const LOOKUP_TIMEOUT_MS = parseInt(process.env.AGENT_LOOKUP_TIMEOUT_MS || '30000', 10);
+// After this many workers in a row exit before they are ready, queued jobs are failed instead of waiting
+const MAX_STARTUP_FAILURES = 3;
+// Respawns back off exponentially while workers keep failing to start
+const RESPAWN_DELAY_MS = 1000;
+const MAX_RESPAWN_DELAY_MS = 60000;
+// How much of a worker's stderr is kept to explain why it exited
+const STDERR_TAIL_CHARS = 2000;
+
+// A single warm Python process. It runs one job at a time; a lookup-only worker runs only lookups.
+class AgentWorker {
+  private process: ChildProcessWithoutNullStreams;
+  ready = false;
+  currentJob: Job | null = null;
+  private stderrTail = '';
+
+  constructor(private pool: AgentPool, readonly lookupOnly = false) {
+    // '-u' keeps Python unbuffered so progress events reach the browser as they happen.
+    const args = ['-u', WORKER_SCRIPT, ...(lookupOnly ? ['--lookup-only'] : [])];
+    this.process = spawn(PYTHON_EXECUTABLE, args, { cwd: BACKEND_DIR });
+
+    readline.createInterface({ input: this.process.stdout }).on('line', (line) => this.handleLine(line));
+
+    // The agent's human log output; it stays in the server logs and is not streamed.
+    this.process.stderr.on('data', (data) => {
+      process.stdout.write(`[agent] ${data.toString()}`);
+      this.stderrTail = (this.stderrTail + data.toString()).slice(-STDERR_TAIL_CHARS);
+    });
+
+    // A failed spawn (e.g. no Python) or a write to a dead worker; 'close' handles the rest
+    this.process.on('error', (error) => {
+      console.error('Agent worker error:', error);
+      this.stderrTail = (this.stderrTail + `\n${error.message}`).slice(-STDERR_TAIL_CHARS);
+    });
+    this.process.stdin.on('error', (error) => console.error('Could not write to the agent worker:', error));
+
+    this.process.on('close', (code) => {
+      console.error(`Agent worker exited with code ${code}`);
+      const job = this.currentJob;
+      const startedUp = this.ready;
+      this.currentJob = null;
+      this.ready = false;
+      if (job) {
+        job.onEvent({ event: 'error', data: { message: `Process exited with code ${code}` } });
+      }
+      this.pool.workerExited(this, code, startedUp, this.stderrTail.trim());
+    });
+  }
+
+  private handleLine(line: string) {
+    let message: WorkerMessage;
+    try {
+      message = JSON.parse(line);
+    } catch {
+      console.error('Agent worker wrote a non-protocol line:', line);
+      return;
+    }
+
+    if (message.type === 'ready') {
+      this.ready = true;
+      this.pool.workerReady();
+      return;
+    }
+
+    const job = this.currentJob;
+    if (!job || message.id !== job.id) return;
+
+    job.onEvent({ event: message.event, data: message.data } as AgentEvent);
+    if (message.event === 'done' || message.event === 'error') {
+      this.currentJob = null;
+      this.pool.dispatch();
+    }
+  }
+
+  run(job: Job) {
+    this.currentJob = job;
+    this.process.stdin.write(JSON.stringify({ id: job.id, input: job.input, ...job.options }) + '\n');
+  }
+
+  // Stops the worker; its 'close' handler fails the current job and starts a replacement
+  kill() {
+    this.process.kill();
+  }
+
+  get idle() {
+    return this.ready && this.currentJob === null;
+  }
+}
+
+// A job that several requests are attached to: the events sent so far, and who to send the rest to
+interface SharedJob {
+  events: AgentEvent[];
+  listeners: ((event: AgentEvent) => void)[];
+}
+
+// The same case- and whitespace-insensitive form of a topic as normalize_topic in the backend
+function normalizeTopic(input: string): string {
+  return input.toLowerCase().split(/\s+/).filter(Boolean).join(' ');
+}
+
+// A fixed-size pool of warm workers with FIFO queues of pending jobs. Lookups have their own
+// queue, served first by any idle worker, and lookup-only workers that never take a generation,
+// so a page load doesn't wait behind plan generations while there is a lookup worker.
+// Concurrent requests for the same topic share one job (see submit).
+class AgentPool {
+  private workers: AgentWorker[] = [];
+  private lookupQueue: Job[] = [];
+  private queue: Job[] = [];
+  private nextJobId = 1;
+  private sharedJobs = new Map<string, SharedJob>();
+  private startupFailures = 0;
+  // Set while workers keep exiting before they are ready: why, so new jobs can fail at once
+  private startupError: string | null = null;
+
+  constructor(size: number, lookupSize: number) {
+    for (let i = 0; i < size; i++) {
+      this.workers.push(new AgentWorker(this));
+    }
+    for (let i = 0; i < lookupSize; i++) {
+      this.workers.push(new AgentWorker(this, true));
+    }
+  }
+
+  submit(input: string, onEvent: (event: AgentEvent) => void, options: JobOptions = {}) {
+    // Lookups are cheap and their result depends on the caller's ETag, so they are never shared
+    if (options.lookup) {
+      this.enqueue(this.createJob(input, options, onEvent));
+      return;
+    }
+
+    // A request for a topic that is already queued or running attaches to that job:
+    // it gets the events sent so far, then the rest as they arrive
+    const key = normalizeTopic(input);
+    const existing = this.sharedJobs.get(key);
+    if (existing) {
+      console.log(`Attaching request to the running job for "${key}".`);
+      existing.events.forEach(onEvent);
+      existing.listeners.push(onEvent);
+      return;
+    }
+
+    const shared: SharedJob = { events: [], listeners: [onEvent] };
+    this.sharedJobs.set(key, shared);
+    const broadcast = (event: AgentEvent) => {
+      shared.events.push(event);
+      if (event.event === 'done' || event.event === 'error') {
+        this.sharedJobs.delete(key);
+      }
+      for (const listener of shared.listeners) {
+        // One disconnected client must not stop the others from getting the event
+        try {
+          listener(event);
+        } catch (error) {
+          console.error('Could not deliver an agent event:', error);
+        }
+      }
+    };
+    this.enqueue(this.createJob(input, options, broadcast));
+  }
+
+  private createJob(input: string, options: JobOptions, onEvent: (event: AgentEvent) => void): Job {
+    const job: Job = {
+      id: String(this.nextJobId++),
+      input,
+      options,
+      settled: false,
+      onEvent: (event) => {
+        if (job.settled) return;
+        if (event.event === 'done' || event.event === 'error') {
+          job.settled = true;
+          clearTimeout(job.timer);
+        }
+        onEvent(event);
+      },
+    };
+    job.timer = setTimeout(() => this.timeOut(job), options.lookup ? LOOKUP_TIMEOUT_MS : JOB_TIMEOUT_MS);
+    return job;
+  }
+
+  private enqueue(job: Job) {
+    if (this.startupError && !this.workers.some((worker) => worker.ready)) {
+      job.onEvent({ event: 'error', data: { message: this.startupError } });
+      return;
+    }
+    (job.options.lookup ? this.lookupQueue : this.queue).push(job);
+    this.dispatch();
+  }
+
+  private timeOut(job: Job) {
+    if (job.settled) return;
+    const seconds = Math.round((job.options.lookup ? LOOKUP_TIMEOUT_MS : JOB_TIMEOUT_MS) / 1000);
+    console.error(`Agent job ${job.id} timed out after ${seconds}s.`);
+    this.lookupQueue = this.lookupQueue.filter((queued) => queued !== job);
+    this.queue = this.queue.filter((queued) => queued !== job);
+    job.onEvent({ event: 'error', data: { message: `The agent did not finish within ${seconds} seconds` } });
+    // A job stuck in a worker takes the worker with it, so the next job gets a fresh one
+    this.workers.find((worker) => worker.currentJob === job)?.kill();
+  }
+
+  private rejectQueued(message: string) {
+    const jobs = [...this.lookupQueue, ...this.queue];
+    this.lookupQueue = [];
+    this.queue = [];
+    for (const job of jobs) {
+      job.onEvent({ event: 'error', data: { message } });
+    }
+  }
+
+  dispatch() {
+    for (const worker of this.workers) {
+      if (this.lookupQueue.length === 0 && this.queue.length === 0) return;
+      if (!worker.idle) continue;
+      const job = this.lookupQueue.shift() ?? (worker.lookupOnly ? undefined : this.queue.shift());
+      if (job) {
+        worker.run(job);
+      }
+    }
+  }
+
+  workerReady() {
+    this.startupFailures = 0;
+    this.startupError = null;
+    this.dispatch();
+  }
+
+  workerExited(worker: AgentWorker, code: number | null, startedUp: boolean, stderr: string) {
+    if (startedUp) {
+      this.startupFailures = 0;
+    } else {
+      this.startupFailures++;
+    }
+
+    // Workers that can't start (a missing dependency, a bad config) would otherwise leave every queued job waiting forever
+    if (this.startupFailures >= MAX_STARTUP_FAILURES) {
+      this.startupError = `The agent failed to start ${this.startupFailures} times in a row (exit code ${code}): ${stderr || 'no output'}`;
+      console.error(this.startupError);
+      this.rejectQueued(this.startupError);
+    }
+
+    // Wait before respawning so a crashing worker cannot spin in a tight loop, longer the more often it fails
+    const delay = Math.min(RESPAWN_DELAY_MS * 2 ** Math.max(0, this.startupFailures - 1), MAX_RESPAWN_DELAY_MS);
+    setTimeout(() => {
+      const index = this.workers.indexOf(worker);
+      if (index !== -1) {
+        this.workers[index] = new AgentWorker(this, worker.lookupOnly);
+      }
+    }, delay);
+  }
+}
+
+// Keep one pool per server process, even across Next.js hot reloads in development.
+const globalForPool = globalThis as unknown as { agentPool?: AgentPool };
+
+export function getAgentPool(): AgentPool {
+  if (!globalForPool.agentPool) {
+    globalForPool.agentPool = new AgentPool(POOL_SIZE, LOOKUP_POOL_SIZE);
+    console.log(`Started agent worker pool with ${POOL_SIZE} worker(s) and ${LOOKUP_POOL_SIZE} lookup worker(s).`);
+  }
+  return globalForPool.agentPool;
+}
@@ -27,4 +27,5 @@ export interface Plan {
   id: string;
   topic: string;
   modules: Module[];
+  etag?: string; // Version of the stored plan snapshot, used for revalidation
 }
\ No newline at end of file